@@ -1,7 +1,15 @@
 from flask import Flask
 from flask_cors import CORS
 from .routes import routes
+from .cities import CITIES
+from .heatmap import build_heatmap_records
+from .snapshot import HeatmapSnapshot
+from .cache import CACHE_DIR
+from .ee_session import ee_session
+from . import metrics
+from .model.temperature import ground_temp_model
 import os
+import threading
 
 def create_app():
     app = Flask(__name__)
@@ -12,7 +20,39 @@ def create_app():
     # Allow frontend access
     CORS(app, resources={r"/api/*": {"origins": ["http://localhost:5173"]}})
 
+    # Heatmap snapshot refresh (seconds); 0 computes /api/heatmap per request
+    app.config["HEATMAP_SNAPSHOT_INTERVAL"] = float(os.environ.get("UHI_HEATMAP_SNAPSHOT_INTERVAL", 900))
+    app.config["HEATMAP_SNAPSHOT_MAX_AGE"] = float(
+        os.environ.get("UHI_HEATMAP_SNAPSHOT_MAX_AGE", 2 * app.config["HEATMAP_SNAPSHOT_INTERVAL"])
+    )
+    # Shared by all workers; only the one holding its lock builds snapshots ("" = per process)
+    app.config["HEATMAP_SNAPSHOT_PATH"] = os.environ.get(
+        "UHI_HEATMAP_SNAPSHOT_PATH", os.path.join(CACHE_DIR, "heatmap_snapshot.json")
+    ) or None
+
+    # Initialize Earth Engine in the background instead of blocking startup
+    app.config["EE_WARMUP"] = os.environ.get("UHI_EE_WARMUP", "1") == "1"
+
+    # Request timing, trace IDs and the debug slow-request profiler (UHI_PROFILE_SLOW_REQUESTS=1)
+    metrics.init_app(app)
+
     # Register routes
     app.register_blueprint(routes, url_prefix="/api")
 
+    if app.config["EE_WARMUP"]:
+        ee_session.start_warmup()
+        threading.Thread(target=ground_temp_model.load, name="model-warmup", daemon=True).start()
+
+    # Background heatmap snapshot
+    if app.config["HEATMAP_SNAPSHOT_INTERVAL"] > 0:
+        snapshot = HeatmapSnapshot(
+            build=lambda: build_heatmap_records(CITIES),
+            interval=app.config["HEATMAP_SNAPSHOT_INTERVAL"],
+            max_age=app.config["HEATMAP_SNAPSHOT_MAX_AGE"],
+            path=app.config["HEATMAP_SNAPSHOT_PATH"],
+            signature=[city["key"] for city in CITIES]
+        )
+        app.extensions["heatmap_snapshot"] = snapshot
+        snapshot.start()
+
     return app
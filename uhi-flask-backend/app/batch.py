@@ -0,0 +1,119 @@
+import logging
+import os
+import numpy as np
+from .cache import COORD_DECIMALS
+from .cities import registry
+from .heatmap import fetch_batch_inputs
+from .metrics import timed
+from .model.predictor import classify_uhi_arrays
+from .model.temperature import ground_temp_model
+
+logger = logging.getLogger(__name__)
+
+BATCH_MAX_POINTS = int(os.environ.get("UHI_BATCH_MAX_POINTS", "5000"))
+
+
+class BatchTooLarge(ValueError):
+    """More points than BATCH_MAX_POINTS in one request."""
+
+
+# ------------------ Input Parsing ------------------
+def parse_points(payload):
+    """
+    Accept a JSON array of {lat, lon[, green_space_percent]} objects, {"points": [...]}
+    or a GeoJSON FeatureCollection of Points. Returns a list of raw point dicts.
+    """
+    if isinstance(payload, dict) and payload.get("type") == "FeatureCollection":
+        points = []
+        for feature in payload.get("features", []):
+            geometry = (feature or {}).get("geometry") or {}
+            props = dict((feature or {}).get("properties") or {})
+            if geometry.get("type") == "Point" and len(geometry.get("coordinates", [])) >= 2:
+                props["lon"], props["lat"] = geometry["coordinates"][:2]
+            points.append(props)
+        return points
+    if isinstance(payload, dict) and "points" in payload:
+        payload = payload["points"]
+    if not isinstance(payload, list):
+        raise ValueError("Expected a list of points, {\"points\": [...]} or a GeoJSON FeatureCollection")
+    return payload
+
+
+def _validate(point):
+    lat = float(point["lat"])
+    lon = float(point["lon"])
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        raise ValueError("lat/lon out of range")
+    green = point.get("green_space_percent")
+    return lat, lon, None if green is None else float(green)
+
+
+# ------------------ Batch Prediction ------------------
+@timed("predict_points")
+def predict_points(raw_points, radius_km=5):
+    """
+    UHI metrics for many points in input order, with a per-point "error" where a point
+    is invalid or has no data. Points are snapped to registered cities, identical
+    locations are computed once, and the post-processing runs over whole arrays.
+    """
+    if len(raw_points) > BATCH_MAX_POINTS:
+        raise BatchTooLarge(f"Batch too large: {len(raw_points)} points (max {BATCH_MAX_POINTS})")
+
+    results = [None] * len(raw_points)
+    green_overrides = np.full(len(raw_points), np.nan)
+    unique, slot_of = [], []  # unique locations; input index -> unique slot (or None)
+    slots = {}
+
+    for index, point in enumerate(raw_points):
+        try:
+            lat, lon, green = _validate(point)
+        except (KeyError, TypeError, ValueError) as e:
+            results[index] = {"error": f"Invalid point: {e}"}
+            slot_of.append(None)
+            continue
+
+        city = registry.nearest(lat, lon)
+        location = dict(city) if city else {"lat": lat, "lon": lon}
+        key = (round(location["lat"], COORD_DECIMALS), round(location["lon"], COORD_DECIMALS))
+        if key not in slots:
+            slots[key] = len(unique)
+            unique.append(location)
+        slot_of.append(slots[key])
+        if green is not None:
+            green_overrides[index] = green
+
+    avg_temps, green_percents, errors = fetch_batch_inputs(unique, radius_km) if unique else ([], [], [])
+
+    # Expand unique results back to input order and post-process in one vectorized pass
+    valid = np.array([s is not None and avg_temps[s] is not None for s in slot_of], dtype=bool)
+    temps = np.array([avg_temps[s] if v else np.nan for s, v in zip(slot_of, valid)], dtype=np.float64)
+    greens = np.array([green_percents[s] if v and green_percents[s] is not None else np.nan
+                       for s, v in zip(slot_of, valid)], dtype=np.float64)
+    greens = np.where(np.isnan(green_overrides), greens, green_overrides)
+    mitigated, levels = classify_uhi_arrays(temps, greens)
+    ground_temps = ground_temp_model.predict_batch(
+        [unique[s]["lat"] if s is not None else np.nan for s in slot_of],
+        [unique[s]["lon"] if s is not None else np.nan for s in slot_of],
+        temps
+    )
+
+    for index, slot in enumerate(slot_of):
+        if slot is None:
+            continue
+        location = unique[slot]
+        result = {"lat": raw_points[index].get("lat"), "lon": raw_points[index].get("lon")}
+        if "key" in location:
+            result.update({"city": location["name"], "city_key": location["key"]})
+        if not valid[index]:
+            result["error"] = errors[slot] or "No satellite data"
+        else:
+            result.update({
+                "avg_temp": float(temps[index]),
+                "mitigated_temp": None if np.isnan(mitigated[index]) else float(mitigated[index]),
+                "green_space_percent": None if np.isnan(greens[index]) else float(greens[index]),
+                "risk_level": str(levels[index]),
+                "ground_temp": None if np.isnan(ground_temps[index]) else float(ground_temps[index]),
+            })
+        results[index] = result
+
+    return results
@@ -0,0 +1,243 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from .metrics import record_cache_lookup
+
+logger = logging.getLogger(__name__)
+
+# ------------------ Cache Settings ------------------
+CACHE_DIR = os.environ.get(
+    "UHI_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "cache")
+)
+CACHE_MAX_ENTRIES = int(os.environ.get("UHI_CACHE_MAX_ENTRIES", "4096"))
+CACHE_MAX_ROWS = int(os.environ.get("UHI_CACHE_MAX_ROWS", "200000"))  # SQLite rows kept (oldest writes go first)
+CACHE_PRUNE_EVERY = int(os.environ.get("UHI_CACHE_PRUNE_EVERY", "500"))  # writes between prunes, per process
+CACHE_MISSING_TTL = float(os.environ.get("UHI_CACHE_MISSING_TTL", str(6 * 3600)))  # seconds a "no data" result is kept
+SQLITE_BUSY_TIMEOUT = float(os.environ.get("UHI_CACHE_BUSY_TIMEOUT", "5"))  # seconds to wait for a writer
+COORD_DECIMALS = 3  # ~110 m, nearby requests share an entry
+
+# Dataset names used in cache keys
+LST_DATASET = "modis_lst_day"
+NDVI_GREEN_DATASET = "modis_ndvi_green"
+S2_GREEN_DATASET = "s2_green"
+LAST_KNOWN_GOOD_DATASET = "uhi_metrics_lkg"  # last successful metrics per location (fallback only)
+
+# Seconds each dataset stays fresh; None never expires (fixed 2023 windows)
+DATASET_TTLS = {
+    LST_DATASET: None,
+    NDVI_GREEN_DATASET: None,
+    S2_GREEN_DATASET: 24 * 3600,  # trailing 365-day window, refreshed daily
+    LAST_KNOWN_GOOD_DATASET: None,  # overwritten by every fresh result
+}
+DEFAULT_TTL = 24 * 3600
+
+
+def make_key(dataset, lat, lon, radius_km=None, window=None, scale=None):
+    """
+    Cache key from quantized coordinates, radius, dataset and date window.
+    `scale` (m) is only given for reductions coarser than the dataset's native scale.
+    """
+    window = ":".join(str(part) for part in window) if window else "-"
+    radius = "-" if radius_km is None else f"{float(radius_km):g}"
+    key = f"{dataset}|{float(lat):.{COORD_DECIMALS}f}|{float(lon):.{COORD_DECIMALS}f}|{radius}|{window}"
+    return key if scale is None else f"{key}|{scale:g}m"
+
+
+# ------------------ Two-Level Result Cache ------------------
+class ResultCache:
+    """
+    Size-bounded in-memory LRU in front of a SQLite store that survives restarts.
+    The store runs in WAL mode so prefork workers share it: a value computed by one
+    worker is a disk hit for every other. Each process opens its own connection
+    (re-opened after fork). Values must be JSON serializable; set() never stores None, while
+    set_missing() records that a lookup has no data (a hit whose value is None) for `missing_ttl`
+    seconds so it is not re-evaluated on every request.
+    Every `prune_every` writes (and on a process's first write) expired rows are deleted
+    and the table is trimmed to `max_rows`, dropping the least recently written rows.
+    """
+
+    def __init__(self, path, max_entries=CACHE_MAX_ENTRIES, ttls=None, max_rows=CACHE_MAX_ROWS,
+                 prune_every=CACHE_PRUNE_EVERY, missing_ttl=CACHE_MISSING_TTL):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttls = dict(DATASET_TTLS if ttls is None else ttls)
+        self.max_rows = max_rows
+        self.prune_every = prune_every
+        self.missing_ttl = missing_ttl
+        self._memory = OrderedDict()  # key -> (value, expires_at)
+        self._lock = threading.Lock()
+        self._conn = None
+        self._conn_pid = None
+        self._writes_until_prune = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def _connection(self):
+        if self._conn is not None and self._conn_pid != os.getpid():
+            # Inherited across fork: SQLite connections must not be shared between processes
+            self._conn = None
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=SQLITE_BUSY_TIMEOUT, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")  # concurrent readers alongside one writer
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                "key TEXT PRIMARY KEY, dataset TEXT, value TEXT, created_at REAL, expires_at REAL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS results_created_at ON results (created_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS results_expires_at ON results (expires_at)")
+            conn.commit()
+            self._conn, self._conn_pid = conn, os.getpid()
+        return self._conn
+
+    def after_fork(self):
+        """Drop state inherited from the parent process (called from the server's post_fork hook)."""
+        self._lock = threading.Lock()  # may have been held by another thread at fork time
+        self._conn = None
+        self._conn_pid = None
+        self._writes_until_prune = 0
+        self.hits = self.disk_hits = self.misses = 0
+
+    def _remember(self, key, value, expires_at):
+        self._memory[key] = (value, expires_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, key):
+        """Return (hit, value) for a key, checking memory first and then disk."""
+        now = time.time()
+        dataset = key.split("|", 1)[0]
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at is None or expires_at > now:
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                    record_cache_lookup(dataset, "memory")
+                    return True, value
+                del self._memory[key]
+
+            try:
+                row = self._connection().execute(
+                    "SELECT value, expires_at FROM results WHERE key = ?", (key,)
+                ).fetchone()
+            except sqlite3.Error as e:
+                logger.warning(f"⚠️ Result cache read failed: {e}")
+                row = None
+
+            if row is not None and (row[1] is None or row[1] > now):
+                value = json.loads(row[0])
+                self._remember(key, value, row[1])
+                self.disk_hits += 1
+                record_cache_lookup(dataset, "disk")
+                return True, value
+
+            self.misses += 1
+            record_cache_lookup(dataset, "miss")
+            return False, None
+
+    def peek(self, key):
+        """Value held in memory for a key (no disk read, expiry check or hit accounting), or None."""
+        with self._lock:
+            entry = self._memory.get(key)
+            return None if entry is None else entry[0]
+
+    def set(self, key, dataset, value):
+        if value is None:
+            return
+        self._write(key, dataset, value, self.ttls.get(dataset, DEFAULT_TTL))
+
+    def set_missing(self, key, dataset):
+        """Cache that `key` has no data; get() returns (True, None) until it expires."""
+        ttl = self.ttls.get(dataset, DEFAULT_TTL)
+        self._write(key, dataset, None, self.missing_ttl if ttl is None else min(ttl, self.missing_ttl))
+
+    def _write(self, key, dataset, value, ttl):
+        now = time.time()
+        expires_at = None if ttl is None else now + ttl
+        with self._lock:
+            self._remember(key, value, expires_at)
+            try:
+                conn = self._connection()
+                conn.execute(
+                    "INSERT OR REPLACE INTO results (key, dataset, value, created_at, expires_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (key, dataset, json.dumps(value), now, expires_at)
+                )
+                conn.commit()
+            except sqlite3.Error as e:
+                logger.warning(f"⚠️ Result cache write failed: {e}")
+                return
+
+            self._writes_until_prune -= 1
+            if self._writes_until_prune <= 0:
+                self._writes_until_prune = self.prune_every
+                self._prune(now)
+
+    def prune(self):
+        """Delete expired rows and trim the table to max_rows. Returns the number of rows removed."""
+        with self._lock:
+            return self._prune(time.time())
+
+    def _prune(self, now):
+        try:
+            conn = self._connection()
+            removed = conn.execute(
+                "DELETE FROM results WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,)).rowcount
+            excess = conn.execute("SELECT COUNT(*) FROM results").fetchone()[0] - self.max_rows
+            if excess > 0:
+                removed += conn.execute(
+                    "DELETE FROM results WHERE key IN "
+                    "(SELECT key FROM results ORDER BY created_at LIMIT ?)", (excess,)).rowcount
+            conn.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"⚠️ Result cache prune failed: {e}")
+            return 0
+        if removed:
+            logger.info(f"🧹 Result cache pruned {removed} row(s)")
+        return removed
+
+    def get_or_compute(self, dataset, lat, lon, compute, radius_km=None, window=None, scale=None):
+        """Return the cached value for these parameters, computing and storing it on a miss."""
+        key = make_key(dataset, lat, lon, radius_km, window, scale)
+        hit, value = self.get(key)
+        if hit:
+            return value
+        value = compute()
+        self.set(key, dataset, value)
+        return value
+
+    def clear(self):
+        """Drop every cached entry, in memory and on disk."""
+        with self._lock:
+            self._memory.clear()
+            try:
+                conn = self._connection()
+                conn.execute("DELETE FROM results")
+                conn.commit()
+            except sqlite3.Error as e:
+                logger.warning(f"⚠️ Result cache clear failed: {e}")
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "memory_hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": round((self.hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+                "memory_entries": len(self._memory),
+                "max_entries": self.max_entries,
+            }
+
+
+result_cache = ResultCache(os.path.join(CACHE_DIR, "results.sqlite3"))
@@ -1,51 +1,101 @@
-CITY_COORDINATES = [
-    {"name": "Mumbai", "lat": 19.0760, "lon": 72.8777},
-    {"name": "Delhi", "lat": 28.7041, "lon": 77.1025},
-    {"name": "Bangalore", "lat": 12.9716, "lon": 77.5946},
-    {"name": "Hyderabad", "lat": 17.3850, "lon": 78.4867},
-    {"name": "Ahmedabad", "lat": 23.0225, "lon": 72.5714},
-    {"name": "Chennai", "lat": 13.0827, "lon": 80.2707},
-    {"name": "Kolkata", "lat": 22.5726, "lon": 88.3639},
-    {"name": "Pune", "lat": 18.5204, "lon": 73.8567},
-    {"name": "Jaipur", "lat": 26.9124, "lon": 75.7873},
-    {"name": "Surat", "lat": 21.1702, "lon": 72.8311},
-    {"name": "Lucknow", "lat": 26.8467, "lon": 80.9462},
-    {"name": "Kanpur", "lat": 26.4499, "lon": 80.3319},
-    {"name": "Nagpur", "lat": 21.1458, "lon": 79.0882},
-    {"name": "Indore", "lat": 22.7196, "lon": 75.8577},
-    {"name": "Thane", "lat": 19.2183, "lon": 72.9781},
-    {"name": "Bhopal", "lat": 23.2599, "lon": 77.4126},
-    {"name": "Visakhapatnam", "lat": 17.6868, "lon": 83.2185},
-    {"name": "Patna", "lat": 25.5941, "lon": 85.1376},
-    {"name": "Vadodara", "lat": 22.3072, "lon": 73.1812},
-    {"name": "Ghaziabad", "lat": 28.6692, "lon": 77.4538},
-    {"name": "Ludhiana", "lat": 30.9000, "lon": 75.8573},
-    {"name": "Agra", "lat": 27.1767, "lon": 78.0081},
-    {"name": "Nashik", "lat": 19.9975, "lon": 73.7898},
-    {"name": "Faridabad", "lat": 28.4089, "lon": 77.3178},
-    {"name": "Meerut", "lat": 28.9845, "lon": 77.7064},
-    {"name": "Rajkot", "lat": 22.3039, "lon": 70.8022},
-    {"name": "Kalyan-Dombivli", "lat": 19.2403, "lon": 73.1305},
-    {"name": "Vasai-Virar", "lat": 19.3919, "lon": 72.8397},
-    {"name": "Varanasi", "lat": 25.3176, "lon": 82.9739},
-    {"name": "Srinagar", "lat": 34.0837, "lon": 74.7973},
-    {"name": "Aurangabad", "lat": 19.8762, "lon": 75.3433},
-    {"name": "Dhanbad", "lat": 23.7957, "lon": 86.4304},
-    {"name": "Amritsar", "lat": 31.6340, "lon": 74.8723},
-    {"name": "Navi Mumbai", "lat": 19.0330, "lon": 73.0297},
-    {"name": "Allahabad (Prayagraj)", "lat": 25.4358, "lon": 81.8463},
-    {"name": "Ranchi", "lat": 23.3441, "lon": 85.3096},
-    {"name": "Howrah", "lat": 22.5958, "lon": 88.2636},
-    {"name": "Coimbatore", "lat": 11.0168, "lon": 76.9558},
-    {"name": "Jabalpur", "lat": 23.1815, "lon": 79.9864},
-    {"name": "Gwalior", "lat": 26.2183, "lon": 78.1828},
-    {"name": "Vijayawada", "lat": 16.5062, "lon": 80.6480},
-    {"name": "Madurai", "lat": 9.9252, "lon": 78.1198},
-    {"name": "Guwahati", "lat": 26.1445, "lon": 91.7362},
-    {"name": "Chandigarh", "lat": 30.7333, "lon": 76.7794},
-    {"name": "Hubli-Dharwad", "lat": 15.3647, "lon": 75.1240},
-    {"name": "Amravati", "lat": 20.9374, "lon": 77.7796},
-    {"name": "Tiruchirappalli", "lat": 10.7905, "lon": 78.7047},
-    {"name": "Jodhpur", "lat": 26.2389, "lon": 73.0243},
-    {"name": "Raipur", "lat": 21.2514, "lon": 81.6296}
-]
+import json
+import math
+import os
+import re
+from .geo import KM_PER_DEG
+
+# ------------------ Registry Settings ------------------
+CITIES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "indian_cities.json")
+MATCH_TOLERANCE_KM = float(os.environ.get("UHI_CITY_MATCH_KM", "2.0"))
+GRID_CELL_DEG = 0.25  # ~28 km spatial index cells
+EARTH_RADIUS_KM = 6371.0
+
+
+def city_key(name):
+    """Canonical key for a city name, e.g. "Navi Mumbai" -> "navi-mumbai"."""
+    return re.sub(r"[^a-z0-9]+", "-", name.lower()).strip("-")
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlmb = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlmb / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+# ------------------ City Registry ------------------
+class CityRegistry:
+    """
+    All known cities, indexed on a regular lat/lon grid so nearest-city and
+    bounding-box lookups only touch the few cells around the query.
+    """
+
+    def __init__(self, cities=(), cell_deg=GRID_CELL_DEG):
+        self.cell_deg = cell_deg
+        self.cities = []
+        self._grid = {}
+        self._by_key = {}
+        for city in cities:
+            self.add(city)
+
+    @classmethod
+    def from_file(cls, path=CITIES_FILE):
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def _cell(self, lat, lon):
+        return int(math.floor(lat / self.cell_deg)), int(math.floor(lon / self.cell_deg))
+
+    def add(self, city):
+        entry = {
+            "key": city.get("key") or city_key(city["name"]),
+            "name": city["name"],
+            "lat": float(city["lat"]),
+            "lon": float(city["lon"]),
+        }
+        self.cities.append(entry)
+        self._grid.setdefault(self._cell(entry["lat"], entry["lon"]), []).append(entry)
+        for name in [entry["key"], entry["name"]] + list(city.get("aliases", [])):
+            self._by_key.setdefault(city_key(name), entry)
+        return entry
+
+    def get(self, name_or_key):
+        """Look a city up by canonical key, name or alias."""
+        return self._by_key.get(city_key(name_or_key)) if name_or_key else None
+
+    def nearest(self, lat, lon, max_km=MATCH_TOLERANCE_KM):
+        """Closest registered city within `max_km` of (lat, lon), or None."""
+        dlat = max_km / KM_PER_DEG
+        dlon = max_km / (KM_PER_DEG * max(math.cos(math.radians(lat)), 1e-6))
+        best, best_km = None, max_km
+        for city in self._candidates(lat - dlat, lon - dlon, lat + dlat, lon + dlon):
+            distance = haversine_km(lat, lon, city["lat"], city["lon"])
+            if distance <= best_km:
+                best, best_km = city, distance
+        return best
+
+    def within_bbox(self, min_lat, min_lon, max_lat, max_lon):
+        """Registered cities inside the bounding box."""
+        return [
+            c for c in self._candidates(min_lat, min_lon, max_lat, max_lon)
+            if min_lat <= c["lat"] <= max_lat and min_lon <= c["lon"] <= max_lon
+        ]
+
+    def _candidates(self, min_lat, min_lon, max_lat, max_lon):
+        row_min, col_min = self._cell(min_lat, min_lon)
+        row_max, col_max = self._cell(max_lat, max_lon)
+        if (row_max - row_min + 1) * (col_max - col_min + 1) > len(self._grid):
+            # Query covers more cells than exist; walk the occupied ones instead
+            for (row, col), entries in self._grid.items():
+                if row_min <= row <= row_max and col_min <= col <= col_max:
+                    yield from entries
+            return
+        for row in range(row_min, row_max + 1):
+            for col in range(col_min, col_max + 1):
+                yield from self._grid.get((row, col), ())
+
+
+# Loaded once per process
+registry = CityRegistry.from_file()
+CITIES = registry.cities
@@ -0,0 +1,219 @@
+import logging
+import math
+import os
+import threading
+from collections import OrderedDict
+import ee
+import numpy as np
+from .composites import LST_BAND, LST_END, LST_START, lst_mean_image, ndvi_mean_image
+from .ee_session import ensure_initialized
+from .geo import KM_PER_DEG, fetch_pixels
+from .metrics import record_cache_lookup, timed
+from .singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+# ------------------ Grid Settings ------------------
+GRID_DIR = os.environ.get(
+    "UHI_GRID_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "grids")
+)
+GRID_RADIUS_KM = float(os.environ.get("UHI_GRID_RADIUS_KM", "15"))  # half-width of the city box
+GRID_RES_DEG = float(os.environ.get("UHI_GRID_RES_DEG", "0.001"))   # ~110 m cells
+GRID_MEMORY_ENTRIES = int(os.environ.get("UHI_GRID_MEMORY_ENTRIES", "8"))
+GREEN_BUFFER_M = 500      # neighbourhood for the per-cell green fraction
+HOTSPOT_COUNT = 10
+MAX_HOTSPOTS = 100
+GRID_DATASET = "city_grid"  # cache lookup label
+
+# ESA WorldCover classes
+VEGETATION_CLASSES = (10, 20, 30, 40)  # tree cover, shrubland, grassland, cropland (rural baseline)
+BUILT_UP_CLASS = 50
+LAND_COVER_NAMES = {
+    10: "Tree cover", 20: "Shrubland", 30: "Grassland", 40: "Cropland", 50: "Built-up",
+    60: "Bare / sparse vegetation", 70: "Snow and ice", 80: "Water", 90: "Herbaceous wetland",
+    95: "Mangroves", 100: "Moss and lichen",
+}
+
+grid_flight = SingleFlight("city_grid")
+
+
+def city_bounds(city, radius_km=GRID_RADIUS_KM, res=GRID_RES_DEG):
+    """Grid-aligned (min_lon, min_lat, max_lon, max_lat) of a square box around the city."""
+    dlat = radius_km / KM_PER_DEG
+    dlon = radius_km / (KM_PER_DEG * max(math.cos(math.radians(city["lat"])), 1e-6))
+    snap = lambda v, fn: round(fn(v / res) * res, 6)
+    return (snap(city["lon"] - dlon, math.floor), snap(city["lat"] - dlat, math.floor),
+            snap(city["lon"] + dlon, math.ceil), snap(city["lat"] + dlat, math.ceil))
+
+
+# ------------------ Earth Engine Download ------------------
+def fetch_city_pixels(bounds, res=GRID_RES_DEG, start_date=LST_START, end_date=LST_END):
+    """
+    LST (°C), NDVI and WorldCover class for every grid cell of `bounds`, stacked into one
+    image and downloaded with a single computePixels request. NaN marks missing data.
+    """
+    ensure_initialized()
+    min_lon, min_lat, max_lon, max_lat = bounds
+    width = int(round((max_lon - min_lon) / res))
+    height = int(round((max_lat - min_lat) / res))
+    region = ee.Geometry.Rectangle([min_lon, min_lat, max_lon, max_lat])
+
+    lst = lst_mean_image(region, start_date, end_date).select(LST_BAND).multiply(0.02).subtract(273.15)
+    ndvi = ndvi_mean_image(region, start_date, end_date)
+    land_cover = ee.ImageCollection("ESA/WorldCover/v100").first()
+    image = lst.rename("lst").toFloat() \
+        .addBands(ndvi.rename("ndvi").toFloat()) \
+        .addBands(land_cover.rename("land_cover").toFloat())
+
+    with timed("city_grid_download", GRID_DATASET):
+        return fetch_pixels(image, res, min_lon, max_lat, width, height, bands=("lst", "ndvi", "land_cover"))
+
+
+# ------------------ Grid Store ------------------
+class CityGridStore:
+    """
+    Downloaded city grids as .npz files keyed by city, date window and grid geometry, with
+    a small in-memory LRU in front. A city is downloaded at most once per window; identical
+    concurrent requests share one download.
+    """
+
+    def __init__(self, directory=GRID_DIR, max_entries=GRID_MEMORY_ENTRIES):
+        self.directory = directory
+        self.max_entries = max_entries
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.npz")
+
+    def _remember(self, key, grid):
+        with self._lock:
+            self._memory[key] = grid
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    def get(self, city, radius_km=GRID_RADIUS_KM, res=GRID_RES_DEG, start_date=LST_START, end_date=LST_END):
+        bounds = city_bounds(city, radius_km, res)
+        key = f"{city['key']}_{start_date}_{end_date}_{radius_km:g}km_{res:g}deg"
+
+        with self._lock:
+            grid = self._memory.get(key)
+            if grid is not None:
+                self._memory.move_to_end(key)
+                record_cache_lookup(GRID_DATASET, "memory")
+                return grid
+
+        path = self._path(key)
+        if os.path.exists(path):
+            with np.load(path) as data:
+                grid = {name: data[name] for name in data.files}
+            record_cache_lookup(GRID_DATASET, "disk")
+            self._remember(key, grid)
+            return grid
+
+        record_cache_lookup(GRID_DATASET, "miss")
+        return grid_flight.do(key, lambda: self._download(key, bounds, res, start_date, end_date))
+
+    def _download(self, key, bounds, res, start_date, end_date):
+        grid = fetch_city_pixels(bounds, res, start_date, end_date)
+        grid["bounds"] = np.asarray(bounds, dtype=np.float64)
+        grid["res"] = np.float64(res)
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.partial.npz"
+        np.savez_compressed(tmp_path, **grid)
+        os.replace(tmp_path, path)  # readers never see a half-written grid
+        self._remember(key, grid)
+        logger.info(f"✅ City grid {key}: {grid['lst'].shape[0]}x{grid['lst'].shape[1]} cells downloaded")
+        return grid
+
+
+# ------------------ Local Analysis ------------------
+def box_mean(values, radius):
+    """
+    Mean over the (2r+1)² window around every cell, ignoring NaN, as a box convolution
+    computed from summed-area tables (O(cells) regardless of the window size).
+    """
+    valid = ~np.isnan(values)
+    k = 2 * radius + 1
+
+    def window_sum(array):
+        table = np.pad(array, ((radius + 1, radius), (radius + 1, radius))).cumsum(0).cumsum(1)
+        return table[k:, k:] - table[:-k, k:] - table[k:, :-k] + table[:-k, :-k]
+
+    counts = window_sum(valid.astype(np.float64))
+    sums = window_sum(np.where(valid, values, 0.0).astype(np.float64))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(counts > 0, sums / counts, np.nan)
+
+
+def _local_maxima(values):
+    """Cells not exceeded by any of their 8 neighbours (NaN never qualifies)."""
+    padded = np.pad(np.nan_to_num(values, nan=-np.inf), 1, constant_values=-np.inf)
+    height, width = values.shape
+    neighbours = np.stack([padded[1 + dr:1 + dr + height, 1 + dc:1 + dc + width]
+                           for dr in (-1, 0, 1) for dc in (-1, 0, 1) if dr or dc])
+    return ~np.isnan(values) & (values >= neighbours.max(axis=0))
+
+
+def _rounded(value, decimals=2):
+    return None if value is None or np.isnan(value) else round(float(value), decimals)
+
+
+def analyze_grid(grid, green_buffer_m=GREEN_BUFFER_M, hotspots=HOTSPOT_COUNT, include_cells=False):
+    """
+    Per-cell UHI intensity (LST minus the mean LST of WorldCover vegetation cells), green
+    fraction within `green_buffer_m`, and the hottest local maxima ranked by intensity.
+    """
+    lst, ndvi, land_cover = grid["lst"], grid["ndvi"], grid["land_cover"]
+    min_lon, min_lat, max_lon, max_lat = (float(v) for v in grid["bounds"])
+    res = float(grid["res"])
+
+    vegetation = np.isin(land_cover, VEGETATION_CLASSES)
+    built_up = land_cover == BUILT_UP_CLASS
+    rural = vegetation & ~np.isnan(lst)
+    baseline = float(lst[rural].mean()) if rural.any() else np.nan
+    intensity = lst - baseline
+
+    radius_cells = max(int(round(green_buffer_m / (res * KM_PER_DEG * 1000))), 0)
+    green = box_mean(np.where(np.isnan(land_cover), np.nan, vegetation.astype(np.float64)), radius_cells)
+
+    candidates = np.flatnonzero(_local_maxima(intensity))
+    ranked = candidates[np.argsort(intensity.ravel()[candidates])[::-1][:hotspots]]
+    rows, cols = np.unravel_index(ranked, intensity.shape)
+    hotspot_records = [{
+        "rank": rank + 1,
+        "lat": round(max_lat - (r + 0.5) * res, 5),
+        "lon": round(min_lon + (c + 0.5) * res, 5),
+        "uhi_intensity": _rounded(intensity[r, c]),
+        "lst": _rounded(lst[r, c]),
+        "ndvi": _rounded(ndvi[r, c], 4),
+        "green_fraction": _rounded(green[r, c], 4),
+        "land_cover": LAND_COVER_NAMES.get(int(land_cover[r, c])) if not np.isnan(land_cover[r, c]) else None,
+    } for rank, (r, c) in enumerate(zip(rows.tolist(), cols.tolist()))]
+
+    urban = built_up & ~np.isnan(lst)
+    result = {
+        "bounds": [min_lon, min_lat, max_lon, max_lat],
+        "resolution_deg": res,
+        "shape": list(lst.shape),
+        "rural_baseline_lst": _rounded(baseline),
+        "urban_mean_lst": _rounded(lst[urban].mean()) if urban.any() else None,
+        "uhi_intensity": _rounded(lst[urban].mean() - baseline) if urban.any() else None,
+        "max_uhi_intensity": _rounded(np.nanmax(intensity)) if not np.isnan(intensity).all() else None,
+        "green_fraction": _rounded(np.nanmean(green), 4) if not np.isnan(green).all() else None,
+        "cells": {"total": int(lst.size), "with_lst": int((~np.isnan(lst)).sum()),
+                  "rural": int(rural.sum()), "built_up": int(built_up.sum())},
+        "hotspots": hotspot_records,
+    }
+    if include_cells:
+        result["grid"] = {
+            "uhi_intensity": np.where(np.isnan(intensity), None, np.round(intensity, 2)).tolist(),
+            "green_fraction": np.where(np.isnan(green), None, np.round(green, 3)).tolist(),
+        }
+    return result
+
+
+city_grid_store = CityGridStore()
@@ -0,0 +1,102 @@
+import datetime
+import ee
+
+# ------------------ Dataset Windows ------------------
+LST_START, LST_END = "2023-01-01", "2023-12-31"
+LST_BAND = "LST_Day_1km"
+GREEN_BAND = "NDVI"
+
+# LST heatmap styling (°C), shared by Earth Engine map URLs and local tiles
+LST_VIS_MIN, LST_VIS_MAX = 20, 45
+LST_PALETTE = ["blue", "cyan", "green", "yellow", "orange", "red"]
+
+
+def green_space_window(today=None):
+    """Trailing 1-year window used for the Sentinel-2 green space composite."""
+    end_date = today or datetime.date.today()
+    start_date = end_date - datetime.timedelta(days=365)
+    return str(start_date), str(end_date)
+
+
+def lst_to_celsius(raw):
+    """Convert a MODIS LST_Day_1km value (scaled Kelvin) to rounded Celsius."""
+    if raw is None:
+        return None
+    return round((raw * 0.02) - 273.15, 2)
+
+
+# ------------------ MODIS LST (Day) ------------------
+def lst_collection(region, start_date=LST_START, end_date=LST_END):
+    return ee.ImageCollection("MODIS/061/MOD11A1") \
+        .filterDate(start_date, end_date) \
+        .filterBounds(region) \
+        .select(LST_BAND)
+
+
+def lst_mean_image(region, start_date=LST_START, end_date=LST_END):
+    """
+    Mean LST image over the window.
+    Empty collections are handled server-side: a fully masked band is returned
+    instead, so reductions yield null rather than failing on a band-less image.
+    """
+    collection = lst_collection(region, start_date, end_date)
+    empty = ee.Image.constant(0).rename(LST_BAND).updateMask(0)
+    return ee.Image(ee.Algorithms.If(collection.size().gt(0), collection.mean(), empty))
+
+
+# ------------------ MODIS NDVI ------------------
+def ndvi_mean_image(region, start_date=LST_START, end_date=LST_END):
+    """
+    Mean MODIS NDVI (band "NDVI", unscaled -1..1) over the window. Like lst_mean_image,
+    a window without 16-day composites yields a fully masked band instead of failing.
+    """
+    collection = ee.ImageCollection("MODIS/061/MOD13A1") \
+        .filterDate(start_date, end_date) \
+        .filterBounds(region) \
+        .select(GREEN_BAND)
+    empty = ee.Image.constant(0).rename(GREEN_BAND).updateMask(0)
+    mean = ee.Image(ee.Algorithms.If(collection.size().gt(0), collection.mean(), empty))
+    return mean.multiply(0.0001).rename(GREEN_BAND)
+
+
+# ------------------ MODIS NDVI Green Space ------------------
+def ndvi_green_image(start_date=LST_START, end_date=LST_END):
+    """Binary vegetation image (band "NDVI") from annual mean MODIS NDVI > 0.3 (500 m)."""
+    return ee.ImageCollection("MODIS/061/MOD13A1") \
+        .filterDate(start_date, end_date) \
+        .select(GREEN_BAND) \
+        .mean() \
+        .gt(3000)  # NDVI > 0.3
+
+
+# ------------------ Sentinel-2 Green Space ------------------
+def green_space_image(region, start_date=None, end_date=None):
+    """
+    Binary vegetation image (band "NDVI") from Sentinel-2 and ESA WorldCover.
+    Its regional mean over a buffer is the green space fraction (x 100 = green space %).
+    """
+    if start_date is None or end_date is None:
+        start_date, end_date = green_space_window()
+
+    collection = (
+        ee.ImageCollection("COPERNICUS/S2_SR_HARMONIZED")
+        .filterBounds(region)
+        .filterDate(start_date, end_date)
+        .filter(ee.Filter.lt("CLOUDY_PIXEL_PERCENTAGE", 20))
+        .select(["B8", "B4"])  # NIR and Red bands
+    )
+
+    image = collection.median()
+
+    # NDVI calculation
+    ndvi = image.normalizedDifference(["B8", "B4"]).rename(GREEN_BAND)
+
+    # Consider vegetation if NDVI > 0.2 (captures both dense & sparse vegetation)
+    green_pixels = ndvi.gt(0.2)
+
+    # Mask urban area from ESA WorldCover but keep vegetation too
+    worldcover = ee.ImageCollection("ESA/WorldCover/v100").first().clip(region)
+    # Class 50 = Tree cover, 40 = Shrubland, 30 = Grassland
+    vegetation_mask = worldcover.remap([10, 20, 30, 40, 50, 60, 70, 80, 90, 95, 100],
+                                       [0, 0, 1, 1, 1, 0, 0, 0, 0, 0, 0])
+    return green_pixels.updateMask(vegetation_mask)
@@ -0,0 +1,306 @@
+import concurrent.futures
+import contextlib
+import contextvars
+import logging
+import os
+import random
+import threading
+import time
+from .metrics import record_ee_call
+
+logger = logging.getLogger(__name__)
+
+# ------------------ Executor Settings ------------------
+EE_MAX_CONCURRENCY = int(os.environ.get("UHI_EE_MAX_CONCURRENCY", "8"))
+EE_RATE_LIMIT = float(os.environ.get("UHI_EE_RATE_LIMIT", "20"))  # calls per second, 0 = unlimited
+EE_RATE_BURST = int(os.environ.get("UHI_EE_RATE_BURST", "10"))
+EE_MAX_RETRIES = int(os.environ.get("UHI_EE_MAX_RETRIES", "4"))
+EE_CALL_DEADLINE = float(os.environ.get("UHI_EE_CALL_DEADLINE", "120"))  # seconds
+EE_BREAKER_FAILURES = int(os.environ.get("UHI_EE_BREAKER_FAILURES", "5"))  # consecutive failures, 0 = off
+EE_BREAKER_COOLDOWN = float(os.environ.get("UHI_EE_BREAKER_COOLDOWN", "30"))  # seconds open before a trial call
+
+# Substrings of Earth Engine / transport errors worth retrying
+TRANSIENT_MARKERS = (
+    "quota", "rate limit", "too many requests", "429", "500", "502", "503", "504",
+    "timed out", "timeout", "temporarily", "unavailable", "internal error", "connection",
+)
+
+
+# How long callers on this context wait for executor calls (time.monotonic() deadline).
+# A call they stop waiting for keeps running and reports its own outcome to the breaker.
+_wait_deadline = contextvars.ContextVar("ee_wait_deadline", default=None)
+
+
+class WaitDeadlineExceeded(TimeoutError):
+    """The caller stopped waiting at its wait deadline; the Earth Engine call keeps running."""
+
+
+@contextlib.contextmanager
+def wait_deadline(deadline_at):
+    """Bound how long executor calls made inside the block are waited for."""
+    token = _wait_deadline.set(deadline_at)
+    try:
+        yield
+    finally:
+        _wait_deadline.reset(token)
+
+
+def is_transient(exc):
+    if isinstance(exc, (ConnectionError, TimeoutError)):
+        return True
+    message = str(exc).lower()
+    return any(marker in message for marker in TRANSIENT_MARKERS)
+
+
+# ------------------ Token Bucket ------------------
+class TokenBucket:
+    """Thread-safe token bucket; `rate` tokens per second up to `capacity`."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = max(1, capacity)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, timeout=None):
+        """Take one token, waiting at most `timeout` seconds. Returns False on timeout."""
+        if self.rate <= 0:
+            return True
+        end = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                wait = (1 - self._tokens) / self.rate
+            if end is not None and now + wait > end:
+                return False
+            time.sleep(wait)
+
+
+# ------------------ Circuit Breaker ------------------
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling Earth Engine while the circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """
+    Opens after `threshold` consecutive failed calls; while open, calls fail fast.
+    After `cooldown` seconds one trial call is let through (half-open): success
+    closes the circuit, failure re-opens it for another cool-down.
+    """
+
+    def __init__(self, threshold=EE_BREAKER_FAILURES, cooldown=EE_BREAKER_COOLDOWN):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self._opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """True if a call may proceed now."""
+        if self.threshold <= 0:
+            return True
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if self._trial or time.monotonic() - self._opened_at < self.cooldown:
+                return False
+            self._trial = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            if self._opened_at is not None:
+                logger.info("✅ Earth Engine circuit closed")
+            self.failures = 0
+            self._opened_at = None
+            self._trial = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.threshold <= 0 or not (self._trial or self.failures >= self.threshold):
+                return
+            if self._opened_at is None or self._trial:
+                logger.warning(f"⚠️ Earth Engine circuit opened after {self.failures} consecutive failures")
+            self._opened_at = time.monotonic()
+            self._trial = False
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            return "half_open" if self._trial else "open"
+
+
+# ------------------ Earth Engine Executor ------------------
+class EEExecutor:
+    """
+    Shared gateway for blocking Earth Engine calls.
+    Calls run on a bounded thread pool, pass through a token-bucket rate limiter,
+    are retried with jittered exponential backoff on transient errors and give up
+    once their deadline has passed. Repeated transient failures open a circuit
+    breaker so later calls fail fast with CircuitOpenError. Calls made from inside a
+    pool worker (e.g. a fanned-out task) run inline on that worker so nested work
+    cannot deadlock.
+    """
+
+    def __init__(self, max_workers=EE_MAX_CONCURRENCY, rate=EE_RATE_LIMIT, burst=EE_RATE_BURST,
+                 max_retries=EE_MAX_RETRIES, deadline=EE_CALL_DEADLINE, base_delay=0.5, max_delay=8.0,
+                 breaker=None):
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.deadline = deadline
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._bucket = TokenBucket(rate, burst)
+        self.breaker = breaker or CircuitBreaker()
+        self._local = threading.local()
+        self._pool = concurrent.futures.ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix="ee",
+            initializer=self._mark_worker
+        )
+
+    def _mark_worker(self):
+        self._local.is_worker = True
+
+    def _in_worker(self):
+        return getattr(self._local, "is_worker", False)
+
+    def _deadline_at(self, deadline):
+        return time.monotonic() + (self.deadline if deadline is None else deadline)
+
+    def _run_with_retry(self, fn, args, kwargs, deadline_at):
+        # One breaker check per call: retries of a half-open trial belong to that trial,
+        # and every admitted call reports exactly one outcome below
+        if not self.breaker.allow():
+            raise CircuitOpenError("Earth Engine circuit breaker is open after repeated failures")
+        attempt = 0
+        while True:
+            if not self._bucket.acquire(timeout=max(0.0, deadline_at - time.monotonic())):
+                self.breaker.record_failure()
+                raise TimeoutError("Earth Engine rate limiter wait exceeded the call deadline")
+            started = time.perf_counter()
+            try:
+                result = fn(*args, **kwargs)
+                record_ee_call(time.perf_counter() - started, "ok")
+                self.breaker.record_success()
+                return result
+            except Exception as e:
+                attempt += 1
+                if attempt > self.max_retries or not is_transient(e):
+                    record_ee_call(time.perf_counter() - started, "error")
+                    if is_transient(e):
+                        self.breaker.record_failure()
+                    else:  # Earth Engine answered; the request itself was invalid
+                        self.breaker.record_success()
+                    raise
+                record_ee_call(time.perf_counter() - started, "retried")
+                delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+                if time.monotonic() + delay >= deadline_at:
+                    self.breaker.record_failure()
+                    raise
+                logger.warning(
+                    f"⚠️ Transient Earth Engine error (attempt {attempt}/{self.max_retries}), "
+                    f"retrying in {delay:.2f}s: {e}"
+                )
+                time.sleep(delay)
+
+    def call(self, fn, *args, deadline=None, **kwargs):
+        """Run one Earth Engine call with rate limiting, retries and a deadline (seconds)."""
+        deadline_at = self._deadline_at(deadline)
+        if self._in_worker():
+            return self._run_with_retry(fn, args, kwargs, deadline_at)
+
+        # Run in a copy of the caller's context so metrics keep the stage and trace ID
+        future = self._pool.submit(contextvars.copy_context().run,
+                                   self._run_with_retry, fn, args, kwargs, deadline_at)
+        wait_at = _wait_deadline.get()
+        limit = deadline_at if wait_at is None else min(deadline_at, wait_at)
+        try:
+            return future.result(timeout=max(0.0, limit - time.monotonic()))
+        except concurrent.futures.TimeoutError:
+            if limit < deadline_at:
+                raise WaitDeadlineExceeded("Stopped waiting for Earth Engine at the caller's deadline") from None
+            future.cancel()
+            self.breaker.record_failure()
+            raise TimeoutError("Earth Engine call exceeded its deadline") from None
+
+    def get_info(self, obj, deadline=None):
+        """Evaluate an ee.ComputedObject through the executor."""
+        return self.call(obj.getInfo, deadline=deadline)
+
+    def map(self, fn, items, deadline=None):
+        """
+        Fan `fn` out over `items` on the pool. Returns results in input order, with
+        the raised exception in place of the result for items that failed.
+        """
+        items = list(items)
+        deadline_at = self._deadline_at(deadline)
+        results = []
+
+        if self._in_worker():
+            for item in items:
+                try:
+                    results.append(fn(item))
+                except Exception as e:
+                    results.append(e)
+            return results
+
+        futures = [self._pool.submit(contextvars.copy_context().run, fn, item) for item in items]
+        for future in futures:
+            try:
+                results.append(future.result(timeout=max(0.0, deadline_at - time.monotonic())))
+            except concurrent.futures.TimeoutError:
+                future.cancel()
+                results.append(TimeoutError("Earth Engine task exceeded its deadline"))
+            except Exception as e:
+                results.append(e)
+        return results
+
+    def imap_unordered(self, fn, items, deadline=None):
+        """
+        Fan `fn` out over `items` on the pool and yield (index, result) in completion
+        order, with the raised exception in place of the result for failed items.
+        """
+        items = list(items)
+        deadline_at = self._deadline_at(deadline)
+
+        if self._in_worker():
+            for index, item in enumerate(items):
+                try:
+                    yield index, fn(item)
+                except Exception as e:
+                    yield index, e
+            return
+
+        futures = {self._pool.submit(contextvars.copy_context().run, fn, item): index
+                   for index, item in enumerate(items)}
+        try:
+            for future in concurrent.futures.as_completed(
+                    list(futures), timeout=max(0.0, deadline_at - time.monotonic())):
+                index = futures.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    result = e
+                yield index, result
+        except concurrent.futures.TimeoutError:
+            for future, index in list(futures.items()):
+                future.cancel()
+                yield index, TimeoutError("Earth Engine task exceeded its deadline")
+        finally:
+            # The consumer stopped early; drop tasks that have not started
+            for future in futures:
+                future.cancel()
+
+
+ee_executor = EEExecutor()
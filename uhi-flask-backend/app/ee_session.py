@@ -0,0 +1,105 @@
+import logging
+import os
+import threading
+import time
+import ee
+
+logger = logging.getLogger(__name__)
+
+# ------------------ Earth Engine Settings ------------------
+EE_PROJECT = os.environ.get("EE_PROJECT", "earthengine-uhi")
+EE_SERVICE_ACCOUNT = os.environ.get("EE_SERVICE_ACCOUNT", "uhi-backend@earthengine-uhi.iam.gserviceaccount.com")
+EE_KEY_FILE = os.environ.get("EE_KEY_FILE")  # service-account JSON key; default credentials if unset
+EE_INIT_MIN_RETRY = 1.0    # seconds before the first re-attempt after a failure
+EE_INIT_MAX_RETRY = 60.0   # cap for the doubling retry interval
+
+
+# ------------------ Lazy Session ------------------
+class EESession:
+    """
+    Idempotent, once-per-process Earth Engine initialization.
+    The first caller initializes; later callers return immediately. After a failure,
+    new attempts are allowed again after a doubling cool-down instead of failing forever.
+    """
+
+    def __init__(self, project=EE_PROJECT, service_account=EE_SERVICE_ACCOUNT, key_file=EE_KEY_FILE):
+        self.project = project
+        self.service_account = service_account
+        self.key_file = key_file
+        self.ready = False
+        self.attempts = 0
+        self.last_error = None
+        self.initialized_at = None
+        self._retry_at = 0.0
+        self._retry_interval = EE_INIT_MIN_RETRY
+        self._lock = threading.Lock()
+        self._warmup_thread = None
+
+    def _initialize(self):
+        if self.key_file and os.path.exists(self.key_file):
+            credentials = ee.ServiceAccountCredentials(self.service_account, self.key_file)
+            ee.Initialize(credentials, project=self.project)
+            logger.info("✅ Earth Engine initialized successfully with service account!")
+        else:
+            ee.Initialize(project=self.project)
+            logger.info("✅ Earth Engine initialized successfully!")
+
+    def ensure_initialized(self):
+        """Initialize Earth Engine if needed; raises RuntimeError while it is unavailable."""
+        if self.ready:
+            return
+        with self._lock:
+            if self.ready:
+                return
+            if time.monotonic() < self._retry_at:
+                raise RuntimeError(f"Earth Engine not initialized (retrying soon): {self.last_error}")
+
+            self.attempts += 1
+            try:
+                self._initialize()
+            except Exception as e:
+                self.last_error = str(e)
+                self._retry_at = time.monotonic() + self._retry_interval
+                self._retry_interval = min(self._retry_interval * 2, EE_INIT_MAX_RETRY)
+                logger.error(f"❌ Failed to initialize Earth Engine (attempt {self.attempts}): {e}")
+                raise RuntimeError(
+                    f"Failed to initialize Earth Engine: {e}. "
+                    f"Authenticate first using `earthengine authenticate`."
+                ) from e
+
+            self.ready = True
+            self.last_error = None
+            self.initialized_at = time.time()
+
+    def reset(self):
+        """Forget previous failures so the next call re-attempts immediately."""
+        with self._lock:
+            self.ready = False
+            self._retry_at = 0.0
+            self._retry_interval = EE_INIT_MIN_RETRY
+
+    def _warm_up(self):
+        while not self.ready:
+            try:
+                self.ensure_initialized()
+            except RuntimeError:
+                time.sleep(max(0.0, self._retry_at - time.monotonic()))
+
+    def start_warmup(self):
+        """Keep trying to initialize in a background thread until it succeeds."""
+        if self._warmup_thread is None and not self.ready:
+            self._warmup_thread = threading.Thread(target=self._warm_up, name="ee-warmup", daemon=True)
+            self._warmup_thread.start()
+
+    def status(self):
+        return {
+            "ready": self.ready,
+            "project": self.project,
+            "attempts": self.attempts,
+            "last_error": self.last_error,
+            "initialized_at": self.initialized_at,
+        }
+
+
+ee_session = EESession()
+ensure_initialized = ee_session.ensure_initialized
@@ -0,0 +1,109 @@
+import concurrent.futures
+import contextvars
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from .cache import LAST_KNOWN_GOOD_DATASET, make_key, result_cache
+from .ee_executor import CircuitOpenError, WaitDeadlineExceeded, wait_deadline
+
+logger = logging.getLogger(__name__)
+
+# ------------------ Degradation Settings ------------------
+REQUEST_BUDGET = float(os.environ.get("UHI_REQUEST_BUDGET_MS", "15000")) / 1000  # 0 = wait indefinitely
+BACKGROUND_WORKERS = int(os.environ.get("UHI_BACKGROUND_REFRESH_WORKERS", "4"))
+
+
+class BudgetExceeded(TimeoutError):
+    """The latency budget ran out and no last-known-good value exists to fall back on."""
+
+
+# ------------------ Last-Known-Good Fallback ------------------
+class LastKnownGood:
+    """
+    Runs a computation on the calling thread against a latency budget that starts when
+    the computation does. Fresh results are stored as the location's last-known-good
+    value. When the budget runs out or the computation fails, the stored value is
+    returned flagged as stale; a computation that merely ran out of time is finished
+    by the background refresh pool (inputs fetched so far come from the result cache)
+    and refreshes the store. At most one refresh per location and variant is queued.
+    """
+
+    def __init__(self, workers=BACKGROUND_WORKERS):
+        self._pool = concurrent.futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix="refresh")
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def _store(self, key, value):
+        previous = result_cache.peek(key)
+        if previous is not None and previous["metrics"] == value:
+            return  # unchanged; skip the disk write on the hot path
+        result_cache.set(key, LAST_KNOWN_GOOD_DATASET, {
+            "metrics": value,
+            "computed_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        })
+
+    def _finished(self, key, future):
+        with self._lock:
+            self._pending.pop(key, None)
+        if not future.cancelled() and future.exception() is None:
+            self._store(key, future.result())
+
+    def _refresh(self, key, compute):
+        """Finish a computation that overran its budget on the refresh pool."""
+        with self._lock:
+            if key in self._pending:
+                return
+            future = self._pool.submit(contextvars.copy_context().run, compute, None)
+            self._pending[key] = future
+        future.add_done_callback(lambda f: self._finished(key, f))
+
+    def run(self, lat, lon, compute, budget=REQUEST_BUDGET, variant=None):
+        """
+        compute(deadline_at) -> dict of metrics, where deadline_at is a time.monotonic()
+        deadline (None without a budget). Returns the metrics with "stale"/"degraded" flags.
+        `variant` lists everything besides the location that shapes the result (precision,
+        dataset, date window, ...); pending and stored results are only shared within one.
+        """
+        key = make_key(LAST_KNOWN_GOOD_DATASET, lat, lon, window=variant)
+        if not budget:
+            value = compute(None)
+            self._store(key, value)
+            return {**value, "stale": False, "degraded": False}
+
+        deadline_at = time.monotonic() + budget
+        with self._lock:
+            pending = self._pending.get(key)
+        try:
+            if pending is None:
+                # Earth Engine calls stop being waited for at the budget but keep running
+                with wait_deadline(deadline_at):
+                    value = compute(deadline_at)
+                self._store(key, value)
+            else:
+                # A refresh is already computing this result; wait for it instead of repeating it
+                done, _ = concurrent.futures.wait([pending], timeout=max(0.0, deadline_at - time.monotonic()))
+                if not done:
+                    raise WaitDeadlineExceeded("Refresh still running at the request budget")
+                value = pending.result()
+            return {**value, "stale": False, "degraded": False}
+        except WaitDeadlineExceeded:
+            reason = "budget_exceeded"
+            error = BudgetExceeded(f"No result within the {budget:g}s budget; refreshing in the background")
+            self._refresh(key, compute)
+        except CircuitOpenError as e:
+            reason, error = "circuit_open", e
+        except Exception as e:
+            reason, error = "upstream_error", e
+
+        hit, fallback = result_cache.get(key)
+        if not hit:
+            raise error
+        logger.warning(f"⚠️ Serving last-known-good metrics for ({lat},{lon}) from "
+                       f"{fallback['computed_at']}: {reason}")
+        return {**fallback["metrics"], "stale": True, "degraded": True,
+                "degraded_reason": reason, "computed_at": fallback["computed_at"]}
+
+
+last_known_good = LastKnownGood()
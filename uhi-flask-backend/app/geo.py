@@ -0,0 +1,34 @@
+import ee
+import numpy as np
+from .ee_executor import ee_executor
+
+# ------------------ Geo Constants ------------------
+KM_PER_DEG = 111.32  # km per degree of latitude (and of longitude at the equator)
+NODATA = -9999       # fill value for masked pixels in downloads
+
+
+# ------------------ Pixel Download ------------------
+def fetch_pixels(image, res, min_lon, max_lat, width, height, bands=("value",)):
+    """
+    Download a width x height EPSG:4326 grid of `image` (res degrees per pixel, top-left
+    corner at min_lon/max_lat) with one computePixels request. Returns one float32
+    array per band with NaN where the image is masked.
+    """
+    pixels = ee_executor.call(ee.data.computePixels, {
+        "expression": image.unmask(NODATA),
+        "fileFormat": "NUMPY_NDARRAY",
+        "grid": {
+            "dimensions": {"width": width, "height": height},
+            "affineTransform": {
+                "scaleX": res, "shearX": 0, "translateX": min_lon,
+                "shearY": 0, "scaleY": -res, "translateY": max_lat,
+            },
+            "crsCode": "EPSG:4326",
+        },
+    })
+    arrays = {}
+    for band in bands:
+        values = np.asarray(pixels[band], dtype=np.float32)
+        values[values == NODATA] = np.nan
+        arrays[band] = values
+    return arrays
@@ -0,0 +1,273 @@
+import logging
+import os
+import ee
+import numpy as np
+from .cache import LST_DATASET, S2_GREEN_DATASET, make_key, result_cache
+from .composites import (
+    GREEN_BAND, LST_BAND, LST_END, LST_START,
+    green_space_image, green_space_window, lst_mean_image, lst_to_celsius
+)
+from .ee_executor import ee_executor
+from .ee_session import ensure_initialized
+from .metrics import timed
+from .model.predictor import classify_uhi_arrays
+from .model.temperature import ground_temp_model
+from .raster_store import LST_LAYER, S2_GREEN_LAYER, raster_store, rasters_enabled
+
+logger = logging.getLogger(__name__)
+
+# Cities per reduceRegions call; chunks are evaluated concurrently
+HEATMAP_BATCH_SIZE = int(os.environ.get("UHI_HEATMAP_BATCH_SIZE", "25"))
+# Cities per chunk when streaming; small chunks get the first records out sooner
+HEATMAP_STREAM_BATCH_SIZE = int(os.environ.get("UHI_HEATMAP_STREAM_BATCH_SIZE", "1"))
+
+
+# ------------------ Batched Heatmap Engine ------------------
+def _no_data(city):
+    return {
+        "name": city.get("name"),
+        "lat": city["lat"],
+        "lon": city["lon"],
+        "avg_temp": None,
+        "mitigated_temp": None,
+        "green_space_percent": 0,
+        "risk_level": "No Data",
+        "ground_temp": None,
+    }
+
+
+def _values_by_index(feature_collection, band):
+    values = {}
+    for feature in feature_collection.get("features", []):
+        props = feature.get("properties", {})
+        values[props.get("city_index")] = props.get(band)
+    return values
+
+
+@timed("heatmap_batch_reduce")
+def _reduce_batch(cities, radius_km, green_window):
+    """One server-side reduceRegions pass; returns ({index: raw LST}, {index: green fraction})."""
+    ensure_initialized()
+    points, buffers = [], []
+    for index, city in enumerate(cities):
+        point = ee.Geometry.Point([city["lon"], city["lat"]])
+        points.append(ee.Feature(point, {"city_index": index}))
+        buffers.append(ee.Feature(point.buffer(radius_km * 1000), {"city_index": index}))
+
+    points = ee.FeatureCollection(points)
+    buffers = ee.FeatureCollection(buffers)
+    region = buffers.geometry()
+
+    lst_stats = lst_mean_image(region).reduceRegions(
+        collection=points,
+        reducer=ee.Reducer.mean().setOutputs([LST_BAND]),
+        scale=1000
+    )
+    green_stats = green_space_image(region, *green_window).reduceRegions(
+        collection=buffers,
+        reducer=ee.Reducer.mean().setOutputs([GREEN_BAND]),
+        scale=10,
+        tileScale=4
+    )
+
+    result = ee_executor.get_info(ee.Dictionary({
+        "lst": lst_stats.select(propertySelectors=["city_index", LST_BAND], retainGeometry=False),
+        "green": green_stats.select(propertySelectors=["city_index", GREEN_BAND], retainGeometry=False),
+    }))
+
+    return _values_by_index(result["lst"], LST_BAND), _values_by_index(result["green"], GREEN_BAND)
+
+
+@timed("raster_sample")
+def _sample_rasters(cities, radius_km):
+    """Vectorized LST / green fraction for all cities from local grids, or (None, None)."""
+    if not rasters_enabled() or not cities:
+        return None, None
+    lats = np.array([c["lat"] for c in cities])
+    lons = np.array([c["lon"] for c in cities])
+    lst_layer = raster_store.layer(LST_LAYER)
+    green_layer = raster_store.layer(S2_GREEN_LAYER)
+    return (
+        lst_layer.sample(lats, lons) if lst_layer else None,
+        green_layer.buffer_mean(lats, lons, radius_km) if green_layer else None,
+    )
+
+
+def _lookup_local(points, radius_km, lst_window, green_window):
+    """
+    Values served by local rasters or the result cache.
+    Returns (avg_temps, green_percents, pending) where pending lists the indices still
+    needing an Earth Engine reduction.
+    """
+    avg_temps, green_percents, pending = {}, {}, []
+    raster_lst, raster_green = _sample_rasters(points, radius_km)
+    for index, point in enumerate(points):
+        if raster_lst is not None and not np.isnan(raster_lst[index]):
+            avg_temps[index] = round(float(raster_lst[index]), 2)
+            green = raster_green[index] if raster_green is not None else np.nan
+            if not np.isnan(green):
+                green_percents[index] = round(float(green) * 100, 2)
+                continue
+
+        lst_hit, avg_temps[index] = result_cache.get(
+            make_key(LST_DATASET, point["lat"], point["lon"], window=lst_window))
+        green_hit, green_percents[index] = result_cache.get(
+            make_key(S2_GREEN_DATASET, point["lat"], point["lon"], radius_km, green_window))
+        if not (lst_hit and green_hit):
+            pending.append(index)
+    return avg_temps, green_percents, pending
+
+
+def _apply_chunk(points, chunk, result, radius_km, lst_window, green_window, avg_temps, green_percents, errors):
+    """Record one chunk's reduction (or the exception it raised) and cache the values obtained."""
+    if isinstance(result, Exception):
+        logger.error(f"❌ Batched evaluation failed for {len(chunk)} points: {result}")
+        lst_values, green_values = {}, {}
+    else:
+        lst_values, green_values = result
+
+    for batch_index, index in enumerate(chunk):
+        point = points[index]
+        avg_temps[index] = lst_to_celsius(lst_values.get(batch_index))
+        if avg_temps[index] is None:
+            errors[index] = f"Earth Engine error: {result}" if isinstance(result, Exception) \
+                else f"No satellite data at ({point['lat']},{point['lon']})"
+            continue
+        green_fraction = green_values.get(batch_index)
+        green_percents[index] = round(green_fraction * 100, 2) if green_fraction is not None else None
+
+        result_cache.set(make_key(LST_DATASET, point["lat"], point["lon"], window=lst_window),
+                         LST_DATASET, avg_temps[index])
+        green_key = make_key(S2_GREEN_DATASET, point["lat"], point["lon"], radius_km, green_window)
+        if green_percents[index] is None:
+            result_cache.set_missing(green_key, S2_GREEN_DATASET)
+        else:
+            result_cache.set(green_key, S2_GREEN_DATASET, green_percents[index])
+
+
+def _chunks(indices, size):
+    return [indices[i:i + size] for i in range(0, len(indices), max(1, size))]
+
+
+@timed("fetch_batch_inputs")
+def fetch_batch_inputs(points, radius_km=5):
+    """
+    Mean LST (°C) and green space % for many points with one Earth Engine round-trip per chunk.
+    LST is reduced at each point and green space over each buffer, both with server-side
+    reduceRegions. Points covered by local rasters or the result cache are left out of the
+    batch. Returns (avg_temps, green_percents, errors) aligned with `points`; avg_temps is
+    None and errors holds a message where no value could be obtained, and green_percents
+    is None where the green reduction came back masked.
+    """
+    lst_window = (LST_START, LST_END)
+    green_window = green_space_window()
+    avg_temps, green_percents, pending = _lookup_local(points, radius_km, lst_window, green_window)
+    errors = {}
+
+    # Fan chunks of uncached points out through the shared Earth Engine executor
+    chunks = _chunks(pending, HEATMAP_BATCH_SIZE)
+    results = ee_executor.map(
+        lambda chunk: _reduce_batch([points[i] for i in chunk], radius_km, green_window),
+        chunks
+    )
+    for chunk, result in zip(chunks, results):
+        _apply_chunk(points, chunk, result, radius_km, lst_window, green_window, avg_temps, green_percents, errors)
+
+    count = len(points)
+    return (
+        [avg_temps[i] for i in range(count)],
+        [green_percents[i] for i in range(count)],
+        [errors.get(i) for i in range(count)],
+    )
+
+
+def _city_metrics(cities, indices, avg_temps, green_percents):
+    """Vectorized UHI metrics for cities[indices]; cities without LST come back as "No Data"."""
+    temps = np.array([np.nan if avg_temps[i] is None else avg_temps[i] for i in indices], dtype=np.float64)
+    greens = np.array([np.nan if green_percents[i] is None else green_percents[i] for i in indices],
+                      dtype=np.float64)
+    mitigated, levels = classify_uhi_arrays(temps, greens)
+    ground_temps = ground_temp_model.predict_batch(
+        [cities[i]["lat"] for i in indices], [cities[i]["lon"] for i in indices], temps)
+
+    metrics = []
+    for position, index in enumerate(indices):
+        city = cities[index]
+        if avg_temps[index] is None:
+            logger.warning(f"⚠️ No satellite data for city {city.get('name')}")
+            metrics.append(_no_data(city))
+            continue
+
+        metrics.append({
+            "name": city.get("name"),
+            "lat": city["lat"],
+            "lon": city["lon"],
+            "avg_temp": avg_temps[index],
+            "mitigated_temp": None if np.isnan(mitigated[position]) else float(mitigated[position]),
+            "green_space_percent": None if np.isnan(greens[position]) else greens[position].item(),
+            "risk_level": str(levels[position]),
+            "ground_temp": None if np.isnan(ground_temps[position]) else float(ground_temps[position]),
+        })
+    return metrics
+
+
+def get_heatmap_metrics(cities, radius_km=5):
+    """UHI metrics for many cities; cities without LST come back as "No Data"."""
+    avg_temps, green_percents, _ = fetch_batch_inputs(cities, radius_km)
+    return _city_metrics(cities, range(len(cities)), avg_temps, green_percents)
+
+
+def _heatmap_record(metrics):
+    return {
+        "lat": metrics["lat"],
+        "lon": metrics["lon"],
+        "mitigated_temp": metrics["mitigated_temp"],
+        "green_space_percent": metrics["green_space_percent"],
+        "risk_level": metrics["risk_level"],
+        "ground_temp": metrics["ground_temp"]
+    }
+
+
+def build_heatmap_records(cities, radius_km=5):
+    """Heatmap entries as served by /api/heatmap."""
+    return [_heatmap_record(metrics) for metrics in get_heatmap_metrics(cities, radius_km)]
+
+
+# ------------------ Streaming Heatmap ------------------
+def iter_heatmap_records(cities, radius_km=5, batch_size=HEATMAP_STREAM_BATCH_SIZE):
+    """
+    Yield ("city", record) for each city as soon as its values are available: locally
+    served cities first, then Earth Engine chunks of `batch_size` in completion order.
+    Cities whose chunk failed are yielded as ("city_error", {name, lat, lon, error}).
+    Only one chunk's records are held at a time.
+    """
+    lst_window = (LST_START, LST_END)
+    green_window = green_space_window()
+    avg_temps, green_percents, pending = _lookup_local(cities, radius_km, lst_window, green_window)
+
+    pending_set = set(pending)
+    local = [i for i in range(len(cities)) if i not in pending_set]
+    for chunk in _chunks(local, HEATMAP_BATCH_SIZE):
+        for metrics in _city_metrics(cities, chunk, avg_temps, green_percents):
+            yield "city", {"name": metrics["name"], **_heatmap_record(metrics)}
+
+    chunks = _chunks(pending, batch_size)
+    completed = ee_executor.imap_unordered(
+        lambda chunk: _reduce_batch([cities[i] for i in chunk], radius_km, green_window),
+        chunks
+    )
+    for chunk_index, result in completed:
+        chunk = chunks[chunk_index]
+        errors = {}
+        _apply_chunk(cities, chunk, result, radius_km, lst_window, green_window, avg_temps, green_percents, errors)
+        if isinstance(result, Exception):
+            for index in chunk:
+                city = cities[index]
+                yield "city_error", {"name": city.get("name"), "lat": city["lat"], "lon": city["lon"],
+                                     "error": errors[index]}
+            continue
+        for metrics in _city_metrics(cities, chunk, avg_temps, green_percents):
+            yield "city", {"name": metrics["name"], **_heatmap_record(metrics)}
+        for index in chunk:  # keep memory flat as the city list grows
+            avg_temps.pop(index, None)
+            green_percents.pop(index, None)
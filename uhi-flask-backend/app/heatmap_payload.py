@@ -0,0 +1,191 @@
+import gzip
+import hashlib
+import json
+import os
+import re
+import struct
+import threading
+from collections import OrderedDict
+import numpy as np
+
+try:
+    import brotli  # optional; gzip is always available
+except ImportError:
+    brotli = None
+
+# ------------------ Payload Settings ------------------
+PAYLOAD_SCHEMA = 1
+FORMATS = ("records", "columnar", "binary")
+FLOAT_COLUMNS = ("lat", "lon", "mitigated_temp", "green_space_percent", "ground_temp")
+RISK_DICTIONARY = ("Low", "Medium", "High", "No Data")
+VERSION_HISTORY = int(os.environ.get("UHI_HEATMAP_VERSION_HISTORY", "16"))  # versions kept for ?since= deltas
+BODY_CACHE_ENTRIES = int(os.environ.get("UHI_HEATMAP_BODY_CACHE_ENTRIES", "64"))
+BINARY_MAGIC = b"UHIH"
+VERSION_ID_PATTERN = re.compile(r"[0-9a-f]{16}")  # leading hex digits of the content hash
+MIMETYPES = {"records": "application/json", "columnar": "application/json", "binary": "application/octet-stream"}
+
+
+def accepted_encodings():
+    return ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def compress(body, encoding):
+    if encoding == "gzip":
+        return gzip.compress(body, compresslevel=6, mtime=0)  # mtime=0 keeps bytes stable per version
+    if encoding == "br":
+        return brotli.compress(body)
+    return body
+
+
+def is_version_id(value):
+    """True if `value` has the form of a version id (client-supplied ?since= is checked with it)."""
+    return bool(VERSION_ID_PATTERN.fullmatch(value))
+
+
+# ------------------ Data Versions ------------------
+class HeatmapVersion:
+    """
+    One immutable heatmap state. `id` is a content hash of the records, so rebuilding
+    identical data yields the same version (and ETag). When the data was generated is
+    a property of each snapshot, not of the version, and is passed in per response.
+    """
+
+    def __init__(self, version_id, records, keys):
+        self.id = version_id
+        self.records = records
+        self.keys = list(keys)
+        self.columns = {
+            name: np.array([np.nan if r[name] is None else r[name] for r in records], dtype=np.float32)
+            for name in FLOAT_COLUMNS
+        }
+        self.risk_codes = np.array([RISK_DICTIONARY.index(r["risk_level"]) for r in records], dtype=np.uint8)
+
+    def etag(self, fmt, since=None, encoding="identity", generated_at=None):
+        """
+        Strong ETag: one per version, representation, delta base and content coding. The
+        records body embeds the snapshot's generated_at, so its tag changes with it.
+        """
+        stamp = f".at-{int(generated_at.timestamp() * 1e6)}" if fmt == "records" and generated_at else ""
+        return f"{self.id}.{fmt}" + (f".since-{since}" if since else "") + stamp + f".{encoding}"
+
+
+class HeatmapPayloads:
+    """
+    Publishes heatmap versions and serves their encoded bodies: the legacy record array,
+    a columnar JSON form with dictionary-encoded risk levels, and a packed binary form.
+    Recent versions are kept so clients can fetch only the rows changed since one, and
+    encoded (optionally compressed) bodies are cached per version.
+
+    Binary layout (little-endian): "UHIH", u16 schema, u16 float column count, u32 rows,
+    u32 metadata length, metadata JSON (UTF-8; column names, risk dictionary, keys,
+    versions), zero padding to a 4-byte boundary, then each float32 column in metadata
+    order (NaN = null) and finally one u8 risk code per row. Columnar and binary bodies
+    depend on the version only; routes report the snapshot time in a header.
+    """
+
+    def __init__(self, history=VERSION_HISTORY, max_bodies=BODY_CACHE_ENTRIES):
+        self.history = history
+        self.max_bodies = max_bodies
+        self._versions = OrderedDict()
+        self._bodies = OrderedDict()
+        self._last = (None, None)  # (records object, version) to skip re-hashing a snapshot
+        self._lock = threading.Lock()
+
+    def publish(self, records, keys):
+        """Version for these records (aligned with `keys`), creating it if the data changed."""
+        last_records, last_version = self._last
+        if records is last_records:
+            return last_version
+
+        digest = hashlib.sha256(json.dumps([keys, records], separators=(",", ":"), sort_keys=True).encode())
+        version_id = digest.hexdigest()[:16]  # matches VERSION_ID_PATTERN
+        with self._lock:
+            version = self._versions.get(version_id)
+            if version is None:
+                version = self._versions[version_id] = HeatmapVersion(version_id, records, keys)
+                while len(self._versions) > self.history:
+                    self._versions.popitem(last=False)
+            self._versions.move_to_end(version_id)
+            self._last = (records, version)
+        return version
+
+    def body(self, version, fmt, since=None, encoding="identity", generated_at=None):
+        """
+        Encoded (and compressed) body, built once per ETag: per version/format/delta
+        base/encoding, and for the records format also per snapshot generated_at.
+        """
+        cache_key = version.etag(fmt, since, encoding, generated_at)
+        with self._lock:
+            body = self._bodies.get(cache_key)
+            if body is not None:
+                self._bodies.move_to_end(cache_key)
+                return body
+
+        body = compress(self._encode(version, fmt, since, generated_at), encoding)
+        with self._lock:
+            self._bodies[cache_key] = body
+            while len(self._bodies) > self.max_bodies:
+                self._bodies.popitem(last=False)
+        return body
+
+    # ------------------ Encoding ------------------
+    def _delta_rows(self, version, since):
+        """(row indices, removed keys, delta applied) relative to version `since`."""
+        all_rows = np.arange(len(version.keys))
+        if not since:
+            return all_rows, [], False
+        with self._lock:
+            base = self._versions.get(since)
+        if base is None:
+            return all_rows, [], False  # unknown or evicted base: send everything
+
+        base_rows = {key: i for i, key in enumerate(base.keys)}
+        changed = []
+        for row, key in enumerate(version.keys):
+            old = base_rows.get(key)
+            if old is None or base.risk_codes[old] != version.risk_codes[row] or any(
+                    not _same(base.columns[name][old], version.columns[name][row]) for name in FLOAT_COLUMNS):
+                changed.append(row)
+        current = set(version.keys)
+        removed = [key for key in base.keys if key not in current]
+        return np.array(changed, dtype=np.int64), removed, True
+
+    def _encode(self, version, fmt, since, generated_at=None):
+        if fmt == "records":
+            payload = {"heatmap": version.records}
+            if generated_at:
+                payload["generated_at"] = generated_at.isoformat()
+            return json.dumps(payload, separators=(",", ":")).encode()
+
+        rows, removed, delta = self._delta_rows(version, since)
+        meta = {
+            "schema": PAYLOAD_SCHEMA,
+            "version": version.id,
+            "base_version": since if delta else None,
+            "delta": delta,
+            "count": int(len(rows)),
+            "dictionaries": {"risk_level": list(RISK_DICTIONARY)},
+            "removed": removed,
+        }
+        if fmt == "columnar":
+            columns = {"key": [version.keys[i] for i in rows]}
+            for name in FLOAT_COLUMNS:
+                columns[name] = [version.records[i][name] for i in rows]
+            columns["risk_level"] = version.risk_codes[rows].tolist()
+            return json.dumps({**meta, "columns": columns}, separators=(",", ":")).encode()
+
+        meta.update({"columns": list(FLOAT_COLUMNS) + ["risk_level"], "keys": [version.keys[i] for i in rows]})
+        meta_bytes = json.dumps(meta, separators=(",", ":")).encode()
+        header = struct.pack("<4sHHII", BINARY_MAGIC, PAYLOAD_SCHEMA, len(FLOAT_COLUMNS), len(rows), len(meta_bytes))
+        padding = b"\0" * (-(len(header) + len(meta_bytes)) % 4)
+        parts = [header, meta_bytes, padding]
+        parts += [version.columns[name][rows].astype("<f4").tobytes() for name in FLOAT_COLUMNS]
+        parts.append(version.risk_codes[rows].tobytes())
+        return b"".join(parts)
+
+
+def _same(a, b):
+    return a == b or (np.isnan(a) and np.isnan(b))
+
+
+heatmap_payloads = HeatmapPayloads()
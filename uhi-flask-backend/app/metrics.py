@@ -0,0 +1,261 @@
+import bisect
+import contextlib
+import contextvars
+import cProfile
+import io
+import json
+import logging
+import os
+import pstats
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+# ------------------ Metrics Settings ------------------
+TRACE_IDS = os.environ.get("UHI_TRACE_IDS", "1") == "1"
+TRACE_HEADER = "X-Request-ID"
+PROFILE_SLOW_REQUESTS = os.environ.get("UHI_PROFILE_SLOW_REQUESTS", "0") == "1"  # debug only
+SLOW_REQUEST_SECONDS = float(os.environ.get("UHI_SLOW_REQUEST_MS", "2000")) / 1000
+PROFILE_DIR = os.environ.get(
+    "UHI_PROFILE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "profiles")
+)
+
+# Seconds; Earth Engine reductions range from ~100 ms to over a minute
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+# Current stage/dataset/trace of this request; copied into executor workers
+_stage = contextvars.ContextVar("uhi_stage", default="none")
+_dataset = contextvars.ContextVar("uhi_dataset", default="none")
+_trace_id = contextvars.ContextVar("uhi_trace_id", default=None)
+_spans = contextvars.ContextVar("uhi_spans", default=None)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _label_text(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+# ------------------ Metric Types ------------------
+class Counter:
+    def __init__(self, name, help_text, labels=()):
+        self.name, self.help, self.labels = name, help_text, tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labels)
+        with self._lock:
+            return self._values.get(key, 0)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_label_text(self.labels, key)} {value:g}")
+        return lines
+
+
+class Gauge:
+    """Gauge whose value is read from a callback when metrics are rendered."""
+
+    def __init__(self, name, help_text, read):
+        self.name, self.help, self._read = name, help_text, read
+
+    def render(self):
+        try:
+            value = float(self._read())
+        except Exception as e:
+            logger.warning(f"⚠️ Gauge {self.name} failed: {e}")
+            return []
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge", f"{self.name} {value:g}"]
+
+
+class Histogram:
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        self.name, self.help, self.labels = name, help_text, tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # labels -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + ("+Inf",), series[:-1]):
+                    cumulative += count
+                    le = bound if isinstance(bound, str) else f"{bound:g}"
+                    lines.append(f"{self.name}_bucket{_label_text(self.labels, key, [('le', le)])} {cumulative}")
+                lines.append(f"{self.name}_sum{_label_text(self.labels, key)} {series[-1]:.6f}")
+                lines.append(f"{self.name}_count{_label_text(self.labels, key)} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+        with self._lock:
+            metrics = list(self._metrics)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+http_request_duration = registry.register(Histogram(
+    "uhi_http_request_duration_seconds", "Flask request latency by endpoint", ("endpoint", "method", "status")))
+stage_duration = registry.register(Histogram(
+    "uhi_stage_duration_seconds", "Latency of instrumented hot-path stages", ("stage", "dataset")))
+ee_call_duration = registry.register(Histogram(
+    "uhi_ee_call_duration_seconds", "Latency of individual Earth Engine round-trips", ("stage", "dataset")))
+ee_round_trips = registry.register(Counter(
+    "uhi_ee_round_trips_total", "Earth Engine round-trips by stage and outcome", ("stage", "dataset", "outcome")))
+cache_lookups = registry.register(Counter(
+    "uhi_cache_lookups_total", "Result cache lookups by dataset and tier", ("dataset", "result")))
+coalesced_requests = registry.register(Counter(
+    "uhi_singleflight_coalesced_total", "Requests that waited on an identical in-flight computation", ("group",)))
+
+
+# ------------------ Instrumentation ------------------
+@contextlib.contextmanager
+def timed(stage, dataset=None):
+    """
+    Time a block (or decorated function) into uhi_stage_duration_seconds. Earth Engine
+    calls made inside it are attributed to this stage and dataset.
+    """
+    dataset = dataset or _dataset.get()
+    stage_token = _stage.set(stage)
+    dataset_token = _dataset.set(dataset)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        _stage.reset(stage_token)
+        _dataset.reset(dataset_token)
+        stage_duration.observe(elapsed, stage=stage, dataset=dataset)
+        spans = _spans.get()
+        if spans is not None:
+            spans.append((stage, dataset, round(elapsed * 1000, 2)))
+
+
+def record_ee_call(elapsed, outcome):
+    """Count one Earth Engine round-trip against the current stage."""
+    stage, dataset = _stage.get(), _dataset.get()
+    ee_round_trips.inc(stage=stage, dataset=dataset, outcome=outcome)
+    ee_call_duration.observe(elapsed, stage=stage, dataset=dataset)
+
+
+def record_cache_lookup(dataset, result):
+    cache_lookups.inc(dataset=dataset, result=result)
+
+
+def current_trace_id():
+    return _trace_id.get()
+
+
+# ------------------ Flask Integration ------------------
+def init_app(app):
+    """Time every request, attach trace IDs and (in debug) dump profiles of slow requests."""
+    from flask import g, request
+
+    app.config.setdefault("TRACE_IDS", TRACE_IDS)
+    app.config.setdefault("PROFILE_SLOW_REQUESTS", PROFILE_SLOW_REQUESTS)
+    app.config.setdefault("SLOW_REQUEST_SECONDS", SLOW_REQUEST_SECONDS)
+
+    @app.before_request
+    def _start_request():
+        g.metrics_started = time.perf_counter()
+        trace_id = request.headers.get(TRACE_HEADER) or (uuid.uuid4().hex if app.config["TRACE_IDS"] else None)
+        g.metrics_tokens = (_trace_id.set(trace_id), _spans.set([]))
+        g.metrics_profiler = None
+        if app.config["PROFILE_SLOW_REQUESTS"]:
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+                g.metrics_profiler = profiler
+            except ValueError:  # another profiler is active on this thread
+                pass
+
+    @app.after_request
+    def _finish_request(response):
+        started = g.pop("metrics_started", None)
+        if started is None:
+            return response
+        elapsed = time.perf_counter() - started
+        endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+        http_request_duration.observe(elapsed, endpoint=endpoint, method=request.method,
+                                      status=response.status_code)
+
+        trace_id = _trace_id.get()
+        if trace_id:
+            response.headers[TRACE_HEADER] = trace_id
+
+        profiler = g.pop("metrics_profiler", None)
+        if profiler is not None:
+            profiler.disable()
+            if elapsed >= app.config["SLOW_REQUEST_SECONDS"]:
+                _dump_slow_request(profiler, trace_id, request.full_path, elapsed)
+        return response
+
+    @app.teardown_request
+    def _reset_context(exc):
+        tokens = g.pop("metrics_tokens", None)
+        if tokens is not None:
+            _trace_id.reset(tokens[0])
+            _spans.reset(tokens[1])
+
+
+def _dump_slow_request(profiler, trace_id, path, elapsed):
+    """Write stage timings and the top of a cProfile report for one slow request."""
+    stream = io.StringIO()
+    pstats.Stats(profiler, stream=stream).sort_stats("cumulative").print_stats(40)
+    name = f"{time.strftime('%Y%m%dT%H%M%S')}-{trace_id or uuid.uuid4().hex}"
+    try:
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        with open(os.path.join(PROFILE_DIR, f"{name}.txt"), "w") as f:
+            f.write(json.dumps({
+                "trace_id": trace_id, "path": path, "elapsed_ms": round(elapsed * 1000, 2),
+                "stages": [{"stage": s, "dataset": d, "ms": ms} for s, d, ms in _spans.get() or []],
+            }, indent=2))
+            f.write("\n\n")
+            f.write(stream.getvalue())
+    except OSError as e:
+        logger.warning(f"⚠️ Could not write slow request profile: {e}")
+        return
+    logger.warning(f"🐢 Slow request {path} took {elapsed:.2f}s (trace {trace_id}); profile {name}.txt")
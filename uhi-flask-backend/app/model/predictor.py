@@ -1,75 +1,271 @@
+import math
+import os
+import time
 import ee
+import numpy as np
 from datetime import datetime, timedelta
+from ..cache import LST_DATASET, NDVI_GREEN_DATASET, S2_GREEN_DATASET, make_key, result_cache
+from ..composites import (
+    GREEN_BAND, LST_BAND, LST_END, LST_PALETTE, LST_START, LST_VIS_MAX, LST_VIS_MIN,
+    green_space_image, green_space_window, lst_collection, lst_mean_image, lst_to_celsius, ndvi_green_image
+)
+from ..ee_executor import ee_executor
+from ..ee_session import ee_session
+from ..metrics import timed
+from ..geo import KM_PER_DEG
+from ..raster_store import LST_LAYER, NDVI_GREEN_LAYER, S2_GREEN_LAYER, raster_store, rasters_enabled
+
+# Green space sources: raster layer, reduction scales (m, coarse to native), image builder and date window
+GREEN_SOURCES = {
+    NDVI_GREEN_DATASET: {
+        "layer": NDVI_GREEN_LAYER,
+        "pyramid": (500,),
+        "image": lambda region, start_date, end_date: ndvi_green_image(start_date, end_date),
+        "window": lambda: (LST_START, LST_END),
+    },
+    S2_GREEN_DATASET: {
+        "layer": S2_GREEN_LAYER,
+        "pyramid": (100, 30, 10),
+        "image": green_space_image,
+        "window": green_space_window,
+    },
+}
+
+
+# ------------------ UHI Classification ------------------
+RISK_THRESHOLDS = np.array([34.0, 38.0])  # °C bin edges: Low | Medium | High
+RISK_LEVELS = np.array(["Low", "Medium", "High"], dtype=object)
+GREEN_COOLING = 0.1  # mitigation factor gained at 100 % green space
+
+
+def classify_uhi_arrays(avg_temps, green_space_percents):
+    """
+    Vectorized mitigated temperature and risk level for arrays of LST and green space %.
+    Unknown green space (NaN/None) gives a NaN mitigated temperature.
+    """
+    avg_temps = np.asarray(avg_temps, dtype=np.float64)
+    green_space_percents = np.asarray(green_space_percents, dtype=np.float64)
+
+    # Mitigated temperature factoring green space
+    mitigation_factor = 0.85 + (green_space_percents / 100 * GREEN_COOLING)  # up to +10% cooling
+    mitigated_temps = np.round(avg_temps * mitigation_factor, 2)
+
+    # Risk level
+    levels = RISK_LEVELS[np.searchsorted(RISK_THRESHOLDS, avg_temps, side="right")]
+    return mitigated_temps, levels
+
+
+def classify_uhi(avg_temp, green_space_percent):
+    """Return (mitigated_temp, risk_level) for a mean LST and green space % (mitigated_temp None if unknown)."""
+    mitigated_temps, levels = classify_uhi_arrays([avg_temp], [green_space_percent])
+    mitigated_temp = None if np.isnan(mitigated_temps[0]) else float(mitigated_temps[0])
+    return mitigated_temp, str(levels[0])
+
+
+# ------------------ Green Space Precision ------------------
+# "fast" = coarsest scale only, "high" = native scale only,
+# "auto" = coarse first, refined only while the green error could shift mitigated_temp
+# by more than GREEN_MITIGATION_TOLERANCE (risk_level depends on avg_temp alone, so green
+# precision only ever changes mitigated_temp)
+GREEN_PRECISIONS = ("fast", "auto", "high")
+DEFAULT_GREEN_PRECISION = os.environ.get("UHI_GREEN_PRECISION", "auto")
+# Estimated absolute error (green % points) per 10x coarser than native scale
+GREEN_ERROR_PER_DECADE = float(os.environ.get("UHI_GREEN_ERROR_PER_DECADE", "4.0"))
+# Refine only when the green error moves mitigated_temp by more than half the ~1 K accuracy
+# of the MODIS LST it is derived from. At 40 °C that takes 12.5 % points of error (a scale
+# ~1000x native), so with the error model above "auto" costs one round-trip per point.
+GREEN_MITIGATION_TOLERANCE = float(os.environ.get("UHI_GREEN_MITIGATION_TOLERANCE", "0.5"))  # °C
+
+
+def green_scales(green_dataset, precision=DEFAULT_GREEN_PRECISION):
+    """Reduction scales (m) to try for a precision, coarse to fine."""
+    if precision not in GREEN_PRECISIONS:
+        raise ValueError(f"precision must be one of {', '.join(GREEN_PRECISIONS)}")
+    pyramid = GREEN_SOURCES[green_dataset]["pyramid"]
+    if precision == "fast":
+        return pyramid[:1]
+    if precision == "high":
+        return pyramid[-1:]
+    return pyramid
+
+
+def estimated_green_error(green_dataset, scale_m):
+    """Rough absolute error (% points) of green space reduced at `scale_m` instead of natively."""
+    native = GREEN_SOURCES[green_dataset]["pyramid"][-1]
+    return round(GREEN_ERROR_PER_DECADE * max(0.0, math.log10(scale_m / native)), 2)
+
+
+def mitigation_uncertain(avg_temp, green_space_percent, error, tolerance=GREEN_MITIGATION_TOLERANCE):
+    """
+    True when a green space error of +/- `error` % points leaves the mitigated temperature
+    uncertain by more than +/- `tolerance` °C. mitigated_temp is linear in green space
+    (avg_temp * GREEN_COOLING / 100 °C per % point) and green space is clipped to 0-100 %.
+    """
+    if avg_temp is None or green_space_percent is None or not error:
+        return False
+    green_range = min(100.0, green_space_percent + error) - max(0.0, green_space_percent - error)
+    return abs(avg_temp) * GREEN_COOLING / 100 * green_range / 2 > tolerance
+
 
 class UHIMLModel:
-    def __init__(self, project_id="earthengine-uhi"):
-        try:
-            ee.Initialize(project=project_id)
-            print("✅ Earth Engine initialized successfully!")
-        except Exception as e:
-            raise RuntimeError(
-                f"Failed to initialize Earth Engine: {e}. "
-                f"Authenticate first using `earthengine authenticate`."
-            ) from e
+    def __init__(self, session=ee_session):
+        # Earth Engine is initialized lazily (and retried) on the first reduction
+        self.session = session
 
-    # ------------------ Fetch Satellite LST (Day) ------------------
-    def fetch_satellite_data(self, lat, lon):
+    # ------------------ Local Rasters ------------------
+    @staticmethod
+    def _raster_lst(lat, lon):
+        if rasters_enabled():
+            value = raster_store.sample(LST_LAYER, lat, lon)
+            if value is not None:
+                return round(value, 2)
+        return None
+
+    @staticmethod
+    def _raster_green(green_dataset, lat, lon, radius_km):
+        """Green space % from the local raster and its cell size (m), or (None, None)."""
+        if rasters_enabled():
+            name = GREEN_SOURCES[green_dataset]["layer"]
+            value = raster_store.buffer_mean(name, lat, lon, radius_km)
+            if value is not None:
+                return round(value * 100, 2), round(raster_store.layer(name).res * KM_PER_DEG * 1000)
+        return None, None
+
+    # ------------------ Composite Point Evaluation ------------------
+    def reduce_point_inputs(self, lat, lon, lst=True, green_dataset=None, radius_km=5, green_window=None,
+                            green_scale=None):
+        """
+        Evaluate LST and/or green space for one point in a single getInfo.
+        The image count, mean LST and green fraction are combined server-side into one
+        ee.Dictionary; an empty LST collection yields a null mean instead of an error.
+        Green space is reduced at `green_scale` metres (default: the dataset's native scale).
+        Returns {"count", "lst" (°C)} and/or {"green" (%)} for the requested parts; a
+        masked reduction yields None (never cached) rather than 0 %.
+        """
+        self.session.ensure_initialized()
         point = ee.Geometry.Point(lon, lat)
-        start_date = "2023-01-01"
-        end_date = "2023-12-31"
+        values = {}
+        if lst:
+            values["count"] = lst_collection(point, LST_START, LST_END).size()
+            values["lst"] = lst_mean_image(point, LST_START, LST_END).reduceRegion(
+                reducer=ee.Reducer.mean(),
+                geometry=point,
+                scale=1000,
+                maxPixels=1e9
+            ).get(LST_BAND)
+        if green_dataset:
+            source = GREEN_SOURCES[green_dataset]
+            region = point.buffer(radius_km * 1000)  # radius in meters
+            values["green"] = source["image"](region, *(green_window or source["window"]())).reduceRegion(
+                reducer=ee.Reducer.mean(),
+                geometry=region,
+                scale=green_scale or source["pyramid"][-1],
+                maxPixels=1e13
+            ).get(GREEN_BAND)
 
-        dataset = ee.ImageCollection("MODIS/061/MOD11A1") \
-            .filterDate(start_date, end_date) \
-            .filterBounds(point) \
-            .select("LST_Day_1km")
+        with timed("point_composite", LST_DATASET if lst else green_dataset):
+            result = ee_executor.get_info(ee.Dictionary(values))
 
-        if dataset.size().getInfo() == 0:
-            print(f"⚠️ No MODIS LST data at ({lat},{lon})")
-            return None
+        if lst:
+            if result.get("count") == 0:
+                print(f"⚠️ No MODIS LST data at ({lat},{lon})")
+            result["lst"] = lst_to_celsius(result.get("lst"))
+        if green_dataset:
+            green_fraction = result.get("green")
+            result["green"] = round(green_fraction * 100, 2) if green_fraction is not None else None
+        return result
 
-        mean_image = dataset.mean()
-        reduction = mean_image.reduceRegion(
-            reducer=ee.Reducer.mean(),
-            geometry=point,
-            scale=1000,
-            maxPixels=1e9
-        )
+    @timed("fetch_point_inputs")
+    def fetch_point_inputs(self, lat, lon, green_dataset=NDVI_GREEN_DATASET, radius_km=5, precision="high",
+                           deadline_at=None):
+        """
+        (avg_temp °C, green space %, green scale m, estimated green error % points) for one point.
+        Values not available from local rasters or the result cache are evaluated together
+        in one Earth Engine round-trip. With precision="auto" green space is reduced at the
+        coarsest scale first and only refined while its error could still move mitigated_temp
+        by more than GREEN_MITIGATION_TOLERANCE °C and another round-trip (timed like the
+        last one) still fits before `deadline_at` (time.monotonic()). avg_temp is None where
+        there is no LST data.
+        """
+        scales = green_scales(green_dataset, precision)
+        native_scale = GREEN_SOURCES[green_dataset]["pyramid"][-1]
+        green_window = GREEN_SOURCES[green_dataset]["window"]()
+        lst_key = make_key(LST_DATASET, lat, lon, window=(LST_START, LST_END))
 
-        try:
-            val = reduction.get("LST_Day_1km")
-            val = val.getInfo() if val else None
-        except Exception as e:
-            print(f"❌ Error fetching satellite data ({lat},{lon}): {e}")
-            return None
+        avg_temp = self._raster_lst(lat, lon)
+        lst_hit, avg_temp = (True, avg_temp) if avg_temp is not None else result_cache.get(lst_key)
+        green, scale = self._raster_green(green_dataset, lat, lon, radius_km)
+        if green is not None:
+            if not lst_hit:
+                avg_temp = self.reduce_point_inputs(lat, lon)["lst"]
+                result_cache.set(lst_key, LST_DATASET, avg_temp)
+            return avg_temp, green, scale, estimated_green_error(green_dataset, scale)
 
-        if val is not None:
-            return round((val * 0.02) - 273.15, 2)
-        else:
-            return None
+        round_trip = 0.0
+        for level, scale in enumerate(scales):
+            green_key = make_key(green_dataset, lat, lon, radius_km, green_window,
+                                 None if scale == native_scale else scale)
+            green_hit, green = result_cache.get(green_key)
+            if not (lst_hit and green_hit):
+                started = time.monotonic()
+                result = self.reduce_point_inputs(
+                    lat, lon,
+                    lst=not lst_hit,
+                    green_dataset=None if green_hit else green_dataset,
+                    radius_km=radius_km,
+                    green_window=green_window,
+                    green_scale=scale
+                )
+                if not lst_hit:
+                    avg_temp, lst_hit = result["lst"], True
+                    result_cache.set(lst_key, LST_DATASET, avg_temp)
+                if not green_hit:
+                    green = result["green"]
+                    if green is None:  # masked out (e.g. no vegetation pixels); don't ask again per request
+                        result_cache.set_missing(green_key, green_dataset)
+                    else:
+                        result_cache.set(green_key, green_dataset, green)
+                round_trip = time.monotonic() - started
 
-    # ------------------ Fetch Green Space % using MODIS NDVI ------------------
-    def fetch_green_space_percent(self, lat, lon, radius_km=5):
-        point = ee.Geometry.Point(lon, lat)
-        region = point.buffer(radius_km * 1000)  # radius in meters
+            error = estimated_green_error(green_dataset, scale)
+            if level == len(scales) - 1 or not mitigation_uncertain(avg_temp, green, error):
+                break
+            if deadline_at is not None and time.monotonic() + round_trip > deadline_at:
+                break  # keep the coarser result rather than overrun the request budget
+        return avg_temp, green, scale, error
 
-        ndvi_collection = ee.ImageCollection("MODIS/061/MOD13A1") \
-            .filterDate("2023-01-01", "2023-12-31") \
-            .select("NDVI") \
-            .mean()  # annual mean NDVI
+    # ------------------ Fetch Satellite LST (Day) ------------------
+    @timed("fetch_satellite_data", LST_DATASET)
+    def fetch_satellite_data(self, lat, lon):
+        value = self._raster_lst(lat, lon)
+        if value is not None:
+            return value
 
-        veg_pixels = ndvi_collection.gt(3000)  # NDVI > 0.3
+        return result_cache.get_or_compute(
+            LST_DATASET, lat, lon,
+            lambda: self.reduce_point_inputs(lat, lon)["lst"],
+            window=(LST_START, LST_END)
+        )
 
-        green_fraction = veg_pixels.reduceRegion(
-            reducer=ee.Reducer.mean(),
-            geometry=region,
-            scale=500,
-            maxPixels=1e9
-        ).get("NDVI").getInfo()
+    # ------------------ Fetch Green Space % using MODIS NDVI ------------------
+    @timed("fetch_green_space_percent", NDVI_GREEN_DATASET)
+    def fetch_green_space_percent(self, lat, lon, radius_km=5):
+        value, _ = self._raster_green(NDVI_GREEN_DATASET, lat, lon, radius_km)
+        if value is not None:
+            return value
 
-        return round(green_fraction * 100, 2) if green_fraction else 0
+        return result_cache.get_or_compute(
+            NDVI_GREEN_DATASET, lat, lon,
+            lambda: self.reduce_point_inputs(lat, lon, lst=False, green_dataset=NDVI_GREEN_DATASET,
+                                             radius_km=radius_km)["green"],
+            radius_km=radius_km,
+            window=(LST_START, LST_END)
+        )
 
     # ------------------ Heatmap URL ------------------
+    @timed("generate_heatmap_url")
     def generate_heatmap_url(self, lat, lon):
+        self.session.ensure_initialized()
         point = ee.Geometry.Point(lon, lat)
         region = point.buffer(5000).bounds()
 
@@ -81,7 +277,7 @@ class UHIMLModel:
             .filterBounds(point) \
             .select("LST_Day_1km")
 
-        if collection.size().getInfo() == 0:
+        if ee_executor.get_info(collection.size()) == 0:
             print(f"⚠️ No MODIS data for last 14 days at ({lat},{lon})")
             return None
 
@@ -89,14 +285,14 @@ class UHIMLModel:
         lst_celsius = dataset_mean.multiply(0.02).subtract(273.15)
 
         thermal_map = lst_celsius.visualize(
-            min=20, max=45,
-            palette=["blue","cyan","green","yellow","orange","red"]
+            min=LST_VIS_MIN, max=LST_VIS_MAX,
+            palette=LST_PALETTE
         )
 
         try:
-            map_id_dict = ee.data.getMapId({
+            map_id_dict = ee_executor.call(ee.data.getMapId, {
                 "image": thermal_map,
-                "region": region.getInfo()
+                "region": ee_executor.get_info(region)
             })
             return f"https://earthengine.googleapis.com/map/{map_id_dict['mapid']}/{{z}}/{{x}}/{{y}}?token={map_id_dict['token']}"
         except Exception as e:
@@ -104,25 +300,14 @@ class UHIMLModel:
             return None
 
     # ------------------ UHI Prediction ------------------
-    def predict_uhi(self, lat, lon, green_space_percent=None, city_name="Unknown Location"):
-        avg_temp = self.fetch_satellite_data(lat, lon)
-        if avg_temp is None:
-            raise ValueError(f"No satellite data for {city_name} at ({lat},{lon})")
-
-        # If green_space_percent not provided, fetch automatically
+    def predict_uhi(self, lat, lon, green_space_percent=None, city_name="Unknown Location", deadline_at=None):
         if green_space_percent is None:
-            green_space_percent = self.fetch_green_space_percent(lat, lon)
-
-        # Mitigated temperature factoring green space
-        mitigation_factor = 0.85 + (green_space_percent / 100 * 0.1)  # up to +10% cooling
-        mitigated_temp = round(avg_temp * mitigation_factor, 2)
-
-        # Risk level
-        if avg_temp >= 38:
-            level = "High"
-        elif avg_temp >= 34:
-            level = "Medium"
+            # Fetch LST and green space automatically in one composite evaluation
+            avg_temp, green_space_percent, _, _ = self.fetch_point_inputs(lat, lon, deadline_at=deadline_at)
         else:
-            level = "Low"
+            avg_temp = self.fetch_satellite_data(lat, lon)
+        if avg_temp is None:
+            raise ValueError(f"No satellite data for {city_name} at ({lat},{lon})")
 
+        mitigated_temp, level = classify_uhi(avg_temp, green_space_percent)
         return avg_temp, mitigated_temp, level, green_space_percent
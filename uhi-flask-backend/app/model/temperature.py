@@ -0,0 +1,99 @@
+import logging
+import os
+import threading
+import time
+import joblib
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# ------------------ Model Settings ------------------
+MODEL_PATH = os.environ.get(
+    "UHI_TEMP_MODEL_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "avg_temp_model.pkl")
+)
+MODEL_CHECK_INTERVAL = float(os.environ.get("UHI_TEMP_MODEL_CHECK_INTERVAL", "10"))  # seconds
+
+
+# ------------------ Ground Temperature Model ------------------
+class GroundTempModel:
+    """
+    In-process server for the regression trained by train_model.py, mapping
+    [lat, lon, LST °C] to ground air temperature °C.
+    The model is loaded once and kept hot; the file's mtime is checked at most every
+    `check_interval` seconds and a retrained model is swapped in without a restart.
+    """
+
+    def __init__(self, path=MODEL_PATH, check_interval=MODEL_CHECK_INTERVAL):
+        self.path = path
+        self.check_interval = check_interval
+        self._loaded = None  # (model, version, coef, intercept), replaced atomically
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def _maybe_reload(self):
+        now = time.monotonic()
+        if self._loaded is not None and now - self._checked_at < self.check_interval:
+            return self._loaded
+
+        with self._lock:
+            if self._loaded is not None and now - self._checked_at < self.check_interval:
+                return self._loaded
+            self._checked_at = now
+            try:
+                mtime = os.stat(self.path).st_mtime_ns
+            except OSError:
+                return self._loaded
+
+            version = str(mtime)
+            if self._loaded is None or self._loaded[1] != version:
+                try:
+                    model = joblib.load(self.path)
+                except Exception as e:
+                    logger.error(f"❌ Failed to load temperature model {self.path}: {e}")
+                    return self._loaded
+                coef = getattr(model, "coef_", None)
+                intercept = getattr(model, "intercept_", None)
+                self._loaded = (model, version,
+                                None if coef is None else np.asarray(coef, dtype=np.float64),
+                                None if intercept is None else float(intercept))
+                logger.info(f"✅ Temperature model loaded (version {version})")
+            return self._loaded
+
+    def load(self):
+        """Load (or reload) now; returns True when a model is available."""
+        return self._maybe_reload() is not None
+
+    @property
+    def version(self):
+        loaded = self._maybe_reload()
+        return loaded[1] if loaded else None
+
+    def predict_batch(self, lats, lons, lsts):
+        """Vectorized ground temperature for arrays of points; NaN where LST is missing."""
+        loaded = self._maybe_reload()
+        lsts = np.asarray(lsts, dtype=np.float64)
+        if loaded is None:
+            return np.full(lsts.shape, np.nan)
+
+        model, _, coef, intercept = loaded
+        X = np.column_stack([np.asarray(lats, dtype=np.float64), np.asarray(lons, dtype=np.float64), lsts])
+        valid = ~np.isnan(lsts)
+        result = np.full(lsts.shape, np.nan)
+        if valid.any():
+            if coef is not None and intercept is not None:
+                # Linear model: skip estimator input validation on the hot path
+                result[valid] = X[valid] @ coef + intercept
+            else:
+                result[valid] = model.predict(X[valid])
+        return np.round(result, 2)
+
+    def predict(self, lat, lon, lst):
+        """Ground temperature for one point, or None when unavailable."""
+        if lst is None:
+            return None
+        value = float(self.predict_batch([lat], [lon], [lst])[0])
+        return None if np.isnan(value) else value
+
+
+ground_temp_model = GroundTempModel()
@@ -0,0 +1,199 @@
+import json
+import logging
+import os
+import threading
+import time
+import numpy as np
+from .geo import KM_PER_DEG
+
+logger = logging.getLogger(__name__)
+
+# ------------------ Raster Settings ------------------
+RASTER_DIR = os.environ.get(
+    "UHI_RASTER_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "rasters")
+)
+# "live" = Earth Engine only, "raster" = local grids first with live fallback
+SERVING_MODE = os.environ.get("UHI_SERVING_MODE", "live").lower()
+RASTER_CHECK_INTERVAL = float(os.environ.get("UHI_RASTER_CHECK_INTERVAL", "10"))  # seconds
+
+INDIA_BBOX = (68.0, 6.0, 98.0, 38.0)  # min_lon, min_lat, max_lon, max_lat
+
+# Layer names; LST is stored in °C, green layers as 0-1 fractions
+LST_LAYER = "lst_day"
+S2_GREEN_LAYER = "green_s2"
+NDVI_GREEN_LAYER = "green_ndvi"
+
+
+# ------------------ Memory-mapped Layer ------------------
+class RasterLayer:
+    """
+    One georeferenced float32 grid (north-up, EPSG:4326) opened with mmap_mode="r",
+    so worker processes share its pages through the OS page cache.
+    NaN marks missing data. Layers exported with a weight grid (meta "weights", e.g. the
+    fraction of each cell covered by vegetation-class pixels) are averaged by weight.
+    """
+
+    def __init__(self, data_path, meta):
+        self.meta = meta
+        self.data = np.load(data_path, mmap_mode="r")
+        self.weights = np.load(os.path.join(os.path.dirname(data_path), meta["weights"]), mmap_mode="r") \
+            if meta.get("weights") else None
+        self.min_lon = meta["min_lon"]
+        self.max_lat = meta["max_lat"]
+        self.res = meta["res_deg"]
+        self.height, self.width = self.data.shape
+
+    def _pixel_coords(self, lats, lons):
+        """Fractional (row, col) of pixel centres for the given coordinates."""
+        rows = (self.max_lat - np.asarray(lats, dtype=np.float64)) / self.res - 0.5
+        cols = (np.asarray(lons, dtype=np.float64) - self.min_lon) / self.res - 0.5
+        return rows, cols
+
+    def sample(self, lats, lons):
+        """Bilinear interpolation at many points; NaN neighbours are ignored."""
+        rows, cols = self._pixel_coords(lats, lons)
+        r0 = np.floor(rows).astype(np.int64)
+        c0 = np.floor(cols).astype(np.int64)
+        fr = rows - r0
+        fc = cols - c0
+
+        total = np.zeros(rows.shape)
+        weight = np.zeros(rows.shape)
+        for dr, dc, w in ((0, 0, (1 - fr) * (1 - fc)), (0, 1, (1 - fr) * fc),
+                          (1, 0, fr * (1 - fc)), (1, 1, fr * fc)):
+            r = np.clip(r0 + dr, 0, self.height - 1)
+            c = np.clip(c0 + dc, 0, self.width - 1)
+            values = self.data[r, c].astype(np.float64)
+            valid = ~np.isnan(values) & (r0 + dr >= 0) & (r0 + dr < self.height) \
+                & (c0 + dc >= 0) & (c0 + dc < self.width)
+            total += np.where(valid, values * w, 0.0)
+            weight += np.where(valid, w, 0.0)
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(weight > 0, total / weight, np.nan)
+
+    def buffer_mean(self, lats, lons, radius_km):
+        """(Weighted) mean of all valid pixels whose centre lies within `radius_km` of each point."""
+        lats = np.atleast_1d(np.asarray(lats, dtype=np.float64))
+        lons = np.atleast_1d(np.asarray(lons, dtype=np.float64))
+        rows, cols = self._pixel_coords(lats, lons)
+        r0 = np.rint(rows).astype(np.int64)
+
+        half_rows = int(np.ceil(radius_km / (self.res * KM_PER_DEG)))
+        cos_lat = np.maximum(np.cos(np.radians(lats)), 1e-6)
+        half_cols = int(np.ceil(radius_km / (self.res * KM_PER_DEG * cos_lat.min())))
+        dr = np.arange(-half_rows, half_rows + 1)[None, :, None]
+        dc = np.arange(-half_cols, half_cols + 1)[None, None, :]
+
+        # Window of pixel indices around each point: shape (points, rows, cols)
+        win_rows = r0[:, None, None] + dr
+        c_centre = np.rint(cols).astype(np.int64)
+        win_cols = c_centre[:, None, None] + dc
+
+        # Distance from the point to each pixel centre
+        pix_lat = self.max_lat - (win_rows + 0.5) * self.res
+        pix_lon = self.min_lon + (win_cols + 0.5) * self.res
+        dy = (pix_lat - lats[:, None, None]) * KM_PER_DEG
+        dx = (pix_lon - lons[:, None, None]) * KM_PER_DEG * cos_lat[:, None, None]
+        inside = (dx ** 2 + dy ** 2 <= radius_km ** 2) \
+            & (win_rows >= 0) & (win_rows < self.height) & (win_cols >= 0) & (win_cols < self.width)
+
+        win_rows = np.clip(win_rows, 0, self.height - 1)
+        win_cols = np.clip(win_cols, 0, self.width - 1)
+        values = self.data[win_rows, win_cols].astype(np.float64)
+        valid = inside & ~np.isnan(values)
+        weights = valid.astype(np.float64)
+        if self.weights is not None:
+            weights *= np.nan_to_num(self.weights[win_rows, win_cols].astype(np.float64))
+        count = weights.sum(axis=(1, 2))
+        total = np.where(valid, values * weights, 0.0).sum(axis=(1, 2))
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(count > 0, total / count, np.nan)
+
+
+# ------------------ Raster Store ------------------
+class RasterStore:
+    """
+    Lazily opened layers from `<directory>/<layer>.npy` + `<layer>.json`. The metadata
+    file (written last by export_rasters.py) has its mtime checked at most every
+    `check_interval` seconds, and a re-exported layer is swapped in without a restart.
+    """
+
+    def __init__(self, directory=RASTER_DIR, check_interval=RASTER_CHECK_INTERVAL):
+        self.directory = directory
+        self.check_interval = check_interval
+        self._layers = {}  # name -> (layer, meta mtime_ns, checked_at)
+        self._lock = threading.Lock()
+
+    def paths(self, name):
+        base = os.path.join(self.directory, name)
+        return base + ".npy", base + ".json"
+
+    def layer(self, name):
+        """Open layer or None when it has not been exported."""
+        now = time.monotonic()
+        entry = self._layers.get(name)
+        if entry is not None and now - entry[2] < self.check_interval:
+            return entry[0]
+
+        with self._lock:
+            entry = self._layers.get(name)
+            if entry is not None and now - entry[2] < self.check_interval:
+                return entry[0]
+            data_path, meta_path = self.paths(name)
+            try:
+                mtime = os.stat(meta_path).st_mtime_ns
+            except OSError:
+                mtime = None
+            if mtime is None or not os.path.exists(data_path):
+                self._layers.pop(name, None)
+                return None
+            if entry is not None and entry[1] == mtime:
+                self._layers[name] = (entry[0], mtime, now)
+                return entry[0]
+
+            try:
+                with open(meta_path, "r", encoding="utf-8") as f:
+                    meta = json.load(f)
+                layer = RasterLayer(data_path, meta)
+            except (OSError, ValueError) as e:
+                logger.error(f"❌ Failed to open raster layer '{name}': {e}")
+                return entry[0] if entry else None
+            self._layers[name] = (layer, mtime, now)
+            logger.info(f"✅ Raster layer '{name}' mapped ({meta['height']}x{meta['width']}, "
+                        f"created {meta.get('created_at')})")
+            return layer
+
+    def reload(self):
+        """Drop open layers so a fresh export is picked up now rather than at the next check."""
+        with self._lock:
+            self._layers = {}
+
+    def version(self, name):
+        layer = self.layer(name)
+        return layer.meta.get("created_at") if layer else None
+
+    def sample(self, name, lat, lon):
+        """Single bilinear value or None."""
+        layer = self.layer(name)
+        if layer is None:
+            return None
+        value = float(layer.sample([lat], [lon])[0])
+        return None if np.isnan(value) else value
+
+    def buffer_mean(self, name, lat, lon, radius_km):
+        """Single buffer mean or None."""
+        layer = self.layer(name)
+        if layer is None:
+            return None
+        value = float(layer.buffer_mean([lat], [lon], radius_km)[0])
+        return None if np.isnan(value) else value
+
+
+def rasters_enabled():
+    return SERVING_MODE == "raster"
+
+
+raster_store = RasterStore()
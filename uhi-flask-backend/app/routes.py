@@ -1,108 +1,312 @@
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, Response, current_app, jsonify, request, stream_with_context
 from .utils import get_uhi_metrics
+from .heatmap import build_heatmap_records, iter_heatmap_records
+from .heatmap_payload import (
+    FORMATS as HEATMAP_FORMATS, MIMETYPES, accepted_encodings, heatmap_payloads, is_version_id
+)
+from .batch import BatchTooLarge, parse_points, predict_points
+from .cache import COORD_DECIMALS, result_cache
+from .cities import CITIES, registry
+from .city_grid import HOTSPOT_COUNT, MAX_HOTSPOTS, analyze_grid, city_grid_store
+from .composites import LST_END, LST_START, green_space_window
+from .ee_executor import CircuitOpenError, ee_executor
+from .ee_session import ee_session
+from .fallback import REQUEST_BUDGET, BudgetExceeded
+from .metrics import Gauge, registry as metrics_registry, timed
+from .model.predictor import DEFAULT_GREEN_PRECISION, GREEN_PRECISIONS
+from .raster_store import LST_LAYER, raster_store
+from .singleflight import heatmap_flight, predict_flight
+from .tiles import MAX_ZOOM, render_tile, tile_cache, tile_etag
+from .timeseries import FREQUENCIES, timeseries_store
+import calendar
+import json
 import logging
+import time
+from datetime import date, datetime, timezone
 
 routes = Blueprint("routes", __name__)
 logger = logging.getLogger(__name__)
 
-# ------------------ 50 Indian Cities (no dummy green space) ------------------
-CITIES = [
-    {"name": "Delhi", "lat": 28.7041, "lon": 77.1025},
-    {"name": "Mumbai", "lat": 19.076, "lon": 72.8777},
-    {"name": "Bengaluru", "lat": 12.9716, "lon": 77.5946},
-    {"name": "Chennai", "lat": 13.0827, "lon": 80.2707},
-    {"name": "Kolkata", "lat": 22.5726, "lon": 88.3639},
-    {"name": "Hyderabad", "lat": 17.385, "lon": 78.4867},
-    {"name": "Ahmedabad", "lat": 23.0225, "lon": 72.5714},
-    {"name": "Pune", "lat": 18.5204, "lon": 73.8567},
-    {"name": "Jaipur", "lat": 26.9124, "lon": 75.7873},
-    {"name": "Lucknow", "lat": 26.8467, "lon": 80.9462},
-    {"name": "Kanpur", "lat": 26.4499, "lon": 80.3319},
-    {"name": "Nagpur", "lat": 21.1458, "lon": 79.0882},
-    {"name": "Indore", "lat": 22.7196, "lon": 75.8577},
-    {"name": "Thane", "lat": 19.2183, "lon": 72.9781},
-    {"name": "Bhopal", "lat": 23.2599, "lon": 77.4126},
-    {"name": "Visakhapatnam", "lat": 17.6868, "lon": 83.2185},
-    {"name": "Pimpri-Chinchwad", "lat": 18.6278, "lon": 73.812},
-    {"name": "Patna", "lat": 25.5941, "lon": 85.1376},
-    {"name": "Vadodara", "lat": 22.3072, "lon": 73.1812},
-    {"name": "Ghaziabad", "lat": 28.6692, "lon": 77.4538},
-    {"name": "Ludhiana", "lat": 30.9000, "lon": 75.8573},
-    {"name": "Agra", "lat": 27.1767, "lon": 78.0081},
-    {"name": "Nashik", "lat": 19.9975, "lon": 73.7898},
-    {"name": "Faridabad", "lat": 28.4089, "lon": 77.3178},
-    {"name": "Meerut", "lat": 28.9845, "lon": 77.7064},
-    {"name": "Rajkot", "lat": 22.3039, "lon": 70.8022},
-    {"name": "Kalyan-Dombivli", "lat": 19.2403, "lon": 73.1306},
-    {"name": "Vasai-Virar", "lat": 19.3914, "lon": 72.8397},
-    {"name": "Varanasi", "lat": 25.3176, "lon": 82.9739},
-    {"name": "Srinagar", "lat": 34.0837, "lon": 74.7973},
-    {"name": "Dhanbad", "lat": 23.7957, "lon": 86.4304},
-    {"name": "Jodhpur", "lat": 26.2389, "lon": 73.0243},
-    {"name": "Coimbatore", "lat": 11.0168, "lon": 76.9558},
-    {"name": "Bhubaneswar", "lat": 20.2961, "lon": 85.8245},
-    {"name": "Mysore", "lat": 12.2958, "lon": 76.6394},
-    {"name": "Gurgaon", "lat": 28.4595, "lon": 77.0266},
-    {"name": "Aligarh", "lat": 27.8974, "lon": 78.0880},
-    {"name": "Jalandhar", "lat": 31.3260, "lon": 75.5762},
-    {"name": "Tiruchirappalli", "lat": 10.7905, "lon": 78.7047},
-    {"name": "Ujjain", "lat": 23.1828, "lon": 75.7772},
-    {"name": "Salem", "lat": 11.6643, "lon": 78.1460},
-    {"name": "Mangalore", "lat": 12.9141, "lon": 74.8560},
-    {"name": "Jammu", "lat": 32.7266, "lon": 74.8570},
-    {"name": "Belgaum", "lat": 15.8497, "lon": 74.4977},
-    {"name": "Guwahati", "lat": 26.1445, "lon": 91.7362},
-    {"name": "Amritsar", "lat": 31.6340, "lon": 74.8723},
-    {"name": "Solapur", "lat": 17.6599, "lon": 75.9064},
-    {"name": "Ranchi", "lat": 23.3441, "lon": 85.3096},
-    {"name": "Tirupati", "lat": 13.6288, "lon": 79.4192},
-]
+metrics_registry.register(Gauge(
+    "uhi_cache_hit_ratio", "Result cache hit ratio since start", lambda: result_cache.stats()["hit_rate"]))
+metrics_registry.register(Gauge(
+    "uhi_cache_memory_entries", "Entries in the in-memory result cache",
+    lambda: result_cache.stats()["memory_entries"]))
+metrics_registry.register(Gauge(
+    "uhi_ee_ready", "1 once Earth Engine is initialized", lambda: ee_session.status()["ready"]))
+metrics_registry.register(Gauge(
+    "uhi_ee_circuit_open", "1 while the Earth Engine circuit breaker rejects calls",
+    lambda: ee_executor.breaker.state != "closed"))
 
 # ------------------ Routes ------------------
 
 @routes.route("/cities", methods=["GET"])
 def list_cities():
-    """Return list of all predefined cities."""
-    return jsonify(CITIES), 200
+    """Return registered cities, optionally limited to ?bbox=min_lon,min_lat,max_lon,max_lat."""
+    bbox = request.args.get("bbox")
+    if not bbox:
+        return jsonify(CITIES), 200
+
+    try:
+        min_lon, min_lat, max_lon, max_lat = (float(v) for v in bbox.split(","))
+    except ValueError:
+        return jsonify({"error": "bbox must be min_lon,min_lat,max_lon,max_lat"}), 400
+    return jsonify(registry.within_bbox(min_lat, min_lon, max_lat, max_lon)), 200
 
 
 @routes.route("/predict", methods=["GET"])
 def predict():
-    """Predict UHI metrics for a given lat/lon (green space dynamic)."""
+    """
+    Predict UHI metrics for a given lat/lon (green space dynamic).
+    ?precision=fast|auto|high trades green space accuracy for latency.
+    ?budget_ms= bounds the wait; past it the last-known-good result is served as stale.
+    """
+    precision = request.args.get("precision", DEFAULT_GREEN_PRECISION)
+    if precision not in GREEN_PRECISIONS:
+        return jsonify({"error": f"precision must be one of {', '.join(GREEN_PRECISIONS)}"}), 400
+    try:
+        budget = float(request.args.get("budget_ms", REQUEST_BUDGET * 1000)) / 1000
+    except ValueError:
+        return jsonify({"error": "budget_ms must be a number"}), 400
+    if budget < 0:
+        return jsonify({"error": "budget_ms must not be negative"}), 400
+
     try:
         lat = float(request.args.get("lat"))
         lon = float(request.args.get("lon"))
 
-        # Find city in predefined list or use lat/lon directly
-        city_data = next((c for c in CITIES if c["lat"] == lat and c["lon"] == lon), None)
-        if not city_data:
-            city_data = {"lat": lat, "lon": lon}
+        # Snap to the nearest registered city so its results are shared
+        city = registry.nearest(lat, lon)
+        city_data = dict(city) if city else {"lat": lat, "lon": lon}
 
-        # Fetch UHI metrics (green space dynamically)
-        metrics = get_uhi_metrics(city_data)
+        # Fetch UHI metrics (green space dynamically); identical in-flight requests share one computation
+        location = city["key"] if city else f"{lat:.{COORD_DECIMALS}f},{lon:.{COORD_DECIMALS}f}"
+        flight_key = (location, precision, budget, LST_START, LST_END, *green_space_window())
+        metrics = dict(predict_flight.do(
+            flight_key, lambda: get_uhi_metrics(city_data, precision=precision, budget=budget)))
+        if city:
+            metrics.update({"city": city["name"], "city_key": city["key"]})
         return jsonify(metrics), 200
 
+    except (BudgetExceeded, CircuitOpenError) as e:
+        # Nothing to fall back on yet; the fetch continues in the background
+        return jsonify({"error": str(e)}), 503, {"Retry-After": "5"}
     except Exception as e:
         logger.error(f"❌ Error in /predict: {e}")
         return jsonify({"error": str(e)}), 500
 
 
+@routes.route("/predict/batch", methods=["POST"])
+def predict_batch():
+    """Predict UHI metrics for many points (JSON array or GeoJSON FeatureCollection)."""
+    try:
+        points = parse_points(request.get_json(force=True, silent=True))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        results = predict_points(points)
+    except BatchTooLarge as e:
+        return jsonify({"error": str(e)}), 413
+    except Exception as e:
+        logger.error(f"❌ Error in /predict/batch: {e}")
+        return jsonify({"error": str(e)}), 500
+
+    return jsonify({"count": len(results), "results": results}), 200
+
+
 @routes.route("/heatmap", methods=["GET"])
 def heatmap():
-    """Return heatmap array for all cities with dynamic green space."""
-    heatmap_data = []
-    for city in CITIES:
+    """
+    Return heatmap data for all cities, served from the background snapshot when enabled.
+    ?format=records (default array of objects) | columnar | binary; with columnar/binary,
+    ?since=<version> returns only the entries changed since that version. Responses carry
+    a strong ETag (If-None-Match yields 304) and are gzip/brotli compressed per version.
+    The snapshot's generation time is sent as X-Heatmap-Generated-At (and in records bodies).
+    """
+    fmt = request.args.get("format", "records")
+    if fmt not in HEATMAP_FORMATS:
+        return jsonify({"error": f"format must be one of {', '.join(HEATMAP_FORMATS)}"}), 400
+    since = request.args.get("since")
+    if since and fmt == "records":
+        return jsonify({"error": "since requires format=columnar or format=binary"}), 400
+    if since and not is_version_id(since):
+        # It ends up in the ETag header and the body cache key; only accept real version ids
+        return jsonify({"error": "since must be a heatmap version id (16 hex digits)"}), 400
+
+    snapshot = current_app.extensions.get("heatmap_snapshot")
+    if snapshot is None:
+        heatmap_data = heatmap_flight.do(
+            (LST_START, LST_END, *green_space_window()), lambda: build_heatmap_records(CITIES))
+        generated_at = None
+    else:
         try:
-            metrics = get_uhi_metrics(city)
-            heatmap_data.append({
-                "lat": city["lat"],
-                "lon": city["lon"],
-                "mitigated_temp": metrics["mitigated_temp"],
-                "green_space_percent": metrics.get("green_space_percent", 0),
-                "risk_level": metrics.get("risk_level", "No Data")
-            })
+            heatmap_data, generated_at = snapshot.get()
         except Exception as e:
-            logger.warning(f"⚠️ Skipping city {city['name']} due to error: {e}")
-            continue
+            logger.error(f"❌ Error in /heatmap: {e}")
+            return jsonify({"error": str(e)}), 503
+
+    version = heatmap_payloads.publish(heatmap_data, [city["key"] for city in CITIES])
+    encoding = request.accept_encodings.best_match(accepted_encodings()) or "identity"
+    etag = version.etag(fmt, since, encoding, generated_at)
+    headers = {"ETag": f'"{etag}"', "Vary": "Accept-Encoding", "Cache-Control": "no-cache",
+               "X-Heatmap-Version": version.id}
+    if generated_at:
+        headers["X-Heatmap-Generated-At"] = generated_at.isoformat()
+    if request.if_none_match.contains(etag):
+        return Response(status=304, headers=headers)
+
+    with timed("heatmap_encode"):
+        body = heatmap_payloads.body(version, fmt, since, encoding, generated_at)
+    if encoding != "identity":
+        headers["Content-Encoding"] = encoding
+    return Response(body, mimetype=MIMETYPES[fmt], headers=headers)
+
+
+@routes.route("/heatmap/stream", methods=["GET"])
+def heatmap_stream():
+    """
+    Stream heatmap records in completion order as NDJSON (default) or Server-Sent Events
+    (?format=sse or Accept: text/event-stream). Each line/event is a "city" record or a
+    "city_error"; a final "summary" record closes the stream.
+    """
+    fmt = request.args.get("format")
+    if fmt is None:
+        fmt = "sse" if "text/event-stream" in request.headers.get("Accept", "") else "ndjson"
+    if fmt not in ("ndjson", "sse"):
+        return jsonify({"error": "format must be ndjson or sse"}), 400
+
+    def encode(kind, record):
+        if fmt == "sse":
+            return f"event: {kind}\ndata: {json.dumps(record)}\n\n"
+        return json.dumps({"type": kind, **record}) + "\n"
+
+    def generate():
+        started = time.perf_counter()
+        counts = {"city": 0, "city_error": 0, "no_data": 0}
+        try:
+            for kind, record in iter_heatmap_records(CITIES):
+                counts[kind] += 1
+                if record.get("risk_level") == "No Data":
+                    counts["no_data"] += 1
+                yield encode(kind, record)
+        except Exception as e:
+            logger.error(f"❌ Error in /heatmap/stream: {e}")
+            counts["city_error"] += 1
+            yield encode("city_error", {"error": str(e)})
+        yield encode("summary", {
+            "cities": len(CITIES),
+            "records": counts["city"],
+            "no_data": counts["no_data"],
+            "errors": counts["city_error"],
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 2),
+            "generated_at": datetime.now(timezone.utc).isoformat(),
+        })
+
+    mimetype = "text/event-stream" if fmt == "sse" else "application/x-ndjson"
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}  # no proxy buffering
+    return Response(stream_with_context(generate()), mimetype=mimetype, headers=headers)
+
+
+@routes.route("/city/<name>/grid", methods=["GET"])
+def city_grid(name):
+    """
+    Intra-city UHI intensity grid: rural baseline, green fraction and the ?top=N hottest
+    cells, analysed locally from one cached pixel download (?cells=1 adds the full grids).
+    """
+    city = registry.get(name)
+    if city is None:
+        return jsonify({"error": f"Unknown city {name}"}), 404
+    try:
+        top = int(request.args.get("top", HOTSPOT_COUNT))
+    except ValueError:
+        return jsonify({"error": "top must be an integer"}), 400
+    if not 1 <= top <= MAX_HOTSPOTS:
+        return jsonify({"error": f"top must be between 1 and {MAX_HOTSPOTS}"}), 400
+
+    try:
+        grid = city_grid_store.get(city)
+        with timed("city_grid_analysis"):
+            result = analyze_grid(grid, hotspots=top, include_cells=request.args.get("cells") == "1")
+    except Exception as e:
+        logger.error(f"❌ Error in /city/{name}/grid: {e}")
+        return jsonify({"error": str(e)}), 500
+
+    return jsonify({"city": city["name"], "city_key": city["key"], "window": [LST_START, LST_END], **result}), 200
+
+
+def _parse_period(value, end=False):
+    """YYYY-MM or YYYY-MM-DD; a bare month as `end` covers the whole month."""
+    if not value:
+        return None
+    if len(value) == 7:
+        month = date.fromisoformat(f"{value}-01")
+        return month.replace(day=calendar.monthrange(month.year, month.month)[1]) if end else month
+    return date.fromisoformat(value)
+
+
+@routes.route("/timeseries", methods=["GET"])
+def timeseries():
+    """
+    Monthly (or ?freq=8day) LST and NDVI history for ?city=, optionally limited to
+    ?from= and ?to= (YYYY-MM or YYYY-MM-DD). Served from the local store only.
+    """
+    frequency = request.args.get("freq", "monthly")
+    if frequency not in FREQUENCIES:
+        return jsonify({"error": f"freq must be one of {', '.join(FREQUENCIES)}"}), 400
+    city = registry.get(request.args.get("city"))
+    if city is None:
+        return jsonify({"error": "Unknown or missing city"}), 404
+    try:
+        start = _parse_period(request.args.get("from"))
+        end = _parse_period(request.args.get("to"), end=True)
+    except ValueError:
+        return jsonify({"error": "from/to must be YYYY-MM or YYYY-MM-DD"}), 400
+
+    with timed("timeseries_query"):
+        series = timeseries_store.query(city["key"], start, end, frequency)
+    if series is None:
+        return jsonify({"error": "Time series not built yet; run update_timeseries.py"}), 404
+    return jsonify({"city": city["name"], "city_key": city["key"], "frequency": frequency, **series}), 200
+
+
+@routes.route("/tiles/<int:z>/<int:x>/<int:y>.png", methods=["GET"])
+def tile(z, x, y):
+    """LST heatmap tile rendered from the local raster grid (no Earth Engine call)."""
+    if not (0 <= z <= MAX_ZOOM and 0 <= x < 2 ** z and 0 <= y < 2 ** z):
+        return jsonify({"error": "Tile out of range"}), 404
+
+    layer = raster_store.layer(LST_LAYER)
+    if layer is None:
+        return jsonify({"error": "LST raster not exported; run export_rasters.py"}), 404
+
+    etag = tile_etag(raster_store.version(LST_LAYER), z, x, y)
+    headers = {"ETag": f'"{etag}"', "Cache-Control": "public, max-age=86400"}
+    if request.if_none_match.contains(etag):
+        return Response(status=304, headers=headers)
+
+    png = tile_cache.get(etag)
+    if png is None:
+        with timed("tile_render"):
+            png = render_tile(layer, z, x, y)
+        tile_cache.put(etag, png)
+    return Response(png, mimetype="image/png", headers=headers)
+
+
+@routes.route("/ready", methods=["GET"])
+def ready():
+    """Readiness probe: 200 once Earth Engine warm-up has finished, 503 before."""
+    status = ee_session.status()
+    return jsonify(status), 200 if status["ready"] else 503
+
+
+@routes.route("/cache/stats", methods=["GET"])
+def cache_stats():
+    """Return hit/miss counters of the satellite result cache."""
+    return jsonify(result_cache.stats()), 200
+
 
-    return jsonify({"heatmap": heatmap_data}), 200
+@routes.route("/metrics", methods=["GET"])
+def metrics():
+    """Latency histograms, Earth Engine round-trips and cache counters in Prometheus text format."""
+    return Response(metrics_registry.render(), mimetype="text/plain; version=0.0.4")
@@ -0,0 +1,64 @@
+import logging
+import threading
+from .metrics import coalesced_requests
+
+logger = logging.getLogger(__name__)
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+# ------------------ Single-Flight Coalescing ------------------
+class SingleFlight:
+    """
+    Run at most one computation per key at a time. Callers arriving while a computation
+    for the same key is in flight wait for it and share its result or exception instead
+    of starting their own. Nothing is cached once the computation has finished.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                call.waiters += 1
+
+        if not leader:
+            coalesced_requests.inc(group=self.name)
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+            if call.waiters:
+                logger.info(f"🔗 {self.name}: {call.waiters} identical request(s) shared one computation")
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._calls)
+
+
+predict_flight = SingleFlight("predict")
+heatmap_flight = SingleFlight("heatmap")
@@ -0,0 +1,168 @@
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+try:
+    import fcntl  # POSIX only; elsewhere every process refreshes its own snapshot
+except ImportError:
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+# ------------------ Heatmap Snapshot ------------------
+class HeatmapSnapshot:
+    """
+    Precomputed heatmap payload refreshed by a background scheduler thread.
+    Readers always get the latest complete snapshot; a new one is swapped in
+    atomically (single attribute assignment) once it has been fully built.
+
+    With a `path`, processes share one snapshot: whichever holds an exclusive lock on
+    `<path>.lock` is the leader and the only one that builds, writing every snapshot
+    atomically to `path`. The others load it from there whenever the file changes and
+    take the lock over if the leader exits, so N prefork workers cost one build.
+    `signature` (JSON-serializable) describes what `build` produces, e.g. the city keys;
+    shared snapshots written with a different signature are ignored.
+    """
+
+    def __init__(self, build, interval, max_age, path=None, signature=None):
+        self._build = build
+        self.interval = interval
+        self.max_age = max_age
+        self.path = path
+        self.signature = signature
+        self._snapshot = None  # (payload, generated_at epoch seconds)
+        self._loaded_mtime = None  # mtime of the shared file behind _snapshot
+        self._leader_lock = None  # open lock file while this process is the leader
+        self._refresh_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    # ------------------ Leader Election ------------------
+    @property
+    def is_leader(self):
+        return self.path is None or fcntl is None or self._leader_lock is not None
+
+    def _try_lead(self):
+        """Become the leader if no other process is (non-blocking)."""
+        if self.is_leader:
+            return True
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            handle = open(f"{self.path}.lock", "a")
+        except OSError as e:
+            logger.warning(f"⚠️ Heatmap snapshot lock unavailable: {e}")
+            return False
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            handle.close()
+            return False
+        self._leader_lock = handle  # held (and the lock with it) for the life of the process
+        logger.info(f"✅ Process {os.getpid()} now refreshes the shared heatmap snapshot")
+        return True
+
+    # ------------------ Shared File ------------------
+    def _save(self, payload, generated_at):
+        if self.path is None:
+            return
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump({"signature": self.signature, "generated_at": generated_at, "heatmap": payload}, f,
+                          separators=(",", ":"))
+            os.replace(tmp_path, self.path)  # readers never see a half-written snapshot
+            self._loaded_mtime = os.stat(self.path).st_mtime_ns
+        except (OSError, TypeError, ValueError) as e:
+            logger.warning(f"⚠️ Heatmap snapshot could not be shared: {e}")
+
+    def _load(self):
+        """Pick up a snapshot written by the leader; True if one is available."""
+        if self.path is None:
+            return self._snapshot is not None
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+            if mtime != self._loaded_mtime:
+                with open(self.path) as f:
+                    data = json.load(f)
+                if data.get("signature") == self.signature:
+                    self._snapshot = (data["heatmap"], data["generated_at"])
+                self._loaded_mtime = mtime
+        except (OSError, KeyError, ValueError):
+            pass  # not written yet (or mid-replace on exotic filesystems); keep what we have
+        return self._snapshot is not None
+
+    # ------------------ Refresh ------------------
+    def refresh(self):
+        """
+        Rebuild the snapshot; returns False if a refresh is already running. Processes
+        that are not the leader reload the shared snapshot instead of building.
+        """
+        if not self._try_lead():
+            return self._load()
+        if not self._refresh_lock.acquire(blocking=False):
+            return False
+        try:
+            started = time.time()
+            payload = self._build()
+            generated_at = time.time()
+            self._snapshot = (payload, generated_at)
+            self._save(payload, generated_at)
+            logger.info(f"✅ Heatmap snapshot refreshed in {time.time() - started:.1f}s")
+            return True
+        except Exception as e:
+            logger.error(f"❌ Heatmap snapshot refresh failed: {e}")
+            return False
+        finally:
+            self._refresh_lock.release()
+
+    def refresh_async(self):
+        threading.Thread(target=self.refresh, name="heatmap-refresh", daemon=True).start()
+
+    def _run(self):
+        while not self._stop.is_set():
+            wait = self.interval
+            if self._try_lead():
+                # A snapshot shared by a previous leader is reused until it is due
+                age = time.time() - self._snapshot[1] if self._load() else None
+                if age is None or age >= self.interval:
+                    self.refresh()
+                else:
+                    wait = self.interval - age
+            self._stop.wait(wait)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="heatmap-scheduler", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def get(self):
+        """
+        Return (payload, generated_at datetime).
+        Stale snapshots are served as-is while a background refresh runs; only the
+        very first request blocks if no snapshot has been built yet (or, in a process
+        that is not the leader, raises until the leader has shared one).
+        """
+        self._load()
+        snapshot = self._snapshot
+        if snapshot is None:
+            with self._refresh_lock:
+                pass  # wait for an in-flight refresh to finish
+            snapshot = self._snapshot
+            if snapshot is None:
+                self.refresh()
+                snapshot = self._snapshot
+            if snapshot is None:
+                raise RuntimeError("Heatmap snapshot is not available yet.")
+
+        payload, generated_at = snapshot
+        if time.time() - generated_at > self.max_age:
+            self.refresh_async()
+
+        return payload, datetime.fromtimestamp(generated_at, tz=timezone.utc)
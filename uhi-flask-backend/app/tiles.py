@@ -0,0 +1,142 @@
+import hashlib
+import os
+import struct
+import threading
+import zlib
+from collections import OrderedDict
+import numpy as np
+from .composites import LST_PALETTE, LST_VIS_MAX, LST_VIS_MIN
+
+# ------------------ Tile Settings ------------------
+TILE_SIZE = 256
+MAX_ZOOM = int(os.environ.get("UHI_TILE_MAX_ZOOM", "14"))
+TILE_CACHE_DIR = os.environ.get(
+    "UHI_TILE_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "tiles")
+)
+TILE_CACHE_MAX_BYTES = int(os.environ.get("UHI_TILE_CACHE_MAX_MB", "256")) * 1024 * 1024
+
+# CSS colours used by the Earth Engine palette
+PALETTE_RGB = {
+    "blue": (0, 0, 255), "cyan": (0, 255, 255), "green": (0, 128, 0),
+    "yellow": (255, 255, 0), "orange": (255, 165, 0), "red": (255, 0, 0),
+}
+
+
+# ------------------ Rendering ------------------
+def tile_lat_lon(z, x, y, size=TILE_SIZE):
+    """Latitude/longitude of every pixel centre of a Web Mercator XYZ tile."""
+    n = size * (2 ** z)
+    px = (x * size + np.arange(size) + 0.5) / n
+    py = (y * size + np.arange(size) + 0.5) / n
+    lons = px * 360.0 - 180.0
+    lats = np.degrees(np.arctan(np.sinh(np.pi * (1 - 2 * py))))
+    return np.broadcast_to(lats[:, None], (size, size)), np.broadcast_to(lons[None, :], (size, size))
+
+
+def colorize(values, vmin=LST_VIS_MIN, vmax=LST_VIS_MAX, palette=LST_PALETTE):
+    """Map values to RGBA with the same linear palette stretch as ee.Image.visualize; NaN is transparent."""
+    stops = np.array([PALETTE_RGB[c] for c in palette], dtype=np.float64)
+    t = np.clip((values - vmin) / (vmax - vmin), 0, 1) * (len(stops) - 1)
+    t = np.nan_to_num(t)
+    lower = np.minimum(np.floor(t).astype(np.int64), len(stops) - 2)
+    frac = (t - lower)[..., None]
+    rgb = stops[lower] * (1 - frac) + stops[lower + 1] * frac
+
+    rgba = np.empty(values.shape + (4,), dtype=np.uint8)
+    rgba[..., :3] = np.rint(rgb).astype(np.uint8)
+    rgba[..., 3] = np.where(np.isnan(values), 0, 255)
+    return rgba
+
+
+def encode_png(rgba):
+    """Minimal RGBA PNG encoder (no imaging library needed)."""
+    height, width, _ = rgba.shape
+    raw = np.concatenate([np.zeros((height, 1), dtype=np.uint8), rgba.reshape(height, width * 4)], axis=1)
+
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF)
+
+    header = struct.pack(">IIBBBBB", width, height, 8, 6, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) \
+        + chunk(b"IDAT", zlib.compress(raw.tobytes(), 6)) + chunk(b"IEND", b"")
+
+
+def render_tile(layer, z, x, y):
+    """PNG bytes of the LST palette for one tile, sampled from a local raster layer."""
+    lats, lons = tile_lat_lon(z, x, y)
+    values = layer.sample(lats.ravel(), lons.ravel()).reshape(lats.shape)
+    return encode_png(colorize(values))
+
+
+def tile_etag(version, z, x, y):
+    return hashlib.sha1(f"{version}:{z}/{x}/{y}".encode()).hexdigest()
+
+
+# ------------------ Disk Tile Cache ------------------
+class TileCache:
+    """Size-bounded disk LRU of rendered tiles, one file per ETag."""
+
+    def __init__(self, directory=TILE_CACHE_DIR, max_bytes=TILE_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._entries = None  # OrderedDict path -> size, oldest first
+        self._total = 0
+        self._lock = threading.Lock()
+
+    def _load_index(self):
+        if self._entries is not None:
+            return
+        files = []
+        if os.path.isdir(self.directory):
+            for name in os.listdir(self.directory):
+                if not name.endswith(".png"):
+                    continue
+                path = os.path.join(self.directory, name)
+                stat = os.stat(path)
+                files.append((stat.st_mtime, path, stat.st_size))
+        self._entries = OrderedDict((path, size) for _, path, size in sorted(files))
+        self._total = sum(self._entries.values())
+
+    def _path(self, etag):
+        return os.path.join(self.directory, f"{etag}.png")
+
+    def get(self, etag):
+        path = self._path(etag)
+        with self._lock:
+            self._load_index()
+            if path not in self._entries:
+                return None
+            self._entries.move_to_end(path)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)  # keep LRU order across restarts
+            return data
+        except OSError:
+            with self._lock:
+                self._total -= self._entries.pop(path, 0)
+            return None
+
+    def put(self, etag, data):
+        path = self._path(etag)
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            self._load_index()
+            self._total += len(data) - self._entries.pop(path, 0)
+            self._entries[path] = len(data)
+            while self._total > self.max_bytes and len(self._entries) > 1:
+                old_path, size = self._entries.popitem(last=False)
+                self._total -= size
+                try:
+                    os.remove(old_path)
+                except OSError:
+                    pass
+
+
+tile_cache = TileCache()
@@ -0,0 +1,280 @@
+import datetime
+import logging
+import os
+import threading
+import ee
+import numpy as np
+from .cities import CITIES
+from .composites import GREEN_BAND, LST_BAND, lst_mean_image, lst_to_celsius, ndvi_mean_image
+from .ee_executor import ee_executor
+from .ee_session import ensure_initialized
+from .metrics import timed
+
+logger = logging.getLogger(__name__)
+
+# ------------------ Time Series Settings ------------------
+TIMESERIES_DIR = os.environ.get(
+    "UHI_TIMESERIES_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "timeseries")
+)
+TIMESERIES_START = os.environ.get("UHI_TIMESERIES_START", "2020-01-01")
+TIMESERIES_RADIUS_KM = 5  # NDVI is averaged over the same buffer as green space
+FREQUENCIES = ("monthly", "8day")
+
+
+# ------------------ Periods ------------------
+def _month_start(date):
+    return date.replace(day=1)
+
+
+def _next_month(date):
+    return (date.replace(day=28) + datetime.timedelta(days=4)).replace(day=1)
+
+
+def period_bounds(frequency, start, until):
+    """
+    Complete periods [start, end) beginning on or after `start` and ending on or before
+    `until`. 8-day periods follow the MODIS composite calendar (reset every 1 January).
+    """
+    if frequency not in FREQUENCIES:
+        raise ValueError(f"frequency must be one of {', '.join(FREQUENCIES)}")
+    periods = []
+    if frequency == "monthly":
+        current = _month_start(start) if start.day == 1 else _next_month(start)
+        while _next_month(current) <= until:
+            periods.append((current, _next_month(current)))
+            current = _next_month(current)
+        return periods
+
+    for year in range(start.year, until.year + 1):
+        year_end = datetime.date(year + 1, 1, 1)
+        for k in range(46):
+            begin = datetime.date(year, 1, 1) + datetime.timedelta(days=8 * k)
+            end = min(begin + datetime.timedelta(days=8), year_end)
+            if begin >= start and end <= until:
+                periods.append((begin, end))
+    return periods
+
+
+# ------------------ Earth Engine Reduction ------------------
+def _reduce_period(cities, start, end, radius_km=TIMESERIES_RADIUS_KM):
+    """
+    One batched evaluation for one period across all cities.
+    Returns (lst °C, ndvi) float arrays aligned with `cities`, NaN where missing.
+    """
+    ensure_initialized()
+    points, buffers = [], []
+    for index, city in enumerate(cities):
+        point = ee.Geometry.Point([city["lon"], city["lat"]])
+        points.append(ee.Feature(point, {"city_index": index}))
+        buffers.append(ee.Feature(point.buffer(radius_km * 1000), {"city_index": index}))
+    points = ee.FeatureCollection(points)
+    buffers = ee.FeatureCollection(buffers)
+    region = buffers.geometry()
+
+    start_date, end_date = start.isoformat(), end.isoformat()
+    lst_stats = lst_mean_image(region, start_date, end_date).reduceRegions(
+        collection=points,
+        reducer=ee.Reducer.mean().setOutputs([LST_BAND]),
+        scale=1000
+    )
+    ndvi_stats = ndvi_mean_image(region, start_date, end_date).reduceRegions(
+        collection=buffers,
+        reducer=ee.Reducer.mean().setOutputs([GREEN_BAND]),
+        scale=500
+    )
+    with timed("timeseries_period_reduce"):
+        result = ee_executor.get_info(ee.Dictionary({
+            "lst": lst_stats.select(propertySelectors=["city_index", LST_BAND], retainGeometry=False),
+            "ndvi": ndvi_stats.select(propertySelectors=["city_index", GREEN_BAND], retainGeometry=False),
+        }))
+
+    lst = np.full(len(cities), np.nan, dtype=np.float32)
+    ndvi = np.full(len(cities), np.nan, dtype=np.float32)
+    for feature in result["lst"].get("features", []):
+        props = feature.get("properties", {})
+        value = lst_to_celsius(props.get(LST_BAND))
+        if value is not None:
+            lst[props["city_index"]] = value
+    for feature in result["ndvi"].get("features", []):
+        props = feature.get("properties", {})
+        if props.get(GREEN_BAND) is not None:
+            ndvi[props["city_index"]] = props[GREEN_BAND]
+    return lst, ndvi
+
+
+# ------------------ Columnar Store ------------------
+class TimeSeriesStore:
+    """
+    Per-frequency columnar arrays in one .npz file: `periods` (datetime64[D] period
+    starts), `cities` (city keys) and [period, city] float32 matrices `lst`, `ndvi`
+    plus a boolean `fetched` mask. Refreshes only evaluate (period, city) cells that
+    were never fetched, one batched reduction per period; queries are local only.
+    """
+
+    def __init__(self, directory=TIMESERIES_DIR):
+        self.directory = directory
+        self._loaded = {}  # frequency -> (mtime_ns, arrays dict)
+        self._lock = threading.Lock()
+
+    def _path(self, frequency):
+        return os.path.join(self.directory, f"timeseries_{frequency}.npz")
+
+    def load(self, frequency):
+        """Arrays for a frequency (re-read when the file changes), or None if never refreshed."""
+        path = self._path(frequency)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+        cached = self._loaded.get(frequency)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        with np.load(path) as data:
+            arrays = {name: data[name] for name in data.files}
+        self._loaded[frequency] = (mtime, arrays)
+        return arrays
+
+    def _save(self, frequency, arrays):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(frequency)
+        tmp_path = f"{path}.{os.getpid()}.partial.npz"
+        np.savez(tmp_path, **arrays)
+        os.replace(tmp_path, path)  # readers never see a half-written store
+
+    def refresh(self, frequency="monthly", cities=None, start=None, until=None):
+        """
+        Fetch every missing (period, city) cell from `start` up to the last complete
+        period before `until` (default today). Returns the number of periods evaluated.
+        """
+        cities = CITIES if cities is None else cities
+        start = start or datetime.date.fromisoformat(TIMESERIES_START)
+        until = until or datetime.date.today()
+        bounds = period_bounds(frequency, start, until)
+
+        with self._lock:
+            arrays = self.load(frequency) or {
+                "periods": np.array([], dtype="datetime64[D]"),
+                "cities": np.array([], dtype=str),
+                "lst": np.empty((0, 0), dtype=np.float32),
+                "ndvi": np.empty((0, 0), dtype=np.float32),
+                "fetched": np.empty((0, 0), dtype=bool),
+            }
+            arrays = self._align(arrays, [b[0] for b in bounds], [c["key"] for c in cities])
+            row_of = {p: i for i, p in enumerate(arrays["periods"].astype(object))}
+            col_of = {k: i for i, k in enumerate(arrays["cities"].tolist())}
+            city_cols = np.array([col_of[c["key"]] for c in cities], dtype=np.int64)
+
+            # Periods with at least one city never fetched; only those cities are reduced
+            tasks = []
+            for begin, end in bounds:
+                row = row_of[begin]
+                missing = np.flatnonzero(~arrays["fetched"][row, city_cols])
+                if missing.size:
+                    tasks.append((row, begin, end, missing))
+            if not tasks:
+                return 0
+
+            logger.info(f"🛰️ Time series ({frequency}): fetching {len(tasks)} period(s)")
+            with timed("timeseries_refresh"):
+                results = ee_executor.map(
+                    lambda task: _reduce_period([cities[i] for i in task[3]], task[1], task[2]),
+                    tasks
+                )
+            fetched = 0
+            for (row, begin, _, missing), result in zip(tasks, results):
+                if isinstance(result, Exception):
+                    logger.error(f"❌ Time series period {begin} failed: {result}")
+                    continue
+                cols = city_cols[missing]
+                arrays["lst"][row, cols], arrays["ndvi"][row, cols] = result
+                arrays["fetched"][row, cols] = True
+                fetched += 1
+            self._save(frequency, arrays)
+            self._loaded.pop(frequency, None)
+            logger.info(f"✅ Time series ({frequency}): {fetched}/{len(tasks)} period(s) stored")
+            return fetched
+
+    @staticmethod
+    def _align(arrays, period_starts, city_keys):
+        """Grow the matrices to cover new periods and cities (new cells unfetched)."""
+        periods = arrays["periods"]
+        new_periods = np.setdiff1d(np.array(period_starts, dtype="datetime64[D]"), periods)
+        known = set(arrays["cities"].tolist())
+        new_cities = [k for k in dict.fromkeys(city_keys) if k not in known]
+        if not new_periods.size and not new_cities:
+            return dict(arrays)
+
+        all_periods = np.sort(np.concatenate([periods, new_periods]))
+        all_cities = np.array(arrays["cities"].tolist() + new_cities, dtype=str)
+        rows = np.searchsorted(all_periods, periods)
+        old_cols = len(arrays["cities"])
+
+        aligned = {"periods": all_periods, "cities": all_cities}
+        for name, fill, dtype in (("lst", np.nan, np.float32), ("ndvi", np.nan, np.float32),
+                                  ("fetched", False, bool)):
+            grown = np.full((len(all_periods), len(all_cities)), fill, dtype=dtype)
+            grown[rows, :old_cols] = arrays[name]
+            aligned[name] = grown
+        return aligned
+
+    def query(self, city_key, start=None, end=None, frequency="monthly"):
+        """
+        LST / NDVI series for one city between two dates (inclusive period starts),
+        with vectorized summary statistics. Returns None if the city is not stored.
+        """
+        if frequency not in FREQUENCIES:
+            raise ValueError(f"frequency must be one of {', '.join(FREQUENCIES)}")
+        arrays = self.load(frequency)
+        if arrays is None:
+            return None
+        cols = np.flatnonzero(arrays["cities"] == city_key)
+        if not cols.size:
+            return None
+
+        periods = arrays["periods"]
+        mask = np.ones(periods.shape, dtype=bool)
+        if start is not None:
+            mask &= periods >= np.datetime64(start, "D")
+        if end is not None:
+            mask &= periods <= np.datetime64(end, "D")
+        lst = arrays["lst"][mask, cols[0]].astype(np.float64)
+        ndvi = arrays["ndvi"][mask, cols[0]].astype(np.float64)
+        fetched = arrays["fetched"][mask, cols[0]]
+        selected = periods[mask]
+
+        return {
+            "periods": [str(p) for p in selected],
+            "lst": _to_list(lst, 2),
+            "ndvi": _to_list(ndvi, 4),
+            "pending_periods": int((~fetched).sum()),
+            "summary": {"lst": _summarize(selected, lst), "ndvi": _summarize(selected, ndvi, 4)},
+        }
+
+
+def _to_list(values, decimals):
+    rounded = np.round(values, decimals)
+    return [None if np.isnan(v) else float(v) for v in rounded]
+
+
+def _summarize(periods, values, decimals=2):
+    """Mean, min, max and least-squares trend per year of the non-missing values."""
+    valid = ~np.isnan(values)
+    if not valid.any():
+        return {"mean": None, "min": None, "max": None, "trend_per_year": None, "count": 0}
+    years = periods[valid].astype("datetime64[D]").astype(np.float64) / 365.25
+    observed = values[valid]
+    trend = None
+    if observed.size >= 2 and np.ptp(years) > 0:
+        slope = np.polyfit(years - years.mean(), observed, 1)[0]
+        trend = round(float(slope), decimals + 1)
+    return {
+        "mean": round(float(observed.mean()), decimals),
+        "min": round(float(observed.min()), decimals),
+        "max": round(float(observed.max()), decimals),
+        "trend_per_year": trend,
+        "count": int(observed.size),
+    }
+
+
+timeseries_store = TimeSeriesStore()
@@ -0,0 +1,461 @@
+"""
+Local stand-in for the parts of the `ee` (Earth Engine) API used by the backend.
+
+Objects are built lazily like the real client library; only getInfo(),
+ee.data.getMapId() and ee.data.computePixels() count as round-trips. Each
+round-trip sleeps for a configurable latency and can fail with a configurable
+probability. Values are deterministic functions of latitude/longitude, so runs
+are reproducible.
+
+    from benchmarks import fake_ee
+    fake_ee.install(latency=0.2, failure_rate=0.01)
+    from app import create_app  # app now talks to the simulator
+"""
+import math
+import random
+import sys
+import threading
+import time
+import types
+import numpy as np
+
+# ------------------ Simulator Settings ------------------
+_config = {
+    "latency": 0.2,        # seconds per round-trip
+    "jitter": 0.05,        # +/- uniform jitter (seconds)
+    "failure_rate": 0.0,   # probability a round-trip raises a transient error
+    "image_count": 365,    # images matched by any collection filter
+    "lst_offset": 0.0,     # °C added to every LST value
+    "missing_rate": 0.0,   # fraction of locations with no data (masked)
+    "pixel_cost": 0.1,     # extra seconds per million pixels reduced in one request
+}
+_stats = {"round_trips": 0, "failures": 0, "pixels": 0}
+_lock = threading.Lock()
+_work = threading.local()  # pixels reduced by the request being evaluated on this thread
+_rng = random.Random(0)
+
+
+def configure(**settings):
+    unknown = set(settings) - set(_config)
+    if unknown:
+        raise KeyError(f"Unknown simulator settings: {sorted(unknown)}")
+    _config.update(settings)
+    if "seed" in settings:
+        _rng.seed(settings["seed"])
+
+
+def stats():
+    with _lock:
+        return dict(_stats)
+
+
+def reset_stats():
+    with _lock:
+        _stats.update(round_trips=0, failures=0, pixels=0)
+
+
+class EEException(Exception):
+    pass
+
+
+ee_exception = types.SimpleNamespace(EEException=EEException)
+
+
+def _round_trip(pixels=0):
+    """Simulate network latency, server compute and transient failures of one Earth Engine request."""
+    with _lock:
+        _stats["round_trips"] += 1
+        _stats["pixels"] += pixels
+        fail = _rng.random() < _config["failure_rate"]
+        delay = max(0.0, _config["latency"] + _rng.uniform(-_config["jitter"], _config["jitter"]))
+        delay += pixels / 1e6 * _config["pixel_cost"]
+    time.sleep(delay)
+    if fail:
+        with _lock:
+            _stats["failures"] += 1
+        raise EEException("Too Many Requests: request rate or concurrency quota exceeded (simulated)")
+
+
+# ------------------ Synthetic Fields ------------------
+def _noise(lat, lon, salt):
+    """Deterministic pseudo-random value in [0, 1) for a location."""
+    h = math.sin(lat * 12.9898 + lon * 78.233 + salt * 37.719) * 43758.5453
+    return h - math.floor(h)
+
+
+def _missing(lat, lon):
+    return _noise(lat, lon, 99) < _config["missing_rate"]
+
+
+def _lst_celsius(lat, lon):
+    # Hotter inland/north-west, cooler south and in the hills
+    return 30.0 + 0.25 * (lat - 20) + 6.0 * _noise(lat, lon, 1) + _config["lst_offset"]
+
+
+def _source_field(collection_id):
+    if collection_id.startswith("MODIS/061/MOD11"):
+        return lambda lat, lon: None if _missing(lat, lon) else (_lst_celsius(lat, lon) + 273.15) / 0.02
+    if collection_id.startswith("MODIS/061/MOD13"):
+        return lambda lat, lon: 1500 + 4000 * _noise(lat, lon, 2)
+    if collection_id.startswith("COPERNICUS/S2"):
+        # NDVI-like value returned directly by normalizedDifference
+        return lambda lat, lon: -0.1 + 0.8 * _noise(lat, lon, 3)
+    if collection_id.startswith("ESA/WorldCover"):
+        return lambda lat, lon: [10, 30, 40, 50, 50, 60, 80][int(_noise(lat, lon, 4) * 7)]
+    return lambda lat, lon: _noise(lat, lon, 5)
+
+
+def _count_pixels(geometry, scale):
+    """Pixels a reduction over `geometry` at `scale` metres touches."""
+    pixels = 1 if geometry.radius_m <= 0 else math.pi * geometry.radius_m ** 2 / float(scale or 1000) ** 2
+    _work.pixels = getattr(_work, "pixels", 0) + pixels
+
+
+def _evaluate(value):
+    if isinstance(value, ComputedObject):
+        return value._evaluate()
+    if isinstance(value, dict):
+        return {k: _evaluate(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_evaluate(v) for v in value]
+    return value
+
+
+# ------------------ Computed Objects ------------------
+class ComputedObject:
+    def _evaluate(self):
+        raise NotImplementedError
+
+    def getInfo(self):
+        _work.pixels = 0
+        value = self._evaluate()
+        _round_trip(_work.pixels)
+        return value
+
+
+class _Value(ComputedObject):
+    def __init__(self, thunk):
+        self._thunk = thunk
+
+    def _evaluate(self):
+        return self._thunk()
+
+    def gt(self, other):
+        return _Value(lambda: _evaluate(self) > _evaluate(other))
+
+    def get(self, key):
+        return _Value(lambda: (_evaluate(self) or {}).get(_evaluate(key)))
+
+
+class Number(_Value):
+    def __init__(self, value):
+        super().__init__(lambda: _evaluate(value))
+
+
+class String(_Value):
+    def __init__(self, value):
+        super().__init__(lambda: _evaluate(value))
+
+
+class Dictionary(_Value):
+    def __init__(self, value=None):
+        value = {} if value is None else value
+        super().__init__(lambda: _evaluate(value))
+
+
+class List(_Value):
+    def __init__(self, value):
+        super().__init__(lambda: _evaluate(value))
+
+
+class Algorithms:
+    @staticmethod
+    def If(condition, true_case, false_case):
+        def choose():
+            case = true_case if _evaluate(condition) else false_case
+            return case if isinstance(case, Image) else _evaluate(case)
+        return _Value(choose)
+
+
+class Filter:
+    @staticmethod
+    def lt(name, value):
+        return ("lt", name, value)
+
+    @staticmethod
+    def gt(name, value):
+        return ("gt", name, value)
+
+
+class Reducer:
+    def __init__(self, name="mean", outputs=None):
+        self.name = name
+        self.outputs = outputs
+
+    @staticmethod
+    def mean():
+        return Reducer("mean")
+
+    def setOutputs(self, outputs):
+        return Reducer(self.name, list(outputs))
+
+
+# ------------------ Geometry / Features ------------------
+class Geometry(ComputedObject):
+    def __init__(self, lat, lon, radius_m=0.0, kind="Point"):
+        self.lat, self.lon, self.radius_m, self.kind = lat, lon, radius_m, kind
+
+    @staticmethod
+    def Point(coords, lat=None):
+        if lat is not None:  # Point(lon, lat)
+            return Geometry(lat, coords)
+        return Geometry(coords[1], coords[0])
+
+    @staticmethod
+    def Rectangle(coords):
+        min_lon, min_lat, max_lon, max_lat = coords
+        return Geometry((min_lat + max_lat) / 2, (min_lon + max_lon) / 2, kind="Polygon")
+
+    def buffer(self, distance):
+        return Geometry(self.lat, self.lon, self.radius_m + distance, "Polygon")
+
+    def bounds(self):
+        return Geometry(self.lat, self.lon, self.radius_m, "Polygon")
+
+    def _evaluate(self):
+        if self.kind == "Point":
+            return {"type": "Point", "coordinates": [self.lon, self.lat]}
+        d = self.radius_m / 111320.0
+        ring = [[self.lon - d, self.lat - d], [self.lon + d, self.lat - d], [self.lon + d, self.lat + d],
+                [self.lon - d, self.lat + d], [self.lon - d, self.lat - d]]
+        return {"type": "Polygon", "coordinates": [ring]}
+
+
+class Feature(ComputedObject):
+    def __init__(self, geometry, properties=None):
+        self.geometry_ = geometry
+        self.properties = dict(properties or {})
+
+    def buffer(self, distance):
+        return Feature(self.geometry_.buffer(distance), self.properties)
+
+    def _evaluate(self):
+        return {"type": "Feature", "geometry": _evaluate(self.geometry_), "properties": _evaluate(self.properties)}
+
+
+class FeatureCollection(ComputedObject):
+    def __init__(self, features, _select=None, _retain=True):
+        self._features = features
+        self._select = _select
+        self._retain = _retain
+
+    def _resolved(self):
+        return self._features() if callable(self._features) else self._features
+
+    def geometry(self):
+        features = self._resolved()
+        lat = sum(f.geometry_.lat for f in features) / max(len(features), 1)
+        lon = sum(f.geometry_.lon for f in features) / max(len(features), 1)
+        return Geometry(lat, lon, kind="Polygon")
+
+    def select(self, propertySelectors, newProperties=None, retainGeometry=True):
+        return FeatureCollection(self._features, list(propertySelectors), retainGeometry)
+
+    def map(self, fn):
+        return FeatureCollection(lambda: [fn(f) for f in self._resolved()], self._select, self._retain)
+
+    def _evaluate(self):
+        features = []
+        for feature in self._resolved():
+            info = feature._evaluate()
+            if self._select is not None:
+                info["properties"] = {k: v for k, v in info["properties"].items() if k in self._select}
+            if not self._retain:
+                info["geometry"] = None
+            features.append(info)
+        return {"type": "FeatureCollection", "features": features}
+
+
+# ------------------ Images ------------------
+class Image(ComputedObject):
+    def __init__(self, source=None, field=None, band="constant"):
+        if isinstance(source, Image):
+            self.field, self.band, self._lazy = source.field, source.band, source._lazy
+        elif isinstance(source, _Value):  # ee.Image(ee.Algorithms.If(...))
+            thunk = source._thunk
+            self.field = lambda lat, lon: thunk().field(lat, lon)
+            self.band = None
+            self._lazy = thunk
+        else:
+            self.field = field or (lambda lat, lon: source)
+            self.band = band
+            self._lazy = None
+
+    def _band(self):
+        return self._lazy().band if self._lazy is not None else self.band
+
+    def _derive(self, field, band=None):
+        return Image(field=field, band=band or self._band())
+
+    def _map(self, fn):
+        return self._derive(lambda lat, lon: None if (v := self.field(lat, lon)) is None else fn(v))
+
+    @staticmethod
+    def constant(value):
+        return Image(value, band="constant")
+
+    def rename(self, name):
+        return self._derive(self.field, name if isinstance(name, str) else name[0])
+
+    def select(self, band):
+        return self._derive(self.field, band if isinstance(band, str) else band[0])
+
+    def updateMask(self, mask):
+        if not isinstance(mask, Image):
+            return self._derive(self.field if mask else (lambda lat, lon: None))
+        return self._derive(lambda lat, lon: self.field(lat, lon) if mask.field(lat, lon) else None)
+
+    def unmask(self, value=0):
+        if getattr(self, "_stack", None):  # applies to every band, like Earth Engine
+            stacked = Image(self)
+            stacked._stack = [band.unmask(value) for band in self._stack]
+            return stacked
+        return self._derive(lambda lat, lon: value if (v := self.field(lat, lon)) is None else v)
+
+    def gt(self, threshold):
+        # Regional means of a thresholded image are fractions; smooth it into [0, 1]
+        return self._map(lambda v: 1.0 / (1.0 + math.exp(-(v - threshold) / (abs(threshold) * 0.25 + 0.1))))
+
+    def multiply(self, k):
+        return self._map(lambda v: v * k)
+
+    def subtract(self, k):
+        return self._map(lambda v: v - k)
+
+    def toFloat(self):
+        return self
+
+    def clip(self, geometry):
+        return self
+
+    def remap(self, from_values, to_values):
+        table = dict(zip(from_values, to_values))
+        return self._map(lambda v: table.get(v, 0))
+
+    def addBands(self, other):
+        stacked = Image(self)
+        stacked._stack = self._bands() + other._bands()
+        return stacked
+
+    def _bands(self):
+        return getattr(self, "_stack", None) or [self]
+
+    def normalizedDifference(self, bands):
+        return self._derive(self.field, "nd")
+
+    def reduceResolution(self, reducer=None, maxPixels=None, **kwargs):
+        return self
+
+    def reproject(self, crs=None, crsTransform=None, scale=None, **kwargs):
+        return self
+
+    def visualize(self, **kwargs):
+        return self._derive(self.field, "vis")
+
+    def reduceRegion(self, reducer=None, geometry=None, scale=None, maxPixels=None, **kwargs):
+        def reduced():
+            _count_pixels(geometry, scale)
+            return {self._band(): self.field(geometry.lat, geometry.lon)}
+
+        return Dictionary(_Value(reduced))
+
+    def reduceRegions(self, collection=None, reducer=None, scale=None, tileScale=None, **kwargs):
+        name = (reducer.outputs or [reducer.name])[0] if reducer else "mean"
+
+        def reduced():
+            out = []
+            for feature in collection._resolved():
+                _count_pixels(feature.geometry_, scale)
+                props = dict(feature.properties)
+                props[name] = self.field(feature.geometry_.lat, feature.geometry_.lon)
+                out.append(Feature(feature.geometry_, props))
+            return out
+
+        return FeatureCollection(reduced)
+
+    def _evaluate(self):
+        return {"type": "Image", "bands": [{"id": self._band()}]}
+
+
+class ImageCollection(ComputedObject):
+    def __init__(self, collection_id, count=None):
+        self.collection_id = collection_id
+        self._count = count
+
+    def _same(self, *args, **kwargs):
+        return ImageCollection(self.collection_id, self._count)
+
+    filterDate = filterBounds = filter = _same
+
+    def select(self, bands):
+        collection = ImageCollection(self.collection_id, self._count)
+        collection._band = bands if isinstance(bands, str) else bands[0]
+        return collection
+
+    def size(self):
+        return Number(_Value(lambda: _config["image_count"] if self._count is None else self._count))
+
+    def _composite(self):
+        count = _config["image_count"] if self._count is None else self._count
+        if count == 0:
+            return Image(field=lambda lat, lon: None, band=getattr(self, "_band", "constant"))
+        return Image(field=_source_field(self.collection_id), band=getattr(self, "_band", "constant"))
+
+    mean = median = first = _composite
+
+    def _evaluate(self):
+        return {"type": "ImageCollection", "id": self.collection_id}
+
+
+# ------------------ ee.data ------------------
+def _get_map_id(params):
+    _round_trip()
+    return {"mapid": "fake-map-id", "token": "fake-token"}
+
+
+def _compute_pixels(params):
+    """Structured array with one float32 field per band (addBands stacks are fetched together)."""
+    grid = params["grid"]
+    width, height = grid["dimensions"]["width"], grid["dimensions"]["height"]
+    bands = params["expression"]._bands()
+    _round_trip(width * height * len(bands))
+    t = grid["affineTransform"]
+    lons = t["translateX"] + (np.arange(width) + 0.5) * t["scaleX"]
+    lats = t["translateY"] + (np.arange(height) + 0.5) * t["scaleY"]
+    out = np.zeros((height, width), dtype=[(band._band(), np.float32) for band in bands])
+    for band in bands:
+        out[band._band()] = np.array([[band.field(lat, lon) for lon in lons] for lat in lats], dtype=np.float64)
+    return out
+
+
+data = types.SimpleNamespace(getMapId=_get_map_id, computePixels=_compute_pixels)
+
+
+# ------------------ Session ------------------
+def Initialize(credentials=None, project=None, **kwargs):
+    return None
+
+
+def Authenticate(**kwargs):
+    return None
+
+
+def ServiceAccountCredentials(account, key_file):
+    return (account, key_file)
+
+
+def install(**settings):
+    """Register this module as `ee` (before the app is imported) and apply settings."""
+    configure(**settings)
+    sys.modules["ee"] = sys.modules[__name__]
+    return sys.modules[__name__]
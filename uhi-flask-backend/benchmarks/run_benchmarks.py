@@ -0,0 +1,253 @@
+"""
+Offline latency benchmarks for the Flask API against the simulated Earth Engine backend.
+
+Usage (from uhi-flask-backend/):
+    python -m benchmarks.run_benchmarks                   # run and compare with baseline.json
+    python -m benchmarks.run_benchmarks --update-baseline # record a new baseline
+    python -m benchmarks.run_benchmarks --latency 0.3 --failure-rate 0.02 --only predict_cold
+
+Exits with status 1 when a workload regresses past the baseline tolerance.
+"""
+import argparse
+import json
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BASELINE_PATH = os.path.join(BENCH_DIR, "baseline.json")
+DEFAULT_TOLERANCE = 0.25  # relative slack before a metric counts as a regression
+ABSOLUTE_SLACK = {"p50_ms": 5.0, "p95_ms": 5.0, "p99_ms": 5.0, "peak_memory_mb": 1.0}  # timer/GC noise
+
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+from benchmarks import fake_ee  # noqa: E402
+
+
+# -----------------------------
+# Environment
+# -----------------------------
+def isolated_environment():
+    """Point every on-disk store at a scratch directory and disable background work."""
+    scratch = tempfile.mkdtemp(prefix="uhi-bench-")
+    os.environ.update({
+        "UHI_CACHE_DIR": os.path.join(scratch, "cache"),
+        "UHI_RASTER_DIR": os.path.join(scratch, "rasters"),
+        "UHI_TILE_CACHE_DIR": os.path.join(scratch, "tiles"),
+        "UHI_SERVING_MODE": "live",
+        "UHI_HEATMAP_SNAPSHOT_INTERVAL": "0",
+        "UHI_EE_WARMUP": "0",
+        "UHI_EE_RATE_LIMIT": "0",
+    })
+    return scratch
+
+
+# -----------------------------
+# Workloads
+# -----------------------------
+def _predict_requests(cities, precision="auto"):
+    return [("GET", f"/api/predict?lat={c['lat']}&lon={c['lon']}&precision={precision}", None) for c in cities]
+
+
+def _batch_requests(cities, size=50):
+    points = [{"lat": c["lat"], "lon": c["lon"]} for c in cities]
+    while len(points) < size:
+        points += points
+    return [("POST", "/api/predict/batch", {"points": points[:size]})]
+
+
+WORKLOADS = {
+    # name: (request builder, cache mode, default request count)
+    # "cold" clears the result cache before every request and runs one request at a time,
+    # "warm" primes the cache first, "burst" starts empty and sends concurrent requests.
+    "predict_cold": (_predict_requests, "cold", 40),
+    "predict_cold_high": (lambda cities: _predict_requests(cities, "high"), "cold", 40),
+    "predict_warm": (_predict_requests, "warm", 200),
+    "predict_burst": (lambda cities: _predict_requests(cities[:2]), "burst", 40),
+    "heatmap_cold": (lambda cities: [("GET", "/api/heatmap", None)], "cold", 10),
+    "batch_cold": (_batch_requests, "cold", 10),
+}
+
+
+def run_workload(app, name, requests_total, concurrency):
+    from app.cache import result_cache
+    from app.cities import CITIES
+
+    build, mode, _ = WORKLOADS[name]
+    templates = build(CITIES)
+    plan = [templates[i % len(templates)] for i in range(requests_total)]
+    local = threading.local()
+
+    def send(request):
+        method, url, body = request
+        if not hasattr(local, "client"):
+            local.client = app.test_client()
+        if mode == "cold":
+            result_cache.clear()
+        start = time.perf_counter()
+        response = local.client.open(url, method=method, json=body)
+        elapsed = time.perf_counter() - start
+        return elapsed, response.status_code
+
+    # One untimed request absorbs lazy imports and model loading
+    client = app.test_client()
+    method, url, body = templates[0]
+    client.open(url, method=method, json=body)
+    if mode == "warm":
+        # Prime the cache so the warm workload measures cache hits only
+        for method, url, body in templates:
+            client.open(url, method=method, json=body)
+    else:
+        result_cache.clear()
+
+    fake_ee.reset_stats()
+    tracemalloc.start()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(send, plan))
+    wall = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    ee_stats = fake_ee.stats()
+
+    latencies = sorted(r[0] for r in results)
+    errors = sum(1 for r in results if r[1] >= 500)
+    return {
+        "requests": len(results),
+        "p50_ms": round(_percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(_percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(_percentile(latencies, 99) * 1000, 2),
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 2),
+        "rps": round(len(results) / wall, 2),
+        "ee_round_trips_per_request": round(ee_stats["round_trips"] / len(results), 3),
+        "ee_failures": ee_stats["failures"],
+        "error_rate": round(errors / len(results), 4),
+        "peak_memory_mb": round(peak / (1024 * 1024), 2),
+    }
+
+
+def _percentile(sorted_values, pct):
+    if len(sorted_values) == 1:
+        return sorted_values[0]
+    rank = (len(sorted_values) - 1) * pct / 100
+    lower = int(rank)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (rank - lower)
+
+
+# -----------------------------
+# Baseline Comparison
+# -----------------------------
+def compare(name, result, baseline, tolerance):
+    """Return human-readable regressions of `result` against one baseline workload."""
+    problems = []
+    upper = 1 + tolerance
+    for metric, slack in ABSOLUTE_SLACK.items():
+        if metric in baseline and result[metric] > baseline[metric] * upper + slack:
+            problems.append(f"{name}: {metric} {result[metric]} > {baseline[metric]} (+{tolerance:.0%})")
+    if "rps" in baseline and result["rps"] < baseline["rps"] * (1 - tolerance):
+        problems.append(f"{name}: rps {result['rps']} < {baseline['rps']} (-{tolerance:.0%})")
+    # Round-trip counts are deterministic without failures; any increase is a regression
+    if "ee_round_trips_per_request" in baseline and \
+            result["ee_round_trips_per_request"] > baseline["ee_round_trips_per_request"] + 0.01:
+        problems.append(f"{name}: EE round-trips/request {result['ee_round_trips_per_request']} "
+                        f"> {baseline['ee_round_trips_per_request']}")
+    if result["error_rate"] > baseline.get("error_rate", 0.0):
+        problems.append(f"{name}: error rate {result['error_rate']} > {baseline.get('error_rate', 0.0)}")
+    return problems
+
+
+def print_table(results):
+    columns = ["p50_ms", "p95_ms", "p99_ms", "rps", "ee_round_trips_per_request", "error_rate", "peak_memory_mb"]
+    headers = ["workload", "p50 ms", "p95 ms", "p99 ms", "req/s", "EE trips/req", "errors", "peak MB"]
+    rows = [[name] + [str(r[c]) for c in columns] for name, r in results.items()]
+    widths = [max(len(row[i]) for row in rows + [headers]) for i in range(len(headers))]
+    for row in [headers] + rows:
+        print("  ".join(cell.ljust(width) for cell, width in zip(row, widths)))
+
+
+# -----------------------------
+# Main
+# -----------------------------
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the UHI API against a simulated Earth Engine.")
+    parser.add_argument("--only", nargs="+", choices=sorted(WORKLOADS), help="workloads to run (default: all)")
+    parser.add_argument("--requests", type=int, help="requests per workload (default: per-workload)")
+    parser.add_argument("--concurrency", type=int, default=4, help="concurrent clients (warm workloads)")
+    parser.add_argument("--latency", type=float, default=0.1, help="simulated EE round-trip seconds")
+    parser.add_argument("--jitter", type=float, default=0.02, help="uniform latency jitter seconds")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="probability a round-trip fails")
+    parser.add_argument("--pixel-cost", type=float, default=0.1, help="simulated seconds per million pixels")
+    parser.add_argument("--missing-rate", type=float, default=0.0, help="fraction of locations without data")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--tolerance", type=float, help="override the baseline's relative tolerance")
+    parser.add_argument("--update-baseline", action="store_true", help="write results as the new baseline")
+    args = parser.parse_args()
+
+    settings = {"latency": args.latency, "jitter": args.jitter, "failure_rate": args.failure_rate,
+                "missing_rate": args.missing_rate, "pixel_cost": args.pixel_cost, "concurrency": args.concurrency}
+    fake_ee.install(latency=args.latency, jitter=args.jitter,
+                    failure_rate=args.failure_rate, missing_rate=args.missing_rate, pixel_cost=args.pixel_cost)
+    isolated_environment()
+
+    from app import create_app
+    app = create_app()
+    logging.getLogger().setLevel(logging.WARNING)  # app.utils configures INFO on import
+
+    results = {}
+    for name in args.only or WORKLOADS:
+        _, mode, default_count = WORKLOADS[name]
+        count = args.requests or default_count
+        concurrency = 1 if mode == "cold" else args.concurrency
+        print(f"⏱️ {name}: {count} requests, concurrency {concurrency}")
+        results[name] = run_workload(app, name, count, concurrency)
+    print()
+    print_table(results)
+
+    if args.update_baseline:
+        previous = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                previous = json.load(f)
+        tolerance = args.tolerance if args.tolerance is not None else previous.get("tolerance", DEFAULT_TOLERANCE)
+        with open(args.baseline, "w") as f:
+            json.dump({
+                "settings": settings,
+                "tolerance": tolerance,
+                "workloads": {**previous.get("workloads", {}), **results},
+            }, f, indent=2)
+            f.write("\n")
+        print(f"\n✅ Baseline written to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print("\n⚠️ No baseline recorded; run with --update-baseline")
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline.get("settings") != settings:
+        print(f"\n⚠️ Simulator settings differ from the baseline ({baseline.get('settings')}); "
+              "comparison may not be meaningful")
+    tolerance = args.tolerance if args.tolerance is not None else baseline.get("tolerance", DEFAULT_TOLERANCE)
+
+    problems = []
+    for name, result in results.items():
+        if name in baseline.get("workloads", {}):
+            problems += compare(name, result, baseline["workloads"][name], tolerance)
+    if problems:
+        print("\n❌ Regressions:")
+        for problem in problems:
+            print(f"  - {problem}")
+        return 1
+    print("\n✅ No regressions against baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,127 @@
+import argparse
+import json
+import os
+from datetime import datetime
+import ee
+import numpy as np
+from app.composites import (
+    LST_BAND, LST_END, LST_START, green_space_image, green_space_window, lst_mean_image, ndvi_green_image
+)
+from app.ee_executor import ee_executor
+from app.ee_session import ensure_initialized
+from app.geo import fetch_pixels
+from app.raster_store import INDIA_BBOX, LST_LAYER, NDVI_GREEN_LAYER, RASTER_DIR, S2_GREEN_LAYER
+
+# -----------------------------
+# Settings
+# -----------------------------
+RESOLUTIONS = {"1km": 0.01, "500m": 0.005}  # degrees per pixel
+TILE_SIZE = 512
+WEIGHTED_LAYERS = {S2_GREEN_LAYER}  # layers exported with a "weight" band
+
+
+# -----------------------------
+# Layer Images (band "value", plus "weight" for masked statistics)
+# -----------------------------
+def layer_image(name, region):
+    """
+    (image, window) for one layer. Layers whose live statistic averages over unmasked pixels
+    only also get a "weight" band, the fraction of each grid cell those pixels cover, which
+    raster_store uses to weight cell means in a buffer average.
+    """
+    if name == LST_LAYER:
+        image = lst_mean_image(region, LST_START, LST_END).select(LST_BAND).multiply(0.02).subtract(273.15)
+        window = (LST_START, LST_END)
+    elif name == S2_GREEN_LAYER:
+        window = green_space_window()
+        # Like the live reduction, average over vegetation-class 10 m pixels only
+        green = green_space_image(region, *window)
+        return green.rename("value").toFloat().addBands(green.mask().unmask(0).rename("weight").toFloat()), window
+    elif name == NDVI_GREEN_LAYER:
+        window = (LST_START, LST_END)
+        image = ndvi_green_image(LST_START, LST_END)
+    else:
+        raise ValueError(f"Unknown layer {name}")
+    return image.rename("value").toFloat(), window
+
+
+def _fetch_tile(image, res, bands, row0, col0, height, width):
+    min_lon, _, _, max_lat = INDIA_BBOX
+    return fetch_pixels(image, res, min_lon + col0 * res, max_lat - row0 * res, width, height, bands)
+
+
+# -----------------------------
+# Export
+# -----------------------------
+def export_layer(name, res, directory=RASTER_DIR, tile_size=TILE_SIZE):
+    """Download one layer tile by tile into a memory-mappable .npy with .json metadata."""
+    min_lon, min_lat, max_lon, max_lat = INDIA_BBOX
+    height = int(round((max_lat - min_lat) / res))
+    width = int(round((max_lon - min_lon) / res))
+    region = ee.Geometry.Rectangle([min_lon, min_lat, max_lon, max_lat])
+    image, window = layer_image(name, region)
+    bands = ("value", "weight") if name in WEIGHTED_LAYERS else ("value",)
+
+    # Aggregate fine pixels (e.g. 10 m Sentinel-2) to the grid as a mean over unmasked pixels
+    image = image.reduceResolution(reducer=ee.Reducer.mean(), maxPixels=65535) \
+        .reproject(crs="EPSG:4326", crsTransform=[res, 0, min_lon, 0, -res, max_lat])
+
+    os.makedirs(directory, exist_ok=True)
+    paths = {band: os.path.join(directory, f"{name}.npy" if band == "value" else f"{name}.{band}.npy")
+             for band in bands}
+    grids = {band: np.lib.format.open_memmap(path + ".partial", mode="w+", dtype=np.float32, shape=(height, width))
+             for band, path in paths.items()}
+
+    tiles = [(r, c, min(tile_size, height - r), min(tile_size, width - c))
+             for r in range(0, height, tile_size) for c in range(0, width, tile_size)]
+    print(f"🛰️ Exporting {name}: {height}x{width} px in {len(tiles)} tiles")
+
+    results = ee_executor.map(lambda t: _fetch_tile(image, res, bands, *t), tiles)
+    failed = 0
+    for (r, c, h, w), result in zip(tiles, results):
+        if isinstance(result, Exception):
+            print(f"⚠️ Tile ({r},{c}) failed: {result}")
+            failed += 1
+        for band, grid in grids.items():
+            grid[r:r + h, c:c + w] = np.nan if isinstance(result, Exception) else result[band]
+    for band, grid in grids.items():
+        grid.flush()
+        os.replace(paths[band] + ".partial", paths[band])  # readers never see a half-written grid
+    del grids
+
+    meta = {
+        "layer": name,
+        "min_lon": min_lon,
+        "max_lat": max_lat,
+        "res_deg": res,
+        "width": width,
+        "height": height,
+        "window": list(window),
+        "weights": os.path.basename(paths["weight"]) if "weight" in paths else None,
+        "failed_tiles": failed,
+        "created_at": datetime.utcnow().isoformat(timespec="seconds"),
+    }
+    # Written last and atomically: running servers reload the layer when this file changes
+    meta_path = os.path.join(directory, f"{name}.json")
+    with open(meta_path + ".partial", "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+    os.replace(meta_path + ".partial", meta_path)
+    print(f"✅ {name} saved to {paths['value']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export LST and green-fraction grids for offline serving.")
+    parser.add_argument("--resolution", choices=sorted(RESOLUTIONS), default="1km")
+    parser.add_argument("--layers", nargs="+", default=[LST_LAYER, S2_GREEN_LAYER, NDVI_GREEN_LAYER])
+    parser.add_argument("--out", default=RASTER_DIR)
+    parser.add_argument("--tile-size", type=int, default=TILE_SIZE,
+                        help="pixels per computePixels request side; lower it if Earth Engine times out")
+    args = parser.parse_args()
+
+    ensure_initialized()
+    for name in args.layers:
+        export_layer(name, RESOLUTIONS[args.resolution], args.out, args.tile_size)
+
+
+if __name__ == "__main__":
+    main()
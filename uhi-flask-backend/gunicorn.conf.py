@@ -0,0 +1,39 @@
+"""
+Gunicorn settings for production serving (`gunicorn -c gunicorn.conf.py wsgi:app`).
+
+Earth Engine calls block on network I/O, so each worker process runs several threads.
+Workers share satellite results through the SQLite result cache (WAL mode), so a city
+computed by one worker is served from disk by the others. One worker (elected through a
+file lock) builds the heatmap snapshot; the rest read the copy it shares on disk.
+"""
+import multiprocessing
+import os
+
+bind = os.environ.get("UHI_BIND", "0.0.0.0:5000")
+workers = int(os.environ.get("UHI_WORKERS", multiprocessing.cpu_count() * 2 + 1))
+worker_class = "gthread"
+threads = int(os.environ.get("UHI_THREADS", "8"))
+timeout = int(os.environ.get("UHI_WORKER_TIMEOUT", "180"))  # above the 120 s Earth Engine call deadline
+graceful_timeout = 30
+keepalive = 5
+accesslog = "-"
+
+# Import the app after fork: Earth Engine clients, executor threads and SQLite
+# connections must not be shared between processes.
+preload_app = False
+
+# UHI_EE_RATE_LIMIT / UHI_EE_MAX_CONCURRENCY are budgets for the whole server;
+# split them across workers since every worker has its own limiter and pool.
+for _name, _default in (("UHI_EE_RATE_LIMIT", "20"), ("UHI_EE_MAX_CONCURRENCY", "8")):
+    _total = float(os.environ.get(_name, _default))
+    if _total > 0:
+        _share = _total / workers
+        os.environ[_name] = f"{_share:g}" if _name == "UHI_EE_RATE_LIMIT" else str(max(1, round(_share)))
+
+
+def post_fork(server, worker):
+    # Only relevant if preload_app is switched on: reopen state inherited from the master
+    import sys
+    if "app.cache" in sys.modules:
+        sys.modules["app.cache"].result_cache.after_fork()
+    server.log.info(f"Worker {worker.pid} ready; Earth Engine warms up in the background")
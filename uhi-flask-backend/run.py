@@ -4,5 +4,6 @@ from app import create_app
 app = create_app()
 
 if __name__ == "__main__":
-    # Run on localhost:5000 with debug mode enabled
+    # Development server on localhost:5000 with debug mode enabled
+    # (production: gunicorn -c gunicorn.conf.py wsgi:app)
     app.run(debug=True, host="127.0.0.1", port=5000)
@@ -0,0 +1,10 @@
+import os
+import sys
+import tempfile
+
+# Keep every on-disk store out of app/data while the app modules are imported
+_scratch = tempfile.mkdtemp(prefix="uhi-tests-")
+for name in ("UHI_CACHE_DIR", "UHI_RASTER_DIR", "UHI_TILE_CACHE_DIR", "UHI_GRID_DIR", "UHI_TIMESERIES_DIR"):
+    os.environ.setdefault(name, os.path.join(_scratch, name.lower()))
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
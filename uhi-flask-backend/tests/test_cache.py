@@ -0,0 +1,59 @@
+import sqlite3
+import time
+from app.cache import ResultCache, make_key
+
+
+def row_count(cache):
+    with sqlite3.connect(cache.path) as conn:
+        return conn.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+
+def test_memory_lru_evicts_least_recently_used(tmp_path):
+    cache = ResultCache(str(tmp_path / "results.sqlite3"), max_entries=2, ttls={})
+    cache.set("a", "d", 1)
+    cache.set("b", "d", 2)
+    assert cache.get("a") == (True, 1)  # a is now the most recently used
+    cache.set("c", "d", 3)
+    assert cache.peek("b") is None and cache.peek("a") == 1 and cache.peek("c") == 3
+    assert cache.get("b") == (True, 2)  # still on disk
+    assert cache.stats()["disk_hits"] == 1
+
+
+def test_none_is_never_stored(tmp_path):
+    cache = ResultCache(str(tmp_path / "results.sqlite3"))
+    cache.set("k", "d", None)
+    assert cache.get("k") == (False, None)
+
+
+def test_expired_rows_are_purged_on_write(tmp_path):
+    cache = ResultCache(str(tmp_path / "results.sqlite3"), ttls={"short": 0.05, "forever": None}, prune_every=3)
+    cache.set("old1", "short", 1)  # first write of the process prunes (nothing yet)
+    cache.set("old2", "short", 2)
+    time.sleep(0.1)
+    assert cache.get("old1") == (False, None)
+    cache.set("keep", "forever", 3)
+    cache.set("new", "forever", 4)  # third write since the last prune
+    assert row_count(cache) == 2
+
+
+def test_table_is_capped_to_max_rows(tmp_path):
+    cache = ResultCache(str(tmp_path / "results.sqlite3"), ttls={}, max_rows=3, prune_every=1000)
+    for index in range(6):
+        cache.set(make_key("d", index, 0), "d", index)
+        time.sleep(0.001)
+    assert cache.prune() == 3
+    assert row_count(cache) == 3
+    reopened = ResultCache(cache.path, ttls={})
+    assert reopened.get(make_key("d", 0, 0)) == (False, None)  # oldest writes went first
+    assert reopened.get(make_key("d", 5, 0)) == (True, 5)
+    cache.clear()
+    assert cache.get(make_key("d", 5, 0)) == (False, None)
+
+
+def test_missing_results_are_cached_until_their_ttl(tmp_path):
+    cache = ResultCache(str(tmp_path / "results.sqlite3"), ttls={"d": None}, missing_ttl=0.05)
+    cache.set_missing("k", "d")
+    assert cache.get("k") == (True, None)
+    assert ResultCache(cache.path).get("k") == (True, None)  # shared through disk as well
+    time.sleep(0.1)
+    assert cache.get("k") == (False, None)
@@ -0,0 +1,59 @@
+import importlib
+from flask import Flask
+from app.cities import CityRegistry
+
+CITIES = [
+    {"name": "Bengaluru", "lat": 12.9716, "lon": 77.5946, "aliases": ["Bangalore"]},
+    {"name": "Navi Mumbai", "lat": 19.0330, "lon": 73.0297},
+    {"name": "Mumbai", "lat": 19.0760, "lon": 72.8777},
+    {"name": "Delhi", "lat": 28.7041, "lon": 77.1025},
+]
+
+
+def test_nearest_snaps_within_the_radius_only():
+    registry = CityRegistry(CITIES)
+    assert registry.nearest(19.0700, 72.8800)["key"] == "mumbai"
+    assert registry.nearest(19.0300, 73.0200)["key"] == "navi-mumbai"  # closer than Mumbai, ~16 km away
+    assert registry.nearest(12.9880, 77.5946)["key"] == "bengaluru"  # ~1.8 km north, inside the 2 km default
+    assert registry.nearest(13.0000, 77.5946) is None  # ~3.2 km from Bengaluru, outside every radius
+    assert registry.nearest(13.0000, 77.5946, max_km=5)["key"] == "bengaluru"
+
+
+def test_within_bbox_includes_edges_and_spans_cells():
+    registry = CityRegistry(CITIES)
+    keys = lambda cities: sorted(c["key"] for c in cities)
+    assert keys(registry.within_bbox(18.0, 72.0, 20.0, 74.0)) == ["mumbai", "navi-mumbai"]
+    assert keys(registry.within_bbox(19.076, 72.8777, 28.7041, 77.1025)) == ["delhi", "mumbai"]
+    assert keys(registry.within_bbox(6.0, 68.0, 38.0, 98.0)) == ["bengaluru", "delhi", "mumbai", "navi-mumbai"]
+    assert registry.within_bbox(20.0, 80.0, 21.0, 81.0) == []
+
+
+def test_lookup_by_key_name_or_alias():
+    registry = CityRegistry(CITIES)
+    assert registry.get("bangalore")["key"] == "bengaluru"
+    assert registry.get("Bangalore") is registry.get("Bengaluru") is registry.get("bengaluru")
+    assert registry.get("navi mumbai")["name"] == "Navi Mumbai"
+    assert registry.get("Chennai") is None and registry.get("") is None
+
+
+def test_predict_snaps_to_the_nearest_city(monkeypatch):
+    routes = importlib.import_module("app.routes")  # `app.routes` the attribute is the blueprint
+    app = Flask(__name__)
+    app.register_blueprint(routes.routes, url_prefix="/api")
+    client = app.test_client()
+    requested = []
+
+    def fake_metrics(city_data, precision, budget):
+        requested.append(city_data)
+        return {"avg_temp": 30.0}
+
+    monkeypatch.setattr(routes, "registry", CityRegistry(CITIES))
+    monkeypatch.setattr(routes, "get_uhi_metrics", fake_metrics)
+
+    body = client.get("/api/predict?lat=19.0700&lon=72.8800").get_json()
+    assert body["city_key"] == "mumbai" and body["city"] == "Mumbai"
+    assert (requested[-1]["lat"], requested[-1]["lon"]) == (19.076, 72.8777)  # computed at the city centre
+
+    body = client.get("/api/predict?lat=20.5&lon=75.5").get_json()
+    assert "city_key" not in body
+    assert requested[-1] == {"lat": 20.5, "lon": 75.5}
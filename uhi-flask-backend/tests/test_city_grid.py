@@ -0,0 +1,75 @@
+import numpy as np
+from app import geo
+from app.city_grid import analyze_grid, box_mean
+from app.geo import NODATA, fetch_pixels
+
+
+def brute_box_mean(values, radius):
+    height, width = values.shape
+    out = np.full(values.shape, np.nan)
+    for r in range(height):
+        for c in range(width):
+            window = values[max(r - radius, 0):r + radius + 1, max(c - radius, 0):c + radius + 1]
+            if (~np.isnan(window)).any():
+                out[r, c] = np.nanmean(window)
+    return out
+
+
+def test_box_mean_matches_windows_clipped_at_the_edges():
+    values = np.arange(30, dtype=np.float64).reshape(5, 6)
+    values[1, 1] = values[4, 5] = np.nan
+    values[0, :3] = np.nan
+    for radius in (0, 1, 2, 7):
+        np.testing.assert_allclose(box_mean(values, radius), brute_box_mean(values, radius))
+    assert box_mean(values, 1)[0, 0] == np.mean([values[1, 0]])  # corner: only one valid neighbour
+    assert np.isnan(box_mean(np.full((3, 3), np.nan), 1)).all()
+
+
+def test_analyze_grid_on_a_synthetic_city():
+    land_cover = np.full((6, 6), 50.0)  # built-up core
+    land_cover[:, :2] = 10.0  # tree cover on the west edge
+    land_cover[5, 5] = np.nan
+    lst = np.full((6, 6), 35.0)
+    lst[:, :2] = 30.0
+    lst[2, 3] = 39.0  # hotspot
+    lst[4, 4] = 37.0  # second, smaller hotspot
+    lst[0, 5] = np.nan
+    grid = {"lst": lst, "ndvi": np.full((6, 6), 0.3), "land_cover": land_cover,
+            "bounds": np.array([77.0, 28.0, 77.006, 28.006]), "res": np.float64(0.001)}
+
+    result = analyze_grid(grid, green_buffer_m=111.32, hotspots=2, include_cells=True)
+    assert result["rural_baseline_lst"] == 30.0
+    assert result["urban_mean_lst"] == round((20 * 35.0 + 39.0 + 37.0) / 22, 2)  # [0, 5] has no LST
+    assert result["cells"] == {"total": 36, "with_lst": 35, "rural": 12, "built_up": 23}
+    assert [(h["rank"], h["uhi_intensity"], h["lat"], h["lon"]) for h in result["hotspots"]] == [
+        (1, 9.0, 28.0035, 77.0035), (2, 7.0, 28.0015, 77.0045)]
+    green = result["grid"]["green_fraction"]
+    assert green[0][0] == 1.0 and green[0][2] == round(2 / 6, 3)  # one-cell buffer, clipped at the edge
+    assert green[4][4] == 0.0 and green[5][4] == 0.0  # NaN land cover is left out of the window
+
+
+class FakeImage:
+    def unmask(self, value):
+        assert value == NODATA
+        return self
+
+
+def test_fetch_pixels_turns_nodata_into_nan(monkeypatch):
+    pixels = np.zeros((2, 2), dtype=[("lst", "<f4"), ("ndvi", "<f4")])
+    pixels["lst"] = [[31.5, NODATA], [32.0, 33.0]]
+    pixels["ndvi"] = [[NODATA, NODATA], [0.4, 0.5]]
+    requests = []
+
+    class Executor:
+        def call(self, fn, request):
+            requests.append(request)
+            return pixels
+
+    monkeypatch.setattr(geo, "ee_executor", Executor())
+    arrays = fetch_pixels(FakeImage(), 0.01, 77.0, 29.0, 2, 2, bands=("lst", "ndvi"))
+
+    np.testing.assert_array_equal(arrays["lst"], [[31.5, np.nan], [32.0, 33.0]])
+    np.testing.assert_array_equal(arrays["ndvi"], np.array([[np.nan, np.nan], [0.4, 0.5]], dtype=np.float32))
+    assert arrays["lst"].dtype == np.float32
+    assert requests[0]["grid"]["affineTransform"]["translateY"] == 29.0
+    assert requests[0]["grid"]["dimensions"] == {"width": 2, "height": 2}
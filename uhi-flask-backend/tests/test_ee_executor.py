@@ -0,0 +1,62 @@
+import time
+import pytest
+from app.ee_executor import CircuitBreaker, CircuitOpenError, EEExecutor
+
+
+def make_executor(breaker, max_retries=2):
+    return EEExecutor(max_workers=2, rate=0, max_retries=max_retries, deadline=5,
+                      base_delay=0.001, max_delay=0.001, breaker=breaker)
+
+
+def failing(message="503 Service Unavailable"):
+    def fn():
+        raise RuntimeError(message)
+    return fn
+
+
+def test_breaker_opens_after_consecutive_failures():
+    breaker = CircuitBreaker(threshold=2, cooldown=60)
+    executor = make_executor(breaker, max_retries=0)
+    for _ in range(2):
+        with pytest.raises(RuntimeError):
+            executor.call(failing())
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        executor.call(lambda: "ok")
+
+
+def test_non_transient_errors_do_not_open_breaker():
+    breaker = CircuitBreaker(threshold=1, cooldown=60)
+    executor = make_executor(breaker, max_retries=0)
+    with pytest.raises(RuntimeError):
+        executor.call(failing("Image.select: band not found"))
+    assert breaker.state == "closed"
+
+
+def test_half_open_trial_with_transient_retries_reopens_then_recovers():
+    breaker = CircuitBreaker(threshold=2, cooldown=0.2)
+    executor = make_executor(breaker, max_retries=2)
+    for _ in range(2):
+        with pytest.raises(RuntimeError):
+            executor.call(failing())
+    assert breaker.state == "open"
+
+    # The trial call retries transient errors and fails; the circuit re-opens instead of sticking half-open
+    time.sleep(0.25)
+    with pytest.raises(RuntimeError, match="503"):
+        executor.call(failing())
+    assert breaker.state == "open"
+
+    time.sleep(0.25)
+    assert executor.call(lambda: "ok") == "ok"
+    assert breaker.state == "closed"
+
+
+def test_half_open_admits_a_single_trial():
+    breaker = CircuitBreaker(threshold=1, cooldown=0)
+    breaker.record_failure()
+    assert breaker.allow()
+    assert breaker.state == "half_open"
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed"
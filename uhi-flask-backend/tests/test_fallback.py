@@ -0,0 +1,70 @@
+import threading
+import time
+from app.ee_executor import CircuitBreaker, EEExecutor
+from app.fallback import LastKnownGood
+
+
+def test_variants_do_not_share_pending_or_stored_results():
+    lkg = LastKnownGood(workers=2)
+    started, release = threading.Event(), threading.Event()
+
+    def slow_fast(deadline_at):
+        started.set()
+        release.wait(5)
+        return {"avg_temp": 30.0, "precision": "fast"}
+
+    thread = threading.Thread(target=lambda: lkg.run(12.3456, 77.6543, slow_fast, budget=5, variant=("fast",)))
+    thread.start()
+    assert started.wait(5)  # the fast computation is now in flight for this location
+    high = lkg.run(12.3456, 77.6543, lambda deadline_at: {"avg_temp": 31.0, "precision": "high"},
+                   budget=5, variant=("high",))
+    release.set()
+    thread.join()
+    assert high["precision"] == "high" and not high["stale"]
+
+    # A failing high-precision refresh falls back to the stored high result, never the fast one
+    def failing(deadline_at):
+        raise RuntimeError("503 Service Unavailable")
+
+    fallback = lkg.run(12.3456, 77.6543, failing, budget=5, variant=("high",))
+    assert fallback["precision"] == "high"
+    assert fallback["stale"] and fallback["degraded_reason"] == "upstream_error"
+
+
+def test_budgeted_runs_are_not_capped_by_the_refresh_pool():
+    lkg = LastKnownGood(workers=1)
+    barrier = threading.Barrier(6, timeout=5)
+
+    def compute(deadline_at):
+        barrier.wait()  # only passes once all six run at the same time
+        return {"avg_temp": 30.0}
+
+    results = []
+    threads = [threading.Thread(target=lambda i=i: results.append(lkg.run(10.0 + i, 70.0, compute, budget=5)))
+               for i in range(5)]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    for thread in threads:
+        thread.join()
+    assert len(results) == 5 and not any(result["stale"] for result in results)
+
+
+def test_budget_overrun_falls_back_and_refreshes_in_the_background():
+    executor = EEExecutor(max_workers=2, rate=0, breaker=CircuitBreaker(threshold=1))
+    lkg = LastKnownGood(workers=1)
+    lkg.run(21.0, 72.0, lambda deadline_at: {"avg_temp": 30.0}, budget=5)
+    release = threading.Event()
+
+    def slow(deadline_at):
+        return executor.call(lambda: release.wait(5) and {"avg_temp": 31.0})
+
+    started = time.monotonic()
+    degraded = lkg.run(21.0, 72.0, slow, budget=0.2)
+    assert time.monotonic() - started < 1
+    assert degraded["avg_temp"] == 30.0 and degraded["degraded_reason"] == "budget_exceeded"
+    assert executor.breaker.state == "closed"  # giving up on the wait is not an upstream failure
+
+    release.set()
+    fresh = lkg.run(21.0, 72.0, slow, budget=5)  # waits for the queued refresh rather than repeating it
+    assert fresh["avg_temp"] == 31.0 and not fresh["stale"]
@@ -0,0 +1,35 @@
+import numpy as np
+from app.model.predictor import classify_uhi, classify_uhi_arrays, mitigation_uncertain
+
+
+def test_unknown_green_space_leaves_mitigated_temp_empty():
+    mitigated, level = classify_uhi(36.0, None)
+    assert mitigated is None
+    assert level == "Medium"  # risk is binned on avg_temp alone
+
+
+def test_unknown_green_space_is_nan_in_arrays():
+    mitigated, levels = classify_uhi_arrays([36.0, 36.0], [np.nan, 0.0])
+    assert np.isnan(mitigated[0])
+    assert mitigated[1] == round(36.0 * 0.85, 2)
+
+
+def test_unknown_green_space_never_triggers_refinement():
+    assert not mitigation_uncertain(40.0, None, 8.0)
+
+
+def test_refinement_tracks_mitigated_temp_not_risk_level():
+    # 30 °C with +/- 4 % points of green error spans 0.12 °C of mitigated_temp
+    assert mitigation_uncertain(30.0, 50.0, 4.0, tolerance=0.1)
+    assert not mitigation_uncertain(30.0, 50.0, 4.0, tolerance=0.2)
+    # The error range is clipped at 100 % green space
+    assert not mitigation_uncertain(30.0, 99.0, 4.0, tolerance=0.1)
+    assert not mitigation_uncertain(30.0, 50.0, 0.0)
+
+
+def test_auto_keeps_the_coarse_sentinel_level_for_realistic_temperatures():
+    from app.cache import S2_GREEN_DATASET
+    from app.model.predictor import GREEN_SOURCES, estimated_green_error
+    coarse = GREEN_SOURCES[S2_GREEN_DATASET]["pyramid"][0]
+    error = estimated_green_error(S2_GREEN_DATASET, coarse)
+    assert not any(mitigation_uncertain(temp, 50.0, error) for temp in (20.0, 35.0, 50.0, 60.0))
@@ -0,0 +1,74 @@
+import gzip
+import json
+import struct
+from datetime import datetime, timedelta, timezone
+import numpy as np
+from app.heatmap_payload import BINARY_MAGIC, FLOAT_COLUMNS, HeatmapPayloads
+
+
+def record(lat, temp, green=50.0, risk="Medium"):
+    return {"lat": lat, "lon": 77.0, "mitigated_temp": temp, "green_space_percent": green,
+            "risk_level": risk, "ground_temp": None}
+
+
+KEYS = ["a", "b", "c"]
+
+
+def test_identical_data_keeps_version_and_etag():
+    payloads = HeatmapPayloads()
+    first = payloads.publish([record(1, 30.0), record(2, 31.0), record(3, 32.0)], KEYS)
+    again = payloads.publish([record(1, 30.0), record(2, 31.0), record(3, 32.0)], KEYS)
+    assert first is again
+    assert first.etag("columnar", encoding="gzip") == again.etag("columnar", encoding="gzip")
+
+
+def test_columnar_delta_contains_only_changed_and_removed_rows():
+    payloads = HeatmapPayloads()
+    base = payloads.publish([record(1, 30.0), record(2, 31.0), record(3, 32.0)], KEYS)
+    current = payloads.publish([record(1, 30.0), record(2, 33.5, risk="High"), record(4, 28.0)], ["a", "b", "d"])
+
+    body = json.loads(payloads.body(current, "columnar", since=base.id))
+    assert body["delta"] and body["base_version"] == base.id
+    assert body["columns"]["key"] == ["b", "d"]
+    assert body["columns"]["mitigated_temp"] == [33.5, 28.0]
+    assert body["columns"]["risk_level"] == [2, 1]
+    assert body["removed"] == ["c"]
+
+
+def test_unknown_base_sends_full_payload():
+    payloads = HeatmapPayloads()
+    version = payloads.publish([record(1, 30.0), record(2, 31.0), record(3, 32.0)], KEYS)
+    body = json.loads(payloads.body(version, "columnar", since="unknown"))
+    assert not body["delta"] and body["count"] == 3
+
+
+def test_binary_layout_round_trips():
+    payloads = HeatmapPayloads()
+    version = payloads.publish([record(1, 30.0), record(2, 31.0, green=None), record(3, 32.0)], KEYS)
+    body = payloads.body(version, "binary")
+    magic, _, columns, rows, meta_length = struct.unpack_from("<4sHHII", body)
+    assert magic == BINARY_MAGIC and columns == len(FLOAT_COLUMNS) and rows == 3
+    offset = 16 + meta_length
+    offset += -offset % 4
+    meta = json.loads(body[16:16 + meta_length])
+    values = np.frombuffer(body, dtype="<f4", count=rows * columns, offset=offset).reshape(columns, rows)
+    green = values[meta["columns"].index("green_space_percent")]
+    assert np.isnan(green[1]) and green[0] == 50.0
+    assert list(body[offset + rows * columns * 4:]) == [1, 1, 1]
+
+
+def test_records_body_reports_each_snapshot_time():
+    payloads = HeatmapPayloads()
+    records = [record(1, 30.0), record(2, 31.0), record(3, 32.0)]
+    first_at = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    later_at = first_at + timedelta(minutes=10)
+    version = payloads.publish(records, KEYS)
+    refreshed = payloads.publish([dict(r) for r in records], KEYS)  # identical data, new snapshot
+    assert refreshed is version
+
+    first = json.loads(gzip.decompress(payloads.body(version, "records", encoding="gzip", generated_at=first_at)))
+    later = json.loads(gzip.decompress(payloads.body(version, "records", encoding="gzip", generated_at=later_at)))
+    assert first["generated_at"] == first_at.isoformat()
+    assert later["generated_at"] == later_at.isoformat()
+    assert version.etag("records", generated_at=first_at) != version.etag("records", generated_at=later_at)
+    assert version.etag("columnar", generated_at=first_at) == version.etag("columnar", generated_at=later_at)
@@ -0,0 +1,63 @@
+import json
+import os
+import numpy as np
+from app.raster_store import RasterStore
+
+
+def export(directory, name, value, created_at, mtime):
+    np.save(os.path.join(directory, f"{name}.npy"), np.full((4, 4), value, dtype=np.float32))
+    meta_path = os.path.join(directory, f"{name}.json")
+    with open(meta_path, "w", encoding="utf-8") as f:
+        json.dump({"min_lon": 70.0, "max_lat": 20.0, "res_deg": 0.5, "width": 4, "height": 4,
+                   "created_at": created_at}, f)
+    os.utime(meta_path, ns=(mtime, mtime))
+
+
+def test_reexported_layer_is_picked_up(tmp_path):
+    store = RasterStore(str(tmp_path), check_interval=0)
+    assert store.layer("lst_day") is None
+
+    export(str(tmp_path), "lst_day", 30.0, "2024-01-01T00:00:00", 1_000_000_000)
+    assert store.version("lst_day") == "2024-01-01T00:00:00"
+    assert store.sample("lst_day", 19.0, 71.0) == 30.0
+
+    export(str(tmp_path), "lst_day", 31.0, "2024-02-01T00:00:00", 2_000_000_000)
+    assert store.version("lst_day") == "2024-02-01T00:00:00"
+    assert store.sample("lst_day", 19.0, 71.0) == 31.0
+
+
+def test_layer_checks_are_rate_limited(tmp_path):
+    store = RasterStore(str(tmp_path), check_interval=3600)
+    export(str(tmp_path), "lst_day", 30.0, "v1", 1_000_000_000)
+    first = store.layer("lst_day")
+    export(str(tmp_path), "lst_day", 31.0, "v2", 2_000_000_000)
+    assert store.layer("lst_day") is first
+    store.reload()
+    assert store.version("lst_day") == "v2"
+
+
+def test_weighted_green_matches_the_masked_live_mean(tmp_path):
+    # 10 m-style fixture: 0/1 vegetation pixels, masked outside vegetation classes, 4x4 per grid cell
+    rng = np.random.default_rng(7)
+    fine = rng.integers(0, 2, (40, 40)).astype(np.float64)
+    unmasked = rng.random((40, 40)) < 0.4
+    blocks = lambda a: a.reshape(10, 4, 10, 4).swapaxes(1, 2).reshape(10, 10, 16)
+    weight = blocks(unmasked).mean(axis=2)
+    with np.errstate(invalid="ignore"):
+        value = np.where(unmasked, fine, 0.0).reshape(10, 4, 10, 4).sum(axis=(1, 3)) / blocks(unmasked).sum(axis=2)
+
+    np.save(tmp_path / "green_s2.npy", value.astype(np.float32))
+    np.save(tmp_path / "green_s2.weight.npy", weight.astype(np.float32))
+    with open(tmp_path / "green_s2.json", "w", encoding="utf-8") as f:
+        json.dump({"min_lon": 77.0, "max_lat": 20.1, "res_deg": 0.01, "width": 10, "height": 10,
+                   "weights": "green_s2.weight.npy", "created_at": "v1"}, f)
+    layer = RasterStore(str(tmp_path)).layer("green_s2")
+
+    lat, lon, radius_km = 20.05, 77.05, 3.0
+    rows, cols = np.mgrid[0:10, 0:10]
+    dy = (20.1 - (rows + 0.5) * 0.01 - lat) * 111.32
+    dx = (77.0 + (cols + 0.5) * 0.01 - lon) * 111.32 * np.cos(np.radians(lat))
+    cells = np.kron(dx ** 2 + dy ** 2 <= radius_km ** 2, np.ones((4, 4), dtype=bool))
+    live = fine[cells & unmasked].mean()  # reduceRegion mean over unmasked pixels in the buffer
+
+    assert np.isclose(layer.buffer_mean([lat], [lon], radius_km)[0], live)
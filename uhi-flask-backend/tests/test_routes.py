@@ -0,0 +1,100 @@
+from datetime import date
+import pytest
+from app.routes import _parse_period
+
+
+def test_month_end_includes_periods_starting_after_the_28th():
+    assert _parse_period("2023-03", end=True) == date(2023, 3, 31)
+    assert _parse_period("2024-02", end=True) == date(2024, 2, 29)
+    assert _parse_period("2023-03") == date(2023, 3, 1)
+    assert _parse_period("2023-03-30", end=True) == date(2023, 3, 30)
+    assert _parse_period("") is None
+
+
+def test_february_month_ends_follow_leap_years():
+    assert _parse_period("2023-02", end=True) == date(2023, 2, 28)
+    assert _parse_period("2000-02", end=True) == date(2000, 2, 29)  # divisible by 400
+    assert _parse_period("2100-02", end=True) == date(2100, 2, 28)  # century, not a leap year
+    assert _parse_period("2024-02-29", end=True) == date(2024, 2, 29)
+
+
+@pytest.mark.parametrize("value", ["2023-13", "2023-00", "2023-2", "2023/02", "Feb 2023", "2023-02-29", "2023-02-30"])
+def test_malformed_periods_are_rejected(value):
+    with pytest.raises(ValueError):
+        _parse_period(value, end=True)
+
+
+def test_only_oversized_batches_map_to_413(monkeypatch):
+    import importlib
+    from flask import Flask
+    from app.batch import BatchTooLarge
+
+    routes = importlib.import_module("app.routes")  # `app.routes` the attribute is the blueprint
+    app = Flask(__name__)
+    app.register_blueprint(routes.routes, url_prefix="/api")
+    client = app.test_client()
+
+    def too_large(points):
+        raise BatchTooLarge("Batch too large: 2 points (max 1)")
+
+    def broken(points):
+        raise ValueError("could not convert string to float")
+
+    monkeypatch.setattr(routes, "predict_points", too_large)
+    assert client.post("/api/predict/batch", json=[{"lat": 1, "lon": 2}]).status_code == 413
+    monkeypatch.setattr(routes, "predict_points", broken)
+    assert client.post("/api/predict/batch", json=[{"lat": 1, "lon": 2}]).status_code == 500
+
+
+def test_heatmap_stream_keeps_order_and_reports_a_mid_stream_failure(monkeypatch):
+    import importlib
+    import json
+    from flask import Flask
+
+    routes = importlib.import_module("app.routes")
+    app = Flask(__name__)
+    app.register_blueprint(routes.routes, url_prefix="/api")
+    client = app.test_client()
+
+    def records(cities):
+        yield "city", {"name": "Delhi", "uhi_intensity": 4.2, "risk_level": "High"}
+        yield "city_error", {"name": "Pune", "lat": 18.52, "lon": 73.86, "error": "Earth Engine error: 503"}
+        yield "city", {"name": "Surat", "uhi_intensity": None, "risk_level": "No Data"}
+        raise RuntimeError("Earth Engine connection reset")
+
+    monkeypatch.setattr(routes, "CITIES", [{"name": name} for name in ("Delhi", "Pune", "Surat", "Agra")])
+    monkeypatch.setattr(routes, "iter_heatmap_records", records)
+
+    response = client.get("/api/heatmap/stream")
+    assert response.mimetype == "application/x-ndjson"
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert [(line["type"], line.get("name")) for line in lines] == [
+        ("city", "Delhi"), ("city_error", "Pune"), ("city", "Surat"), ("city_error", None), ("summary", None)]
+    assert lines[3] == {"type": "city_error", "error": "Earth Engine connection reset"}
+    summary = lines[4]
+    assert (summary["cities"], summary["records"], summary["no_data"], summary["errors"]) == (4, 2, 1, 2)
+
+    events = client.get("/api/heatmap/stream", headers={"Accept": "text/event-stream"}).get_data(as_text=True)
+    assert events.split("\n\n")[3] == 'event: city_error\ndata: {"error": "Earth Engine connection reset"}'
+
+
+def test_heatmap_since_must_be_a_version_id(monkeypatch):
+    import importlib
+    from flask import Flask
+
+    routes = importlib.import_module("app.routes")
+    app = Flask(__name__)
+    app.register_blueprint(routes.routes, url_prefix="/api")
+    client = app.test_client()
+    records = [{"lat": 28.7, "lon": 77.1, "mitigated_temp": 30.0, "green_space_percent": 20.0,
+                "risk_level": "Medium", "ground_temp": None}]
+    monkeypatch.setattr(routes, "CITIES", [{"key": "delhi"}])
+    monkeypatch.setattr(routes, "build_heatmap_records", lambda cities: records)
+
+    for since in ("abc", "0123456789ABCDEF", "0123456789abcdef0", 'x"\r\nSet-Cookie: a=b'):
+        response = client.get("/api/heatmap", query_string={"format": "columnar", "since": since})
+        assert response.status_code == 400 and "ETag" not in response.headers
+
+    version = client.get("/api/heatmap?format=columnar").headers["X-Heatmap-Version"]
+    response = client.get(f"/api/heatmap?format=columnar&since={version}")
+    assert response.status_code == 200 and f".since-{version}." in response.headers["ETag"]
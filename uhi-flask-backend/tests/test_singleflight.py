@@ -0,0 +1,74 @@
+import threading
+import time
+import pytest
+from app.singleflight import SingleFlight
+
+
+def run_concurrently(flight, key, fn, callers):
+    results, errors = [], []
+
+    def call():
+        try:
+            results.append(flight.do(key, fn))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=call) for _ in range(callers)]
+    for thread in threads:
+        thread.start()
+    return threads, results, errors
+
+
+def wait_for_waiters(flight, key, count, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        with flight._lock:
+            call = flight._calls.get(key)
+            if call is not None and call.waiters == count:
+                return
+        time.sleep(0.001)
+    raise AssertionError(f"{count} waiters never joined the in-flight call")
+
+
+def test_concurrent_callers_share_one_computation():
+    flight = SingleFlight("test")
+    release, calls = threading.Event(), []
+
+    def compute():
+        calls.append(1)
+        release.wait(5)
+        return {"value": 42}
+
+    threads, results, errors = run_concurrently(flight, "k", compute, 5)
+    wait_for_waiters(flight, "k", 4)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert calls == [1] and not errors
+    assert results == [{"value": 42}] * 5
+    assert flight.in_flight() == 0
+
+
+def test_waiters_share_the_exception_and_nothing_is_cached():
+    flight = SingleFlight("test")
+    release = threading.Event()
+
+    def failing():
+        release.wait(5)
+        raise RuntimeError("boom")
+
+    threads, results, errors = run_concurrently(flight, "k", failing, 3)
+    wait_for_waiters(flight, "k", 2)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert not results and len(errors) == 3 and all(str(e) == "boom" for e in errors)
+    assert flight.do("k", lambda: "fresh") == "fresh"
+
+
+def test_different_keys_do_not_coalesce():
+    flight = SingleFlight("test")
+    assert flight.do("a", lambda: 1) == 1
+    assert flight.do("b", lambda: 2) == 2
+    with pytest.raises(ValueError):
+        flight.do("c", lambda: int("x"))
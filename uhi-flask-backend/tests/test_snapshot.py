@@ -0,0 +1,54 @@
+from app.snapshot import HeatmapSnapshot
+
+
+def counting_build(calls):
+    def build():
+        calls.append(1)
+        return [{"lat": 1.0, "build": len(calls)}]
+    return build
+
+
+def test_only_the_leader_builds_and_followers_read_its_snapshot(tmp_path):
+    path = str(tmp_path / "snapshot.json")
+    leader_calls, follower_calls = [], []
+    leader = HeatmapSnapshot(counting_build(leader_calls), interval=60, max_age=120, path=path, signature=["a"])
+    follower = HeatmapSnapshot(counting_build(follower_calls), interval=60, max_age=120, path=path, signature=["a"])
+
+    assert leader.refresh() and leader.is_leader
+    assert follower.refresh() and not follower.is_leader  # reloads instead of building
+    payload, generated_at = follower.get()
+    assert payload == [{"lat": 1.0, "build": 1}]
+    assert generated_at == leader.get()[1]
+    assert leader_calls == [1] and follower_calls == []
+
+    leader.refresh()
+    assert follower.get()[0] == [{"lat": 1.0, "build": 2}]
+
+
+def test_follower_without_shared_snapshot_raises(tmp_path):
+    path = str(tmp_path / "snapshot.json")
+    leader = HeatmapSnapshot(lambda: [], interval=60, max_age=120, path=path)
+    assert leader.is_leader is False and leader._try_lead()
+    follower = HeatmapSnapshot(lambda: [], interval=60, max_age=120, path=path)
+    try:
+        follower.get()
+    except RuntimeError:
+        pass
+    else:
+        raise AssertionError("expected the follower to wait for the leader")
+
+
+def test_snapshot_with_other_signature_is_ignored(tmp_path):
+    path = str(tmp_path / "snapshot.json")
+    old = HeatmapSnapshot(lambda: [{"old": True}], interval=60, max_age=120, path=path, signature=["a"])
+    old.refresh()
+    old._leader_lock.close()  # the previous leader exits
+    new = HeatmapSnapshot(lambda: [{"old": False}], interval=60, max_age=120, path=path, signature=["a", "b"])
+    assert new.get()[0] == [{"old": False}]
+
+
+def test_without_path_every_process_builds():
+    calls = []
+    snapshot = HeatmapSnapshot(counting_build(calls), interval=60, max_age=120)
+    assert snapshot.is_leader
+    assert snapshot.get()[0] == [{"lat": 1.0, "build": 1}]
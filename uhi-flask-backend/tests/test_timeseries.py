@@ -0,0 +1,56 @@
+import datetime
+import numpy as np
+from app import timeseries
+from app.timeseries import TimeSeriesStore
+
+D = datetime.date
+CITIES = [{"key": "delhi", "name": "Delhi", "lat": 28.70, "lon": 77.10},
+          {"key": "pune", "name": "Pune", "lat": 18.52, "lon": 73.86}]
+
+
+def test_align_grows_onto_the_month_grid_keeping_values():
+    arrays = {
+        "periods": np.array(["2023-02-01", "2023-03-01"], dtype="datetime64[D]"),
+        "cities": np.array(["delhi"], dtype=str),
+        "lst": np.array([[30.0], [32.0]], dtype=np.float32),
+        "ndvi": np.array([[0.2], [0.3]], dtype=np.float32),
+        "fetched": np.array([[True], [True]]),
+    }
+    aligned = TimeSeriesStore._align(arrays, [D(2023, 1, 1), D(2023, 2, 1), D(2023, 4, 1)], ["pune", "delhi"])
+
+    assert [str(p) for p in aligned["periods"]] == ["2023-01-01", "2023-02-01", "2023-03-01", "2023-04-01"]
+    assert aligned["cities"].tolist() == ["delhi", "pune"]
+    np.testing.assert_array_equal(aligned["lst"][:, 0], [np.nan, 30.0, 32.0, np.nan])
+    np.testing.assert_allclose(aligned["ndvi"][:, 0], [np.nan, 0.2, 0.3, np.nan])
+    assert aligned["fetched"].tolist() == [[False, False], [True, False], [True, False], [False, False]]
+    assert TimeSeriesStore._align(aligned, [D(2023, 3, 1)], ["delhi"])["lst"].shape == (4, 2)
+
+
+def test_refresh_only_fetches_missing_cells(tmp_path, monkeypatch):
+    calls, failing = [], {D(2023, 3, 1)}
+
+    def reduce_period(cities, start, end):
+        calls.append((start, tuple(c["key"] for c in cities)))
+        if start in failing:
+            failing.discard(start)
+            raise RuntimeError("503 Service Unavailable")
+        return np.full(len(cities), 30.0 + start.month, np.float32), np.full(len(cities), 0.25, np.float32)
+
+    monkeypatch.setattr(timeseries, "_reduce_period", reduce_period)
+    store = TimeSeriesStore(str(tmp_path))
+
+    # Jan and Feb succeed, March fails; April is not complete before the 15th
+    assert store.refresh("monthly", CITIES[:1], D(2023, 1, 1), D(2023, 4, 15)) == 2
+    assert sorted(calls) == [(D(2023, 1, 1), ("delhi",)), (D(2023, 2, 1), ("delhi",)), (D(2023, 3, 1), ("delhi",))]
+
+    # The next refresh retries March and fetches April plus every period of the new city
+    calls.clear()
+    assert store.refresh("monthly", CITIES, D(2023, 1, 1), D(2023, 5, 1)) == 4
+    assert sorted(calls) == [(D(2023, 1, 1), ("pune",)), (D(2023, 2, 1), ("pune",)),
+                             (D(2023, 3, 1), ("delhi", "pune")), (D(2023, 4, 1), ("delhi", "pune"))]
+
+    calls.clear()
+    assert store.refresh("monthly", CITIES, D(2023, 1, 1), D(2023, 5, 1)) == 0 and calls == []
+    series = store.query("delhi", D(2023, 2, 1), D(2023, 3, 31))
+    assert series["periods"] == ["2023-02-01", "2023-03-01"]
+    assert series["lst"] == [32.0, 33.0] and series["pending_periods"] == 0
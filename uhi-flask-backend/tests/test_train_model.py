@@ -0,0 +1,79 @@
+import numpy as np
+from sklearn.linear_model import LinearRegression
+from train_model import (
+    collect_observations, design_matrix, holdout_metrics, new_state, prediction_metrics, read_observations,
+    round_offset, train
+)
+
+
+def observations(count, seed, start=0):
+    rng = np.random.default_rng(seed)
+    return [{"id": f"p{start + i}", "round": "r1", "lat": float(rng.uniform(8, 30)),
+             "lon": float(rng.uniform(70, 90)), "lst": float(rng.uniform(25, 45)),
+             "temp": 0.0} for i in range(count)]
+
+
+def with_targets(points, seed):
+    rng = np.random.default_rng(seed)
+    for p in points:
+        p["temp"] = 5 + 0.1 * p["lat"] - 0.05 * p["lon"] + 0.6 * p["lst"] + float(rng.normal(0, 0.5))
+    return points
+
+
+def test_holdout_scores_each_fold_with_a_model_that_never_saw_it():
+    old = with_targets(observations(30, 1), 2)
+    new = with_targets(observations(10, 3, start=30), 4)
+    X_old, y_old = design_matrix(old)
+    X_new, y_new = design_matrix(new)
+    xtx = X_old.T @ X_old + X_new.T @ X_new
+    xty = X_old.T @ y_old + X_new.T @ y_new
+
+    predictions = np.empty_like(y_new)
+    for fold in np.array_split(np.arange(len(y_new)), 5):
+        keep = np.setdiff1d(np.arange(len(y_new)), fold)
+        fit = LinearRegression().fit(np.vstack([X_old[:, 1:], X_new[keep, 1:]]),
+                                     np.concatenate([y_old, y_new[keep]]))
+        predictions[fold] = fit.predict(X_new[fold, 1:])
+    assert holdout_metrics(xtx, xty, X_new, y_new) == prediction_metrics(predictions, y_new)
+
+
+def test_train_records_validation_for_the_first_version(tmp_path):
+    state = new_state()
+    model = train(with_targets(observations(20, 5), 6), state, offset=0,
+                  model_path=str(tmp_path / "model.pkl"), versions_path=str(tmp_path / "versions.jsonl"))
+    assert model is not None
+    record = (tmp_path / "versions.jsonl").read_text()
+    assert '"validation": {' in record
+    assert '"previous_version_on_new_data": null' in record
+
+
+def test_partly_collected_round_is_resumed_without_double_counting(tmp_path):
+    log = str(tmp_path / "observations.jsonl")
+    points = [{"id": f"p{i}", "lat": 10.0 + i, "lon": 75.0} for i in range(8)]
+    fetched, unavailable = [], {"p3"}
+
+    def lst_fetcher(missing):
+        fetched.extend(p["id"] for p in missing)
+        return {p["id"]: None if p["id"] in unavailable else 30.0 + p["lat"] for p in missing}
+
+    def collect_and_train(state, round_label):
+        collect_observations(points, log, round_label, round_offset(state, round_label),
+                             lst_fetcher=lst_fetcher, temp_fetcher=lambda lat, lon, session: lat, session="s")
+        observations, offset = read_observations(log, state["offset"])
+        train(observations, state, offset, model_path=str(tmp_path / "model.pkl"),
+              versions_path=str(tmp_path / "versions.jsonl"))
+        return observations
+
+    state = new_state()
+    assert len(collect_and_train(state, "2026-10-18T09")) == 7  # p3 had no LST this time
+    assert state["last_round"] == "2026-10-18T09" and state["n"] == 7
+
+    # Re-running the same round fetches only the point that is still missing
+    unavailable.clear()
+    fetched.clear()
+    assert [o["id"] for o in collect_and_train(state, "2026-10-18T09")] == ["p3"]
+    assert fetched == ["p3"] and state["n"] == 8
+
+    # The next round starts after everything folded in so far
+    fetched.clear()
+    assert len(collect_and_train(state, "2026-10-18T10")) == 8 and len(fetched) == 8 and state["n"] == 16
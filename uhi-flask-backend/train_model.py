@@ -3,101 +3,410 @@ import requests
 import numpy as np
 import os
 import json
+import argparse
+import threading
 import joblib
-from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta, timezone
+from requests.adapters import HTTPAdapter
 from sklearn.linear_model import LinearRegression
+from app.ee_executor import ee_executor
+from app.ee_session import ee_session, ensure_initialized
 
 # -----------------------------
-# Initialize Google Earth Engine
+# Settings
 # -----------------------------
-try:
-    ee.Initialize(project='earthengine-uhi')
-except Exception as e:
-    ee.Authenticate(project='earthengine-uhi')
-    ee.Initialize(project='earthengine-uhi')
+API_KEY = os.environ.get("OWM_API_KEY", "220ed8731749a0aac8cb99828f4776b6")
+OWM_URL = os.environ.get("OWM_URL", "http://api.openweathermap.org/data/2.5/weather")
+
+CITIES_FILE = os.path.join("app", "data", "indian_cities.json")
+OBSERVATIONS_FILE = os.path.join("app", "data", "training_observations.jsonl")
+MODEL_PATH = os.path.join("app", "model", "avg_temp_model.pkl")
+STATE_FILE = os.path.join("app", "model", "avg_temp_stats.json")        # accumulated sufficient statistics
+VERSIONS_FILE = os.path.join("app", "model", "avg_temp_versions.jsonl")  # one line per trained model version
+
+LST_BATCH_SIZE = 500      # points per reduceRegions call
+WEATHER_CONCURRENCY = 16  # parallel OpenWeatherMap requests
+MIN_OBSERVATIONS = 6      # observations needed before a model is written
+VALIDATION_FOLDS = 5      # folds of the new batch held out in turn to validate a version
+FEATURES = ["lat", "lon", "lst"]
+
 
 # -----------------------------
-# OpenWeatherMap API
+# Initialize Google Earth Engine
 # -----------------------------
-API_KEY = "220ed8731749a0aac8cb99828f4776b6"
+def init_earth_engine():
+    try:
+        ensure_initialized()
+    except RuntimeError:
+        ee.Authenticate(project=ee_session.project)
+        ee_session.reset()
+        ensure_initialized()
+
 
 # -----------------------------
-# Load 50 Indian Cities
+# Load Sample Points
 # -----------------------------
-CITIES_FILE = os.path.join("app", "data", "indian_cities.json")
+def load_points(path=CITIES_FILE):
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"{path} not found! Please ensure your cities JSON exists.")
+    with open(path, "r", encoding="utf-8") as f:
+        points = json.load(f)
+    for point in points:
+        point.setdefault("id", point.get("name") or f"{point['lat']:.4f},{point['lon']:.4f}")
+    return points
 
-if os.path.exists(CITIES_FILE):
-    with open(CITIES_FILE, "r", encoding="utf-8") as f:
-        cities = json.load(f)
-else:
-    raise FileNotFoundError(f"{CITIES_FILE} not found! Please ensure your cities JSON exists.")
 
 # -----------------------------
-# Fetch Satellite LST
+# Fetch Satellite LST (batched)
 # -----------------------------
-def get_satellite_lst(lat, lon):
-    """Fetch MODIS LST for last 30 days"""
-    point = ee.Geometry.Point([lon, lat])
+def _lst_chunk(points):
+    features = ee.FeatureCollection([
+        ee.Feature(ee.Geometry.Point([p["lon"], p["lat"]]), {"point_index": i})
+        for i, p in enumerate(points)
+    ])
     dataset = (
         ee.ImageCollection("MODIS/061/MOD11A2")
         .select("LST_Day_1km")
         .filterDate(datetime.now() - timedelta(days=30), datetime.now())
-        .filterBounds(point)
         .mean()
     )
+    stats = dataset.reduceRegions(
+        collection=features, reducer=ee.Reducer.mean().setOutputs(["LST_Day_1km"]), scale=1000
+    ).select(propertySelectors=["point_index", "LST_Day_1km"], retainGeometry=False)
 
-    lst = dataset.reduceRegion(
-        reducer=ee.Reducer.mean(), geometry=point, scale=1000
-    ).get("LST_Day_1km").getInfo()
+    lst = {}
+    for feature in ee_executor.get_info(stats)["features"]:
+        props = feature["properties"]
+        value = props.get("LST_Day_1km")
+        if value is not None:
+            lst[points[props["point_index"]]["id"]] = (value * 0.02) - 273.15  # Convert Kelvin to Celsius
+    return lst
+
+
+def get_satellite_lst_batch(points):
+    """Fetch 30-day MODIS LST for all points, one reduceRegions per chunk. Returns {id: LST °C}."""
+    chunks = [points[i:i + LST_BATCH_SIZE] for i in range(0, len(points), LST_BATCH_SIZE)]
+    lst = {}
+    for chunk, result in zip(chunks, ee_executor.map(_lst_chunk, chunks)):
+        if isinstance(result, Exception):
+            print(f"⚠️ LST batch of {len(chunk)} points failed: {result}")
+            continue
+        lst.update(result)
+    return lst
 
-    if lst is None:
-        return None
-    return (lst * 0.02) - 273.15  # Convert Kelvin to Celsius
 
 # -----------------------------
 # Fetch Ground Temp (Weather API)
 # -----------------------------
-def get_weather_temp(lat, lon):
+def weather_session(pool_size=WEATHER_CONCURRENCY):
+    """HTTP session whose connection pool is shared by all weather requests."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=2)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def get_weather_temp(lat, lon, session=requests):
     """Fetch real ground temperature from OpenWeatherMap"""
-    url = f"http://api.openweathermap.org/data/2.5/weather?lat={lat}&lon={lon}&appid={API_KEY}&units=metric"
+    params = {"lat": lat, "lon": lon, "appid": API_KEY, "units": "metric"}
     try:
-        r = requests.get(url, timeout=10).json()
+        r = session.get(OWM_URL, params=params, timeout=10).json()
         return r["main"]["temp"] if "main" in r else None
     except Exception:
         return None
 
+
+# -----------------------------
+# Observation Log
+# -----------------------------
+def read_observations(path=OBSERVATIONS_FILE, offset=0):
+    """
+    Observations appended to the log after byte `offset`, plus the offset just past the
+    last complete line, so the next run resumes reading exactly where this one stopped.
+    """
+    observations = []
+    if not os.path.exists(path):
+        return observations, 0
+    with open(path, "rb") as f:
+        f.seek(offset)
+        for line in f:
+            if not line.endswith(b"\n"):
+                break  # partially written line from an interrupted run
+            offset += len(line)
+            try:
+                observations.append(json.loads(line))
+            except ValueError:
+                continue
+    return observations, offset
+
+
+def load_observations(path=OBSERVATIONS_FILE, offset=0):
+    """Observations after `offset` keyed by (point id, collection round)."""
+    return {(obs["id"], obs.get("round")): obs for obs in read_observations(path, offset)[0]}
+
+
+class ObservationWriter:
+    """Appends one JSON line per observation and flushes it immediately."""
+
+    def __init__(self, path=OBSERVATIONS_FILE):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._file = open(path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+
+    def write(self, obs):
+        with self._lock:
+            self._file.write(json.dumps(obs) + "\n")
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def close(self):
+        self._file.close()
+
+
+def current_round():
+    """Collection round label; one round per UTC hour."""
+    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H")
+
+
 # -----------------------------
 # Collect Training Data
 # -----------------------------
-X, y = [], []
+def collect_observations(points, path=OBSERVATIONS_FILE, round_label=None, offset=0,
+                         lst_fetcher=get_satellite_lst_batch, temp_fetcher=get_weather_temp,
+                         session=None, concurrency=WEATHER_CONCURRENCY):
+    """
+    Collect (LST, ground temperature) observations of one round for all points not yet
+    logged in that round. Each observation is appended as soon as it arrives, so an
+    interrupted run resumes where it stopped; only the log after `offset` (the part not
+    yet folded into the model) is read. Fetchers can be replaced with local stand-ins
+    for offline runs.
+    """
+    round_label = round_label or current_round()
+    observations = {k: v for k, v in load_observations(path, offset).items() if k[1] == round_label}
+    missing = [p for p in points if (p["id"], round_label) not in observations]
+    print(f"📦 Round {round_label}: {len(observations)} observations checkpointed, {len(missing)} points to fetch")
+    if not missing:
+        return list(observations.values())
 
-for city in cities:
-    name, lat, lon = city["name"], city["lat"], city["lon"]
+    lst = lst_fetcher(missing)
+    session = session or weather_session(concurrency)
+    writer = ObservationWriter(path)
 
-    lst_c = get_satellite_lst(lat, lon)
-    temp_obs = get_weather_temp(lat, lon)
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            futures = {
+                pool.submit(temp_fetcher, p["lat"], p["lon"], session): p
+                for p in missing if lst.get(p["id"]) is not None
+            }
+            for future in as_completed(futures):
+                point = futures[future]
+                lst_c = lst[point["id"]]
+                temp_obs = future.result()
+                if temp_obs is None:
+                    print(f"⚠️ Skipping {point['id']}: Missing data.")
+                    continue
+
+                obs = {
+                    "id": point["id"],
+                    "round": round_label,
+                    "lat": point["lat"],
+                    "lon": point["lon"],
+                    "lst": lst_c,
+                    "temp": temp_obs,
+                    "collected_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                }
+                writer.write(obs)
+                observations[(obs["id"], round_label)] = obs
+                print(f"📍 {point['id']} → LST={lst_c:.2f}°C, Obs={temp_obs:.2f}°C")
+    finally:
+        writer.close()
+
+    for p in missing:
+        if lst.get(p["id"]) is None:
+            print(f"⚠️ Skipping {p['id']}: Missing data.")
+
+    return list(observations.values())
+
+
+# -----------------------------
+# Sufficient Statistics
+# -----------------------------
+def new_state():
+    """
+    Empty training state. The least-squares fit only needs XᵀX and Xᵀy (X with a leading
+    intercept column), so each run folds in new observations in O(new samples).
+    """
+    size = len(FEATURES) + 1
+    return {"n": 0, "xtx": np.zeros((size, size)).tolist(), "xty": np.zeros(size).tolist(), "yty": 0.0,
+            "offset": 0, "round_offset": 0, "last_round": None, "version": 0, "coef": None}
+
+
+def round_offset(state, round_label):
+    """
+    Log offset to collect `round_label` from. A round already folded into the model (e.g.
+    one whose points were partly skipped on missing data) is read again from where it
+    started, so only the points still missing are fetched and none is counted twice.
+    """
+    if state["last_round"] != round_label:
+        state["round_offset"] = state["offset"]  # the round starts after everything folded in so far
+    return state.get("round_offset", state["offset"])
+
+
+def load_state(path=STATE_FILE):
+    if not os.path.exists(path):
+        return new_state()
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_state(state, path=STATE_FILE):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".partial"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def design_matrix(observations):
+    X = np.array([[1.0] + [o[name] for name in FEATURES] for o in observations], dtype=np.float64)
+    y = np.array([o["temp"] for o in observations], dtype=np.float64)
+    return X.reshape(-1, len(FEATURES) + 1), y
+
+
+def regression_metrics(beta, X, y):
+    """MAE, RMSE and R² of coefficients `beta` (intercept first) on one sample."""
+    return prediction_metrics(X @ beta, y)
+
+
+def prediction_metrics(predictions, y):
+    """MAE, RMSE and R² of predictions against observed `y`."""
+    residuals = y - predictions
+    total = float(((y - y.mean()) ** 2).sum())
+    return {
+        "n": int(len(y)),
+        "mae": round(float(np.abs(residuals).mean()), 4),
+        "rmse": round(float(np.sqrt((residuals ** 2).mean())), 4),
+        "r2": round(1 - float((residuals ** 2).sum()) / total, 4) if total > 0 else None,
+    }
+
+
+def holdout_metrics(xtx, xty, X, y, folds=VALIDATION_FOLDS):
+    """
+    Out-of-sample metrics for a fit on the full statistics (`xtx`, `xty`, already including
+    the new batch X, y): each fold of the new batch is predicted by the model refitted
+    without it, which only needs that fold's XᵀX and Xᵀy subtracted. None below 2 samples.
+    """
+    folds = min(folds, len(y))
+    if folds < 2:
+        return None
+    predictions = np.empty_like(y)
+    for fold in np.array_split(np.arange(len(y)), folds):
+        beta = np.linalg.lstsq(xtx - X[fold].T @ X[fold], xty - X[fold].T @ y[fold], rcond=None)[0]
+        predictions[fold] = X[fold] @ beta
+    return prediction_metrics(predictions, y)
 
-    if lst_c is not None and temp_obs is not None:
-        print(f"📍 {name} → LST={lst_c:.2f}°C, Obs={temp_obs:.2f}°C")
-        X.append([lat, lon, lst_c])
-        y.append(temp_obs)
-    else:
-        print(f"⚠️ Skipping {name}: Missing data.")
 
 # -----------------------------
 # Train & Save Model
 # -----------------------------
-if len(X) > 5:  # Need at least 5 samples
-    X = np.array(X)
-    y = np.array(y)
+def train(observations, state, offset, model_path=MODEL_PATH, versions_path=VERSIONS_FILE):
+    """
+    Fold new observations into the sufficient statistics and refit from them.
+    Each new version is recorded with its coefficients, its cross-validated error on
+    the new batch (`validation`, see holdout_metrics) and how the previous version
+    did on that batch before it was folded in (`previous_version_on_new_data`).
+    """
+    state["offset"] = offset
+    if not observations:
+        print("📦 No new observations since the last model version.")
+        return None
+
+    X, y = design_matrix(observations)
+    previous = regression_metrics(np.asarray(state["coef"]), X, y) if state["coef"] else None
+
+    xtx = np.asarray(state["xtx"]) + X.T @ X
+    xty = np.asarray(state["xty"]) + X.T @ y
+    state.update({"n": state["n"] + len(y), "xtx": xtx.tolist(), "xty": xty.tolist(),
+                  "yty": state["yty"] + float(y @ y),
+                  "last_round": max((o.get("round") or "" for o in observations), default=None) or state["last_round"]})
+
+    if state["n"] < MIN_OBSERVATIONS:
+        print("⚠️ Not enough data collected to train model. Please check API or Earth Engine.")
+        return None
+
+    beta = np.linalg.lstsq(xtx, xty, rcond=None)[0]
+    # Training error from the statistics alone: SSE = yᵀy - 2βᵀXᵀy + βᵀXᵀXβ
+    sse = max(state["yty"] - 2 * beta @ xty + beta @ xtx @ beta, 0.0)
+    validation = holdout_metrics(xtx, xty, X, y)
 
     model = LinearRegression()
-    model.fit(X, y)
+    model.coef_ = beta[1:]
+    model.intercept_ = float(beta[0])
+    model.n_features_in_ = len(FEATURES)
+
+    os.makedirs(os.path.dirname(model_path), exist_ok=True)
+    tmp_path = model_path + ".partial"
+    joblib.dump(model, tmp_path)
+    os.replace(tmp_path, model_path)  # the API hot-reloads on mtime; never expose a half-written file
+
+    state["version"] += 1
+    state["coef"] = beta.tolist()
+    record = {
+        "version": state["version"],
+        "trained_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "observations": state["n"],
+        "new_observations": len(y),
+        "coef": dict(zip(["intercept"] + FEATURES, (round(float(b), 6) for b in beta))),
+        "train_rmse": round(float(np.sqrt(sse / state["n"])), 4),
+        "validation": validation,
+        "previous_version_on_new_data": previous,
+    }
+    with open(versions_path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(record) + "\n")
+
+    print(f"✅ Model v{state['version']} trained on {state['n']} observations "
+          f"({len(y)} new) & saved at {model_path}")
+    if validation:
+        print(f"📊 Held-out new data: MAE={validation['mae']}°C, RMSE={validation['rmse']}°C")
+    if previous:
+        print(f"📊 Previous version on new data: MAE={previous['mae']}°C, RMSE={previous['rmse']}°C")
+    return model
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Collect LST/ground-temperature observations and train the model.")
+    parser.add_argument("--points", default=CITIES_FILE, help="JSON list of {name|id, lat, lon} sample points")
+    parser.add_argument("--observations", default=OBSERVATIONS_FILE, help="observation log (JSON lines)")
+    parser.add_argument("--state", default=STATE_FILE, help="accumulated training statistics")
+    parser.add_argument("--round", help="collection round label (default: current UTC hour)")
+    parser.add_argument("--rebuild", action="store_true", help="refit from the whole observation log")
+    parser.add_argument("--fresh", action="store_true", help="discard logged observations and statistics first")
+    args = parser.parse_args()
+
+    if args.fresh:
+        for path in (args.observations, args.state):
+            if os.path.exists(path):
+                os.remove(path)
+
+    state = load_state(args.state)
+    log_size = os.path.getsize(args.observations) if os.path.exists(args.observations) else 0
+    if args.rebuild or state["offset"] > log_size:  # log replaced or truncated: statistics are stale
+        state = {**new_state(), "version": state["version"]}
+
+    round_label = args.round or current_round()
+    if state["last_round"] is not None and state["last_round"] > round_label:
+        print(f"📦 Round {round_label} is older than round {state['last_round']} of model v{state['version']}")
+    else:
+        init_earth_engine()
+        collect_observations(load_points(args.points), args.observations, round_label,
+                             round_offset(state, round_label))
+
+    observations, offset = read_observations(args.observations, state["offset"])
+    train(observations, state, offset)
+    save_state(state, args.state)
 
-    MODEL_PATH = os.path.join("app", "model", "avg_temp_model.pkl")
-    os.makedirs(os.path.dirname(MODEL_PATH), exist_ok=True)
-    joblib.dump(model, MODEL_PATH)
 
-    print(f"✅ Model trained & saved at {MODEL_PATH}")
-else:
-    print("⚠️ Not enough data collected to train model. Please check API or Earth Engine.")
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,26 @@
+import argparse
+from datetime import date
+from app.ee_session import ensure_initialized
+from app.timeseries import FREQUENCIES, TIMESERIES_DIR, TIMESERIES_START, TimeSeriesStore
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Fetch missing LST/NDVI periods for every city into the local time-series store.")
+    parser.add_argument("--frequency", choices=FREQUENCIES, nargs="+", default=["monthly"])
+    parser.add_argument("--start", default=TIMESERIES_START, help="first period start (YYYY-MM-DD)")
+    parser.add_argument("--until", help="only periods ending on or before this date (default: today)")
+    parser.add_argument("--out", default=TIMESERIES_DIR)
+    args = parser.parse_args()
+
+    ensure_initialized()
+    store = TimeSeriesStore(args.out)
+    start = date.fromisoformat(args.start)
+    until = date.fromisoformat(args.until) if args.until else None
+    for frequency in args.frequency:
+        fetched = store.refresh(frequency, start=start, until=until)
+        print(f"✅ {frequency}: {fetched} period(s) fetched into {args.out}")
+
+
+if __name__ == "__main__":
+    main()
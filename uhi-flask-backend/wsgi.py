@@ -0,0 +1,11 @@
+"""
+Production WSGI entry point.
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Each prefork worker imports this module after forking, so it gets its own Earth Engine
+session (warmed up in the background), executor pool and cache connection.
+"""
+from app import create_app
+
+app = create_app()